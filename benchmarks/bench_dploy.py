@@ -0,0 +1,283 @@
+"""
+Benchmark suite timing the stow, clean, unstow and link sub-commands on the
+synthetic package trees of benchmarks.trees
+
+Each scenario is generated afresh for every repetition, outside of the timed
+part. The wall and CPU times kept are the medians of the repetitions, and the
+peak memory is measured in one more repetition with tracemalloc, which would
+slow down the timed ones. Every sub-command is also broken down into the
+validate, collect, check and execute phases recorded by dploy.timings, the
+peak memory of a phase being the most it needed above what was allocated as
+it started.
+
+See benchmarks/README.md about the baseline to compare against.
+
+Usage:
+    python -m benchmarks.bench_dploy [--scale N] [--repeat N] [--scenario NAME]...
+        [--output FILE] [--baseline FILE] [--threshold FRACTION]
+    python -m benchmarks.bench_dploy --compare FILE --baseline FILE
+
+Exits with 1 if a result is slower or uses more memory than the baseline by
+more than the threshold.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import dploy
+from benchmarks import trees
+from dploy import timings
+
+VERSION = 1
+COMMANDS = ["stow", "clean", "unstow", "link"]
+
+# differences below these are noise however large they are relatively
+MIN_TIME_DIFFERENCE = 0.02
+MIN_MEMORY_DIFFERENCE = 64 * 1024
+
+
+def get_commands(scenario):
+    """
+    get the sub-commands to run on a scenario in order, each one leaves the
+    destination as the next one expects it
+    """
+    return {
+        "stow": lambda: dploy.stow(scenario.sources, scenario.dest, ignore_patterns=scenario.ignore_patterns),
+        "clean": lambda: dploy.clean(scenario.sources, scenario.dest, ignore_patterns=scenario.ignore_patterns),
+        "unstow": lambda: dploy.unstow(scenario.sources, scenario.dest, ignore_patterns=scenario.ignore_patterns),
+        "link": lambda: [dploy.link(source, dest) for source, dest in scenario.links],
+    }
+
+
+def run_commands(scenario, trace_memory=False):
+    """
+    run the sub-commands on a scenario and get the wall time, CPU time and
+    peak memory of each and of each of their phases, the latter only if
+    trace_memory
+    """
+    results = {}
+    for name, command in get_commands(scenario).items():
+        recorded = timings.Timings()
+        if trace_memory:
+            tracemalloc.reset_peak()
+            memory_before, _ = tracemalloc.get_traced_memory()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        with timings.record(recorded):
+            command()
+        results[name] = {
+            "wall": time.perf_counter() - wall_start,
+            "cpu": time.process_time() - cpu_start,
+            "phases": {
+                phase: {"wall": phase_timings.wall, "cpu": phase_timings.cpu}
+                for phase, phase_timings in recorded.phases.items()
+            },
+        }
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            # each phase resets the peak as it starts, so the peak of the
+            # sub-command is the highest of theirs
+            for phase, phase_timings in recorded.phases.items():
+                results[name]["phases"][phase]["peak_memory"] = phase_timings.peak_memory
+                peak = max(peak, phase_timings.peak_traced_memory)
+            results[name]["peak_memory"] = peak - memory_before
+    return results
+
+
+def _add_times(times, result):
+    for metric in ("wall", "cpu"):
+        times.setdefault(metric, []).append(result[metric])
+
+
+def _get_medians(times):
+    return {metric: statistics.median(values) for metric, values in times.items()}
+
+
+def bench_scenario(name, scale, repeat):
+    """
+    get the results of each sub-command for a scenario
+    """
+    times = {command: {"phases": {}} for command in COMMANDS}
+    files = 0
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as root:
+            scenario = trees.GENERATORS[name](root, scale)
+            files = scenario.files
+            for command, result in run_commands(scenario).items():
+                _add_times(times[command], result)
+                for phase, phase_result in result["phases"].items():
+                    _add_times(times[command]["phases"].setdefault(phase, {}), phase_result)
+
+    results = {}
+    for command, command_times in times.items():
+        phase_times = command_times.pop("phases")
+        results[command] = _get_medians(command_times)
+        results[command]["phases"] = {phase: _get_medians(phase_times[phase]) for phase in phase_times}
+
+    with tempfile.TemporaryDirectory() as root:
+        scenario = trees.GENERATORS[name](root, scale)
+        tracemalloc.start()
+        try:
+            for command, result in run_commands(scenario, trace_memory=True).items():
+                results[command]["peak_memory"] = result["peak_memory"]
+                for phase, phase_result in result["phases"].items():
+                    results[command]["phases"].setdefault(phase, {})["peak_memory"] = phase_result["peak_memory"]
+        finally:
+            tracemalloc.stop()
+
+    return {"files": files, "commands": results}
+
+
+def run(scenarios, scale, repeat):
+    """
+    benchmark scenarios and get the results in the format saved as JSON
+    """
+    return {
+        "version": VERSION,
+        "scale": scale,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": {name: bench_scenario(name, scale, repeat) for name in scenarios},
+    }
+
+
+def _get_rows(commands):
+    """
+    get the results of each sub-command and then of each of its phases, along
+    with the name of the phase, "all" for the whole sub-command
+    """
+    for command, result in commands.items():
+        yield command, "all", result
+        for phase, phase_result in result.get("phases", {}).items():
+            yield command, phase, phase_result
+
+
+def compare(results, baseline, threshold):
+    """
+    get a line for every result compared with the baseline along with
+    whether it is a regression
+    """
+    lines = []
+    for scenario, scenario_results in results["scenarios"].items():
+        baseline_rows = {
+            (command, phase): result
+            for command, phase, result in _get_rows(baseline["scenarios"].get(scenario, {}).get("commands", {}))
+        }
+        for command, phase, result in _get_rows(scenario_results["commands"]):
+            baseline_result = baseline_rows.get((command, phase))
+            if baseline_result is None:
+                continue
+            for metric, min_difference in (("wall", MIN_TIME_DIFFERENCE), ("peak_memory", MIN_MEMORY_DIFFERENCE)):
+                value = result.get(metric)
+                baseline_value = baseline_result.get(metric)
+                if value is None or baseline_value is None:
+                    continue
+                ratio = value / baseline_value if baseline_value else float("inf")
+                is_regression = ratio > 1 + threshold and value - baseline_value > min_difference
+                lines.append((scenario, command, phase, metric, baseline_value, value, ratio, is_regression))
+    return lines
+
+
+def print_results(results):
+    """
+    print a table of the results
+    """
+    header = ("scenario", "command", "phase", "files", "wall (s)", "cpu (s)", "peak (KiB)")
+    print("{:<14} {:<7} {:<8} {:>7} {:>10} {:>10} {:>12}".format(*header))
+    for scenario, scenario_results in results["scenarios"].items():
+        for command, phase, result in _get_rows(scenario_results["commands"]):
+            print(
+                "{:<14} {:<7} {:<8} {:>7} {:>10.4f} {:>10.4f} {:>12.0f}".format(
+                    scenario,
+                    command,
+                    phase,
+                    scenario_results["files"],
+                    result["wall"],
+                    result["cpu"],
+                    result.get("peak_memory", 0) / 1024,
+                )
+            )
+
+
+def print_comparison(lines):
+    """
+    print a table of the results compared with the baseline
+    """
+    header = ("scenario", "command", "phase", "metric", "baseline", "current", "ratio")
+    print("{:<14} {:<7} {:<8} {:<12} {:>12} {:>12} {:>7}".format(*header))
+    for scenario, command, phase, metric, baseline_value, value, ratio, is_regression in lines:
+        print(
+            "{:<14} {:<7} {:<8} {:<12} {:>12.4g} {:>12.4g} {:>6.2f}x{}".format(
+                scenario, command, phase, metric, baseline_value, value, ratio, "  REGRESSION" if is_regression else ""
+            )
+        )
+
+
+def create_parser():
+    """
+    create the argument parser of the benchmark suite
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_dploy")
+    parser.add_argument("--scale", type=int, default=1, help="multiply the size of the trees (default: 1)")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions to take the median of (default: 5)")
+    parser.add_argument(
+        "--scenario",
+        dest="scenarios",
+        action="append",
+        choices=sorted(trees.GENERATORS),
+        help="scenario to run, all of them by default",
+    )
+    parser.add_argument("--output", metavar="FILE", help="save the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare saved results instead of running")
+    parser.add_argument("--baseline", metavar="FILE", help="results to flag regressions against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=2.0,
+        metavar="FRACTION",
+        help="how much slower or bigger than the baseline is a regression (default: 2.0)",
+    )
+    return parser
+
+
+def main(arguments):
+    """
+    run or load the benchmarks, save them and compare them with a baseline,
+    returns the exit status
+    """
+    parser = create_parser()
+    args = parser.parse_args(arguments)
+    if args.compare:
+        if not args.baseline:
+            parser.error("--compare needs --baseline")
+        with open(args.compare, "r", encoding="utf8") as results_file:
+            results = json.load(results_file)
+    else:
+        results = run(args.scenarios or list(trees.GENERATORS), args.scale, args.repeat)
+        print_results(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, "r", encoding="utf8") as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("scale") != results.get("scale"):
+        parser.error("the baseline was run with --scale {}".format(baseline.get("scale")))
+    lines = compare(results, baseline, args.threshold)
+    print()
+    print_comparison(lines)
+    return 1 if any(line[-1] for line in lines) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""
+Benchmark for checking ignore patterns against every entry of wide directories
+
+Compares the compiled ignore.Matcher with globbing the parent directory once
+per pattern for every entry, which is how ignore patterns used to be checked.
+
+Usage: python -m benchmarks.bench_ignore [WIDTH...]
+"""
+
+import pathlib
+import sys
+import tempfile
+import timeit
+
+from dploy import ignore, utils
+
+PATTERNS = ["*.pyc", "*.swp", "*~", ".git", "build", "node_modules", "__pycache__", "*.o"]
+WIDTHS = [100, 250, 500, 1000]
+
+
+def glob_should_ignore(patterns, source):
+    """
+    the parent directory glob based check that the Matcher replaces
+    """
+    for pattern in patterns:
+        for file in sorted(source.parent.glob(pattern)):
+            if utils.is_same_file(file, source) or source in file.parents:
+                return True
+    return False
+
+
+def create_wide_directory(directory, width):
+    """
+    create a directory with width files, one in ten of which is ignored
+    """
+    directory.mkdir()
+    for index in range(width):
+        suffix = ".pyc" if index % 10 == 0 else ".py"
+        (directory / "file_{index}{suffix}".format(index=index, suffix=suffix)).touch()
+    return sorted(directory.iterdir())
+
+
+def bench(width):
+    """
+    time checking every entry of a directory of the given width
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        entries = create_wide_directory(pathlib.Path(temp_dir) / "wide", width)
+        matcher = ignore.Matcher(PATTERNS)
+
+        glob_result = [glob_should_ignore(PATTERNS, entry) for entry in entries]
+        matcher_result = [matcher.matches(entry) for entry in entries]
+        assert glob_result == matcher_result
+
+        glob_time = timeit.timeit(lambda: [glob_should_ignore(PATTERNS, e) for e in entries], number=1)
+        matcher_time = timeit.timeit(lambda: [matcher.matches(e) for e in entries], number=1)
+        return glob_time, matcher_time
+
+
+def main(arguments):
+    """
+    print a table of the timings for each directory width
+    """
+    widths = [int(argument) for argument in arguments] or WIDTHS
+    print("{:>8} {:>12} {:>12} {:>10}".format("entries", "glob (s)", "matcher (s)", "speedup"))
+    for width in widths:
+        glob_time, matcher_time = bench(width)
+        speedup = glob_time / matcher_time if matcher_time else float("inf")
+        print("{:>8} {:>12.4f} {:>12.6f} {:>9.0f}x".format(width, glob_time, matcher_time, speedup))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,175 @@
+"""
+Generators of synthetic package trees for the benchmarks
+
+Every generator takes the directory to create the scenario in and a scale
+factor that multiplies the size of the trees, and returns a Scenario.
+"""
+
+import os
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Scenario(NamedTuple):
+    """
+    the packages to stow into a destination, and the files to link one by
+    one with the link sub-command
+    """
+
+    name: str
+    sources: List[str]
+    dest: str
+    ignore_patterns: Optional[List[str]]
+    links: List[Tuple[str, str]]
+    files: int
+
+
+def create_files(directory: str, names) -> int:
+    """
+    create empty files in a directory, creating it first if needed
+    """
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for name in names:
+        with open(os.path.join(directory, name), "w", encoding="utf8"):
+            count += 1
+    return count
+
+
+def get_links(directory: str, link_directory: str, count: int) -> List[Tuple[str, str]]:
+    """
+    pair up to count files of a directory with paths in link_directory
+    """
+    os.makedirs(link_directory, exist_ok=True)
+    names = sorted(os.listdir(directory))[:count]
+    return [(os.path.join(directory, name), os.path.join(link_directory, name)) for name in names]
+
+
+def create_deep(root: str, scale: int) -> Scenario:
+    """
+    two packages sharing a chain of nested directories, so that stowing the
+    second unfolds every level of it
+    """
+    depth = 25 * scale
+    sources = [os.path.join(root, name) for name in ("deep_a", "deep_b")]
+    files = 0
+    for source in sources:
+        directory = source
+        for level in range(depth):
+            directory = os.path.join(directory, "level_{}".format(level))
+            names = ["{}_{}".format(os.path.basename(source), index) for index in range(4)]
+            files += create_files(directory, names)
+    dest = os.path.join(root, "dest")
+    os.makedirs(dest)
+    links = get_links(os.path.join(sources[0], "level_0"), os.path.join(root, "links"), 20 * scale)
+    return Scenario("deep", sources, dest, None, links, files)
+
+
+def create_wide(root: str, scale: int) -> Scenario:
+    """
+    a package with one very wide directory that already exists in the
+    destination, so that each of its files is linked on its own
+    """
+    width = 3000 * scale
+    source = os.path.join(root, "wide")
+    files = create_files(os.path.join(source, "share"), ["file_{}".format(index) for index in range(width)])
+    dest = os.path.join(root, "dest")
+    os.makedirs(os.path.join(dest, "share"))
+    links = get_links(os.path.join(source, "share"), os.path.join(root, "links"), 200 * scale)
+    return Scenario("wide", [source], dest, None, links, files)
+
+
+def create_many_packages(root: str, scale: int) -> Scenario:
+    """
+    many small packages installing into the same directories
+    """
+    count = 300 * scale
+    sources = []
+    files = 0
+    for index in range(count):
+        source = os.path.join(root, "packages", "package_{}".format(index))
+        files += create_files(os.path.join(source, "bin"), ["tool_{}".format(index)])
+        files += create_files(
+            os.path.join(source, "share", "doc", "package_{}".format(index)), ["README", "LICENSE", "CHANGES"]
+        )
+        sources.append(source)
+    dest = os.path.join(root, "dest")
+    os.makedirs(os.path.join(dest, "bin"))
+    os.makedirs(os.path.join(dest, "share", "doc"))
+    links = [(os.path.join(source, "bin"), os.path.join(root, "links", os.path.basename(source))) for source in sources]
+    os.makedirs(os.path.join(root, "links"))
+    return Scenario("many_packages", sources, dest, None, links[: 50 * scale], files)
+
+
+def create_overlapping(root: str, scale: int) -> Scenario:
+    """
+    packages with the same directories nested a few levels deep, so that
+    every package after the first unfolds the links of the ones before it
+    """
+    count = 25 * scale
+    sources = []
+    files = 0
+    for index in range(count):
+        source = os.path.join(root, "overlapping", "package_{}".format(index))
+        for directory in ("lib", os.path.join("lib", "plugins"), os.path.join("share", "config", "app")):
+            names = ["{}_{}".format(index, name) for name in ("a", "b", "c", "d")]
+            files += create_files(os.path.join(source, directory), names)
+        sources.append(source)
+    dest = os.path.join(root, "dest")
+    os.makedirs(dest)
+    links = get_links(os.path.join(sources[0], "lib"), os.path.join(root, "links"), 4)
+    return Scenario("overlapping", sources, dest, None, links, files)
+
+
+def create_symlink_dense(root: str, scale: int) -> Scenario:
+    """
+    a destination full of links that don't belong to the package, some of
+    them broken links into it for clean to remove
+    """
+    width = 50 * scale
+    source = os.path.join(root, "dense")
+    files = 0
+    for index in range(width):
+        files += create_files(os.path.join(source, "dir_{}".format(index)), ["file_a", "file_b"])
+    dest = os.path.join(root, "dest")
+    other = os.path.join(root, "other")
+    create_files(other, ["target"])
+    for index in range(width):
+        directory = os.path.join(dest, "dir_{}".format(index))
+        os.makedirs(directory)
+        for link_index in range(40):
+            target = os.path.join(other, "target")
+            if link_index % 10 == 0:
+                target = os.path.join(source, "dir_{}".format(index), "removed_{}".format(link_index))
+            os.symlink(os.path.relpath(target, directory), os.path.join(directory, "link_{}".format(link_index)))
+    links = get_links(os.path.join(source, "dir_0"), os.path.join(root, "links"), 2)
+    return Scenario("symlink_dense", [source], dest, None, links, files)
+
+
+def create_large_ignore(root: str, scale: int) -> Scenario:
+    """
+    a package with a long list of ignore patterns, which one in five of its
+    files matches
+    """
+    width = 400 * scale
+    source = os.path.join(root, "ignored")
+    files = 0
+    for index in range(width // 20):
+        names = ["file_{}.{}".format(file_index, "tmp" if file_index % 5 == 0 else "txt") for file_index in range(20)]
+        files += create_files(os.path.join(source, "dir_{}".format(index)), names)
+    dest = os.path.join(root, "dest")
+    for index in range(width // 20):
+        os.makedirs(os.path.join(dest, "dir_{}".format(index)))
+    ignore_patterns = ["*.tmp"] + ["*.ext_{}".format(index) for index in range(300)]
+    ignore_patterns += ["build_{}".format(index) for index in range(200)]
+    links = get_links(os.path.join(source, "dir_0"), os.path.join(root, "links"), 20)
+    return Scenario("large_ignore", [source], dest, ignore_patterns, links, files)
+
+
+GENERATORS: Dict[str, Callable[[str, int], Scenario]] = {
+    "deep": create_deep,
+    "wide": create_wide,
+    "many_packages": create_many_packages,
+    "overlapping": create_overlapping,
+    "symlink_dense": create_symlink_dense,
+    "large_ignore": create_large_ignore,
+}
@@ -4,8 +4,10 @@
 """
 
 import sys
+from typing import Optional
 
-from dploy import linkcmd, stowcmd
+from dploy import journal, linkcmd, manifest, plancmd, result, stowcmd, watchcmd
+from dploy.result import Result
 from dploy.utils import StowIgnorePatterns, StowPath, StowSources
 
 assert sys.version_info >= (3, 3), "Requires Python 3.3 or Greater"
@@ -17,11 +19,30 @@ def stow(
     is_silent: bool = True,
     is_dry_run: bool = False,
     ignore_patterns: StowIgnorePatterns = None,
-):
+    jobs: int = 1,
+    use_manifest: bool = False,
+    incremental: bool = False,
+    use_journal: bool = False,
+    count_syscalls: bool = False,
+) -> Result:
     """
     sub command stow
     """
-    stowcmd.Stow(sources, dest, is_silent, is_dry_run, ignore_patterns)
+    return result.run(
+        "stow",
+        stowcmd.Stow,
+        is_dry_run,
+        count_syscalls,
+        sources,
+        dest,
+        is_silent,
+        is_dry_run,
+        ignore_patterns,
+        jobs=jobs,
+        use_manifest=use_manifest,
+        incremental=incremental,
+        use_journal=use_journal,
+    )
 
 
 def unstow(
@@ -30,11 +51,28 @@ def unstow(
     is_silent: bool = True,
     is_dry_run: bool = False,
     ignore_patterns: StowIgnorePatterns = None,
-):
+    jobs: int = 1,
+    use_manifest: bool = False,
+    use_journal: bool = False,
+    count_syscalls: bool = False,
+) -> Result:
     """
     sub command unstow
     """
-    stowcmd.UnStow(sources, dest, is_silent, is_dry_run, ignore_patterns)
+    return result.run(
+        "unstow",
+        stowcmd.UnStow,
+        is_dry_run,
+        count_syscalls,
+        sources,
+        dest,
+        is_silent,
+        is_dry_run,
+        ignore_patterns,
+        jobs=jobs,
+        use_manifest=use_manifest,
+        use_journal=use_journal,
+    )
 
 
 def clean(
@@ -43,11 +81,32 @@ def clean(
     is_silent: bool = True,
     is_dry_run: bool = False,
     ignore_patterns: StowIgnorePatterns = None,
-):
+    jobs: int = 1,
+    use_manifest: bool = False,
+    max_depth: Optional[int] = None,
+    prune_patterns: StowIgnorePatterns = None,
+    use_journal: bool = False,
+    count_syscalls: bool = False,
+) -> Result:
     """
     sub command clean
     """
-    stowcmd.Clean(sources, dest, is_silent, is_dry_run, ignore_patterns)
+    return result.run(
+        "clean",
+        stowcmd.Clean,
+        is_dry_run,
+        count_syscalls,
+        sources,
+        dest,
+        is_silent,
+        is_dry_run,
+        ignore_patterns,
+        jobs=jobs,
+        use_manifest=use_manifest,
+        max_depth=max_depth,
+        prune_patterns=prune_patterns,
+        use_journal=use_journal,
+    )
 
 
 def link(
@@ -56,8 +115,106 @@ def link(
     is_silent: bool = True,
     is_dry_run: bool = False,
     ignore_patterns: StowIgnorePatterns = None,
-):
+    use_journal: bool = False,
+    count_syscalls: bool = False,
+) -> Result:
     """
     sub command link
     """
-    linkcmd.Link(source, dest, is_silent, is_dry_run, ignore_patterns)
+    return result.run(
+        "link",
+        linkcmd.Link,
+        is_dry_run,
+        count_syscalls,
+        source,
+        dest,
+        is_silent,
+        is_dry_run,
+        ignore_patterns,
+        use_journal=use_journal,
+    )
+
+
+def plan(
+    subcmd: str,
+    sources,
+    dest: StowPath,
+    plan_file: StowPath,
+    is_silent: bool = True,
+    ignore_patterns: StowIgnorePatterns = None,
+    jobs: int = 1,
+    **options,
+):
+    """
+    sub command plan, saves the actions of the stow, unstow, clean or link
+    sub command to plan_file instead of executing them, options are the
+    keyword arguments of that sub command
+    """
+    return plancmd.make_plan(subcmd, sources, dest, plan_file, is_silent, ignore_patterns, jobs, **options)
+
+
+def apply(
+    plan_file: StowPath,
+    is_silent: bool = True,
+    is_dry_run: bool = False,
+    jobs: int = 1,
+    use_journal: bool = False,
+):
+    """
+    sub command apply
+    """
+    return plancmd.apply(plan_file, is_silent, is_dry_run, jobs, use_journal)
+
+
+def resume(
+    dest: StowPath,
+    is_silent: bool = True,
+    is_dry_run: bool = False,
+    jobs: int = 1,
+    rollback: bool = False,
+):
+    """
+    sub command resume, finishes the interrupted execution journaled in dest,
+    or undoes what it did if rollback
+    """
+    if rollback:
+        return journal.rollback(dest, is_silent, is_dry_run, jobs)
+    return journal.resume(dest, is_silent, is_dry_run, jobs)
+
+
+def watch(
+    sources: StowSources,
+    dest: StowPath,
+    is_silent: bool = True,
+    ignore_patterns: StowIgnorePatterns = None,
+    jobs: int = 1,
+    interval: float = 1.0,
+    debounce: float = 0.2,
+    use_polling: bool = False,
+    stop_event=None,
+):
+    """
+    sub command watch, runs until stop_event (a threading.Event) is set
+    """
+    watchcmd.Watch(
+        sources,
+        dest,
+        is_silent,
+        ignore_patterns,
+        jobs=jobs,
+        interval=interval,
+        debounce=debounce,
+        use_polling=use_polling,
+    ).run(stop_event)
+
+
+def status(
+    dest: StowPath,
+    sources: Optional[StowSources] = None,
+    verify: bool = False,
+):
+    """
+    query the links recorded in the manifest of dest, returns a list of
+    (manifest.Entry, state) tuples
+    """
+    return manifest.get_status(dest, sources, verify)
@@ -3,71 +3,422 @@
 commands
 """
 
-from collections import defaultdict
+import os
+import pathlib
+import stat
+from array import array
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-from dploy import error, utils
+from dploy import dirfd, error, output, planstore, syscalls, utils
 
 
 class Actions:
     """
     A class that collects and executes action objects
+
+    Actions are kept in a planstore.PlanStore in the order they were added, and
+    action objects are only made when they are looked at, e.g. to be printed or
+    executed. Such objects are equal to the ones that were added but not the
+    same, and changing them doesn't change the plan.
+
+    Links are indexed by destination and unlinks by target, so removing and
+    finding duplicate actions doesn't need to scan the whole plan.
+
+    With more than one job, actions that don't depend on each other are
+    executed on a pool of threads, see get_dependencies().
     """
 
-    def __init__(self, is_silent, is_dry_run):
-        self.actions = []
+    def __init__(self, is_silent, is_dry_run, jobs=1):
+        self._store = planstore.PlanStore()
+        self._count = 0
+        # path id => index of the SymbolicLink() record linking it, or NO_PATH
+        self._links = array("i")
+        # path id => the indexes of the records linking it, if more than one
+        self._duplicates = {}
+        # path id => number of UnLink() records of it
+        self._unlinks = array("i")
+        self._unlink_target_parents = Counter()
+        # the indexes of the current records once some were removed, made
+        # when needed
+        self._records = None
         self.is_silent = is_silent
         self.is_dry_run = is_dry_run
+        self.jobs = jobs
+        # a manifest.Manifest to record the executed actions in, if any
+        self.manifest = None
+        # a journal.Journal to record the progress of the execution in, if any
+        self.journal = None
+
+    @property
+    def actions(self):
+        """
+        the current actions in the order they will be executed
+        """
+        return list(self)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return (self._get_action(record) for record in self._get_records())
+
+    def __getitem__(self, index):
+        return self._get_action(self._get_records()[index])
+
+    def _get_records(self):
+        """
+        get the indexes of the current records in the order of the plan
+        """
+        if self._count == len(self._store):
+            return range(self._count)
+        if self._records is None:
+            kinds = self._store.kinds
+            self._records = array("i", (record for record in range(len(kinds)) if kinds[record]))
+        return self._records
+
+    def get_counts(self):
+        """
+        get the number of current actions of each kind by name, e.g. "link"
+        """
+        counts = {}
+        for kind in self._store.kinds:
+            if kind:
+                name = _ACTION_NAMES[_TYPES[kind]]
+                counts[name] = counts.get(name, 0) + 1
+        return counts
 
     def add(self, action):
         """
         Adds an action
         """
-        self.actions.append(action)
+        kind = _KINDS[type(action)]
+        if isinstance(action, AbstractLinkAction):
+            record = self._store.append(kind, action.subcmd, action.dest, action.source)
+            link_text = action._source_relative  # pylint: disable=protected-access
+            if link_text is not None and link_text != utils.get_relative_link_target(action.source, action.dest):
+                self._store.link_texts[record] = link_text
+        elif isinstance(action, UnLink):
+            record = self._store.append(kind, action.subcmd, action.target, action.source)
+        else:
+            record = self._store.append(kind, action.subcmd, action.target)
+        self._count += 1
+        self._records = None
+
+        missing = len(self._store.paths) - len(self._links)
+        if missing > 0:
+            self._links.extend(_NO_RECORDS * missing)
+            self._unlinks.extend(_NO_UNLINKS * missing)
+
+        target = self._store.targets[record]
+        if kind == _KINDS[SymbolicLink]:
+            first = self._links[target]
+            if first == planstore.NO_PATH:
+                self._links[target] = record
+            else:
+                self._duplicates.setdefault(target, [first]).append(record)
+        elif kind == _KINDS[UnLink]:
+            self._unlinks[target] += 1
+            self._unlink_target_parents[self._store.paths.parents[target]] += 1
+
+    def remove(self, action):
+        """
+        Removes an action
+        """
+        record = self._find(action)
+        if record is None:
+            raise KeyError(action)
+        self._store.discard(record)
+        self._count -= 1
+        self._records = None
+
+        target = self._store.targets[record]
+        if isinstance(action, SymbolicLink):
+            records = self._duplicates.get(target)
+            if records is None:
+                self._links[target] = planstore.NO_PATH
+            else:
+                records.remove(record)
+                self._links[target] = records[0]
+                if len(records) < 2:
+                    del self._duplicates[target]
+        elif isinstance(action, UnLink):
+            self._unlinks[target] -= 1
+            _decrement(self._unlink_target_parents, self._store.paths.parents[target])
+
+    def _find(self, action):
+        """
+        get the index of the earliest current record of an action, if any
+        """
+        if isinstance(action, AbstractLinkAction):
+            target = self._store.paths.find(action.dest)
+            source = None if target is None else self._store.find_source(target, action.source)
+            if source is None:
+                return None
+        else:
+            target, source = self._store.paths.find(action.target), None
+        if target is None:
+            return None
+
+        if isinstance(action, SymbolicLink):
+            records = self._duplicates.get(target, [self._links[target]])
+        elif isinstance(action, UnLink) and not self._unlinks[target]:
+            records = []
+        else:
+            records = range(len(self._store))
+        kind = _KINDS[type(action)]
+        for record in records:
+            if (
+                record != planstore.NO_PATH
+                and self._store.kinds[record] == kind
+                and self._store.targets[record] == target
+                and self._store.get_subcmd(record) == action.subcmd
+                and (source is None or self._store.sources[record] == source)
+            ):
+                return record
+        return None
+
+    def _get_action(self, record):
+        """
+        make the action object of a record
+        """
+        action_type = _TYPES[self._store.kinds[record]]
+        subcmd = self._store.get_subcmd(record)
+        target = self._store.paths.get_path(self._store.targets[record])
+        if issubclass(action_type, AbstractLinkAction):
+            return action_type(subcmd, self._store.get_source(record), target, self._store.link_texts.get(record))
+        if action_type is UnLink:
+            return UnLink(subcmd, target, self._store.get_source(record))
+        return action_type(subcmd, target)
 
     def execute(self):
         """
-        Prints and executes actions
+        Prints and executes actions, the messages go to output.get_output()
+        """
+        action_output = None if self.is_silent else output.get_output()
+        if self.is_dry_run:
+            if action_output is not None:
+                for action in self:
+                    action_output.add(action)
+                action_output.close()
+            self._store.paths.clear_cache()
+            return
+
+        directories = dirfd.DirectoryDescriptors() if dirfd.is_supported() else None
+        is_complete = False
+        if self.journal is not None and self._count:
+            self.journal.begin(self)
+        try:
+            if self.jobs > 1:
+                self._execute_in_parallel(directories, action_output)
+            else:
+                for index, action in enumerate(self):
+                    if action_output is not None:
+                        action_output.add(action)
+                    action.execute(directories)
+                    if self.manifest is not None:
+                        self.manifest.record(action)
+                    if self.journal is not None:
+                        self.journal.record(action, index)
+            is_complete = True
+        except error.DployError as dploy_error:
+            if action_output is not None:
+                action_output.error(dploy_error)
+            raise
+        finally:
+            if action_output is not None:
+                action_output.close()
+            if directories is not None:
+                directories.close()
+            if self.manifest is not None:
+                self.manifest.save(is_complete)
+            if self.journal is not None:
+                self.journal.close(is_complete)
+            # the plan is kept around for the result
+            self._store.paths.clear_cache()
+
+    def _execute_in_parallel(self, directories, action_output):
+        """
+        execute actions on a pool of threads as soon as the actions they
+        depend on are done, printing them in plan order as they complete
+
+        Like executing in order, the first failing action in the plan is
+        raised once every action before it is done, and nothing after it is
+        printed.
+        """
+        records = self._get_records()
+        # index => the indexes of the actions waiting on it, if any
+        dependents = {}
+        waiting_on = array("i")
+        for index, dependencies in enumerate(self._get_dependencies(records)):
+            waiting_on.append(len(dependencies))
+            for dependency in dependencies:
+                dependents.setdefault(dependency, []).append(index)
+
+        ready = deque(index for index, count in enumerate(waiting_on) if count == 0)
+        is_done = bytearray(len(records))
+        failures = {}
+        printed = 0
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="dploy") as executor:
+            while ready or running:
+                while ready and len(running) < self.jobs * 4:
+                    index = ready.popleft()
+                    if failures and index > min(failures):
+                        continue  # it would never have run in order either
+                    action = self._get_action(records[index])
+                    running[executor.submit(action.execute, directories)] = (index, action)
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index, action = running.pop(future)
+                    exception = future.exception()
+                    if exception is not None:
+                        failures[index] = exception
+                        continue
+                    is_done[index] = True
+                    if self.manifest is not None:
+                        self.manifest.record(action)
+                    if self.journal is not None:
+                        self.journal.record(action, index)
+                    for dependent in dependents.pop(index, ()):
+                        waiting_on[dependent] -= 1
+                        if waiting_on[dependent] == 0:
+                            ready.append(dependent)
+
+                while printed < len(records) and is_done[printed]:
+                    if action_output is not None:
+                        action_output.add(self._get_action(records[printed]))
+                    printed += 1
+
+        if failures:
+            first_failure = min(failures)
+            if action_output is not None:
+                action_output.add(self._get_action(records[first_failure]))
+            raise failures[first_failure]
+
+    def _get_dependencies(self, records):
+        """
+        get the dependencies of each record like get_dependencies(), from the
+        ids of the paths rather than the actions
+        """
+        store = self._store
+        is_target = bytearray(len(store.paths))
+        for record in records:
+            if store.kinds[record] in _KINDS_WITH_PATH:
+                is_target[store.targets[record]] = True
+        paths = (store.targets[record] if store.kinds[record] in _KINDS_WITH_PATH else None for record in records)
+        return _get_dependencies(paths, is_target.__getitem__, self._get_ancestors)
+
+    def _get_ancestors(self, node):
+        parents = self._store.paths.parents
+        node = parents[node]
+        while node != planstore.NO_PATH:
+            yield node
+            node = parents[node]
+
+    def get_actions_of_type(self, action_type):
+        """
+        get the current actions of a given type in the order they were added
         """
-        for action in self.actions:
-            if not self.is_silent:
-                print(action)
-            if not self.is_dry_run:
-                action.execute()
+        kind = _KINDS.get(action_type)
+        if kind is None:
+            return []
+        kinds = self._store.kinds
+        return [self._get_action(record) for record in range(len(kinds)) if kinds[record] == kind]
 
     def get_unlink_actions(self):
         """
         get the current Unlink() actions from the self.actions
         """
-        return [a for a in self.actions if isinstance(a, UnLink)]
+        return self.get_actions_of_type(UnLink)
 
     def get_unlink_target_parents(self):
         """
         Get list of the parents for the current Unlink() actions from
         self.actions
         """
-        unlink_actions = self.get_unlink_actions()
         # sort for deterministic output
-        return sorted({a.target.parent for a in unlink_actions})
+        return sorted(
+            pathlib.Path(".") if parent == planstore.NO_PATH else self._store.paths.get_path(parent)
+            for parent in self._unlink_target_parents
+        )
 
     def get_unlink_targets(self):
         """
         Get list of the targets for the current Unlink() actions from
         self.actions
         """
-        unlink_actions = self.get_unlink_actions()
-        return [a.target for a in unlink_actions]
+        return [a.target for a in self.get_unlink_actions()]
+
+    def is_unlink_target(self, path):
+        """
+        check if there is an Unlink() action for a path
+        """
+        target = self._store.paths.find(path)
+        return target is not None and self._unlinks[target] > 0
 
     def get_duplicates(self):
         """
-        return a tuple containing tuples with the following structure
-        (link destination, [indices of duplicates])
+        return a list of the groups of SymbolicLink() actions that link the
+        same destination, in the order they were added
         """
-        tally = defaultdict(list)
-        for index, action in enumerate(self.actions):
-            if isinstance(action, SymbolicLink):
-                tally[action.dest].append(index)
         # sort for deterministic output
-        return sorted([indices for _, indices in tally.items() if len(indices) > 1])
+        groups = sorted(self._duplicates.values(), key=lambda records: records[0])
+        return [[self._get_action(record) for record in records] for records in groups]
+
+
+def get_dependencies(plan):
+    """
+    get the indices of the earlier actions in a plan that each action has to
+    wait for
+
+    An action depends on the earlier actions on the same path, on an ancestor
+    of it, e.g. the MakeDirectory() of the directory a link is created in, and
+    on a descendant of it, e.g. the UnLink() of the links in a directory that
+    is then removed. Actions on unrelated paths can run in any order.
+    """
+    paths = [action.path for action in plan]
+    return list(_get_dependencies(paths, set(paths).__contains__, lambda path: path.parents))
+
+
+def _get_dependencies(paths, is_target, get_ancestors):
+    """
+    yield the dependencies of the actions of a plan from their paths, None for
+    an action without one, as get_dependencies() gets them, only keeping track
+    of what is beneath the ancestors that is_target() says an action is about
+    """
+    last_on_path = {}
+    # the actions beneath a path since the last action on the path itself,
+    # which already depends on everything before it
+    since_last_on_path = defaultdict(list)
+
+    for index, path in enumerate(paths):
+        if path is None:
+            yield []
+            continue
+
+        action_dependencies = set(since_last_on_path.pop(path, ()))
+        if path in last_on_path:
+            action_dependencies.add(last_on_path[path])
+        for ancestor in get_ancestors(path):
+            if ancestor in last_on_path:
+                action_dependencies.add(last_on_path[ancestor])
+            if is_target(ancestor):
+                since_last_on_path[ancestor].append(index)
+
+        last_on_path[path] = index
+        yield sorted(action_dependencies)
+
+
+def _decrement(counter, key):
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
 
 
 class AbstractBaseAction:
@@ -76,32 +427,82 @@ class AbstractBaseAction:
     An abstract base class that define the interface for actions
     """
 
+    # the attributes that tell actions of the same type and sub-command apart
+    _fields = ()
+
     def __init__(self):
         pass
 
-    def execute(self):
+    def _get_key(self):
+        return (getattr(self, "subcmd", None),) + tuple(getattr(self, field) for field in self._fields)
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self._get_key() == other._get_key()  # pylint: disable=protected-access
+
+    def __hash__(self):
+        return hash((type(self),) + self._get_key())
+
+    @property
+    def path(self):
+        """
+        the path the action changes, if any
+        """
+        return None
+
+    def execute(self, directories=None):
         """
-        function that executes the logic of each concrete action
+        function that executes the logic of each concrete action, relative to
+        the open directory descriptors in directories if given
         """
         pass
 
 
-class SymbolicLink(AbstractBaseAction):
+class AbstractLinkAction(AbstractBaseAction):
     # pylint: disable=too-few-public-methods
     """
-    Action to create a symbolic link relative to the source of the link
+    An abstract base class for the actions about a link at dest to source,
+    whose text is source_relative if given, e.g. to restore a link exactly
     """
 
-    def __init__(self, subcmd, source, dest):
+    _fields = ("source", "dest")
+
+    def __init__(self, subcmd, source, dest, source_relative=None):
         super().__init__()
         self.source = source
-        self.source_relative = utils.get_relative_path(source, dest.parent)
         self.subcmd = subcmd
         self.dest = dest
+        self._source_relative = source_relative
 
-    def execute(self):
+    @property
+    def source_relative(self):
+        """
+        the text of the link, which is only computed when the action is
+        printed or executed
+        """
+        if self._source_relative is None:
+            self._source_relative = utils.get_relative_link_target(self.source, self.dest)
+        return self._source_relative
+
+
+class SymbolicLink(AbstractLinkAction):
+    # pylint: disable=too-few-public-methods
+    """
+    Action to create a symbolic link relative to the source of the link
+    """
+
+    @property
+    def path(self):
+        return self.dest
+
+    def execute(self, directories=None):
         try:
-            self.dest.symlink_to(self.source_relative)
+            with syscalls.count("symlink"):
+                if directories is None:
+                    self.dest.symlink_to(self.source_relative)
+                else:
+                    directories.call(os.symlink, self.dest, os.fspath(self.source_relative))
         except PermissionError as permission_error:
             raise error.InsufficientPermissionsToSubcmdTo(self.subcmd, self.dest) from permission_error
 
@@ -111,20 +512,13 @@ def __repr__(self):
         )
 
 
-class AlreadyLinked(AbstractBaseAction):
+class AlreadyLinked(AbstractLinkAction):
     # pylint: disable=too-few-public-methods
     """
     Action to used to print an already linked message
     """
 
-    def __init__(self, subcmd, source, dest):
-        super().__init__()
-        self.source = source
-        self.source_relative = utils.get_relative_path(source, dest.parent)
-        self.dest = dest
-        self.subcmd = subcmd
-
-    def execute(self):
+    def execute(self, directories=None):
         pass
 
     def __repr__(self):
@@ -133,20 +527,13 @@ def __repr__(self):
         )
 
 
-class AlreadyUnlinked(AbstractBaseAction):
+class AlreadyUnlinked(AbstractLinkAction):
     # pylint: disable=too-few-public-methods
     """
     Action to used to print an already unlinked message
     """
 
-    def __init__(self, subcmd, source, dest):
-        super().__init__()
-        self.source = source
-        self.source_relative = utils.get_relative_path(source, dest.parent)
-        self.dest = dest
-        self.subcmd = subcmd
-
-    def execute(self):
+    def execute(self, directories=None):
         pass
 
     def __repr__(self):
@@ -158,27 +545,52 @@ def __repr__(self):
 class UnLink(AbstractBaseAction):
     # pylint: disable=too-few-public-methods
     """
-    Action to unlink a symbolic link
+    Action to unlink a symbolic link, source is what it points to if known,
+    which is only used for its message
     """
 
-    def __init__(self, subcmd, target):
+    _fields = ("target",)
+
+    def __init__(self, subcmd, target, source=None):
         super().__init__()
         self.target = target
         self.subcmd = subcmd
+        self.source = source
 
-    def execute(self):
-        if not self.target.is_symlink():
+    @property
+    def path(self):
+        return self.target
+
+    def execute(self, directories=None):
+        with syscalls.count("lstat"):
+            is_symlink = self._is_symlink(directories)
+        if not is_symlink:
             # pylint: disable=line-too-long
             raise RuntimeError(
                 "dploy detected and aborted an attempt to unlink a non-symlink {target} this is a bug and should be reported".format(
                     target=self.target
                 )
             )
-        self.target.unlink()
+        with syscalls.count("unlink"):
+            if directories is None:
+                self.target.unlink()
+            else:
+                directories.forget(self.target)
+                directories.call(os.unlink, self.target)
+
+    def _is_symlink(self, directories):
+        if directories is None:
+            return self.target.is_symlink()
+        try:
+            return stat.S_ISLNK(directories.call(os.stat, self.target, follow_symlinks=False).st_mode)
+        except (FileNotFoundError, NotADirectoryError):
+            return False
 
     def __repr__(self):
+        if self.source is None:
+            return "dploy {subcmd}: unlink {target}".format(subcmd=self.subcmd, target=self.target)
         return "dploy {subcmd}: unlink {target} => {source}".format(
-            subcmd=self.subcmd, target=self.target, source=utils.readlink(self.target)
+            subcmd=self.subcmd, target=self.target, source=self.source
         )
 
 
@@ -188,13 +600,23 @@ class MakeDirectory(AbstractBaseAction):
     Action to create a directory
     """
 
+    _fields = ("target",)
+
     def __init__(self, subcmd, target):
         super().__init__()
         self.target = target
         self.subcmd = subcmd
 
-    def execute(self):
-        self.target.mkdir()
+    @property
+    def path(self):
+        return self.target
+
+    def execute(self, directories=None):
+        with syscalls.count("mkdir"):
+            if directories is None:
+                self.target.mkdir()
+            else:
+                directories.call(os.mkdir, self.target)
 
     def __repr__(self):
         return "dploy {subcmd}: make directory {target}".format(target=self.target, subcmd=self.subcmd)
@@ -206,14 +628,88 @@ class RemoveDirectory(AbstractBaseAction):
     Action to remove a directory
     """
 
+    _fields = ("target",)
+
     def __init__(self, subcmd, target):
         super().__init__()
         self.target = target
         self.subcmd = subcmd
 
-    def execute(self):
-        self.target.rmdir()
+    @property
+    def path(self):
+        return self.target
+
+    def execute(self, directories=None):
+        with syscalls.count("rmdir"):
+            if directories is None:
+                self.target.rmdir()
+            else:
+                directories.forget(self.target, recursive=True)
+                directories.call(os.rmdir, self.target)
 
     def __repr__(self):
         msg = "dploy {subcmd}: remove directory {target}"
         return msg.format(target=self.target, subcmd=self.subcmd)
+
+
+# the name of an action when it is saved, e.g. in a plan or a journal => its
+# class and the attributes it is constructed from besides the sub-command
+_ACTION_TYPES = {
+    "link": (SymbolicLink, ("source", "dest")),
+    "already_linked": (AlreadyLinked, ("source", "dest")),
+    "already_unlinked": (AlreadyUnlinked, ("source", "dest")),
+    "unlink": (UnLink, ("target",)),
+    "make_directory": (MakeDirectory, ("target",)),
+    "remove_directory": (RemoveDirectory, ("target",)),
+}
+_ACTION_NAMES = {action_type: name for name, (action_type, _) in _ACTION_TYPES.items()}
+# the kind of an action in a planstore.PlanStore, 0 is left for removed ones
+_TYPES = [None] + [action_type for action_type, _ in _ACTION_TYPES.values()]
+_KINDS = {action_type: kind for kind, action_type in enumerate(_TYPES) if action_type is not None}
+# the kinds of the actions that have a path, see AbstractBaseAction.path
+_KINDS_WITH_PATH = {_KINDS[action_type] for action_type in (SymbolicLink, UnLink, MakeDirectory, RemoveDirectory)}
+_NO_RECORDS = array("i", [planstore.NO_PATH])
+_NO_UNLINKS = array("i", [0])
+
+
+def get_name(action):
+    """
+    get the name of the kind of an action, e.g. "link" or "unlink"
+    """
+    return _ACTION_NAMES[type(action)]
+
+
+def to_dict(action):
+    """
+    get the name of an action along with the paths it is made of by name, and
+    the text of the link an UnLink removes if known
+    """
+    name = get_name(action)
+    _, attributes = _ACTION_TYPES[name]
+    data = {"action": name}
+    for attribute in attributes:
+        data[attribute] = os.fspath(getattr(action, attribute))
+    if isinstance(action, UnLink) and action.source is not None:
+        data["source"] = os.fspath(action.source)
+    return data
+
+
+def to_data(action):
+    """
+    get a list of strings that from_data() turns back into the action
+    """
+    name = get_name(action)
+    _, attributes = _ACTION_TYPES[name]
+    return [name] + [os.fspath(getattr(action, attribute)) for attribute in attributes]
+
+
+def from_data(subcmd, data):
+    """
+    get the action saved by to_data(), raises KeyError or TypeError if data
+    isn't one
+    """
+    name, *paths = data
+    action_type, attributes = _ACTION_TYPES[name]
+    if len(paths) != len(attributes):
+        raise TypeError(data)
+    return action_type(subcmd, *[pathlib.Path(path) for path in paths])
@@ -2,11 +2,20 @@
 The command line interface
 """
 
+import cProfile
 import sys
 import argparse
+from contextlib import nullcontext
+from dploy import journal
 from dploy import linkcmd
+from dploy import manifest
+from dploy import output
+from dploy import plancmd
 from dploy import stowcmd
+from dploy import syscalls
+from dploy import timings
 from dploy import version
+from dploy import watchcmd
 from dploy.error import DployError
 
 
@@ -23,31 +32,71 @@ def add_ignore_argument(parser):
     )
 
 
-def create_parser():
+def add_verify_argument(parser):
     """
-    create the CLI argument parser
+    adds the verify argument to a subcmd parser
     """
-    parser = argparse.ArgumentParser(prog="dploy")
-
-    parser.add_argument(
-        "--version",
-        action="version",
-        version="%(prog)s {version}".format(version=version.__version__),
-    )
-    parser.add_argument("--silent", dest="is_silent", action="store_true", help="suppress all output")
     parser.add_argument(
-        "--dry-run",
-        dest="is_dry_run",
+        "--verify",
+        dest="verify",
         action="store_true",
-        help="show what would be done without doing it",
+        help="check the links recorded in the manifest against the file system",
     )
 
-    sub_parsers = parser.add_subparsers(dest="subcmd")
 
+def positive_int(value):
+    """
+    argparse type for arguments that must be a positive integer
+    """
+    try:
+        number = int(value)
+    except ValueError as value_error:
+        raise argparse.ArgumentTypeError("invalid positive int value: '{}'".format(value)) from value_error
+    if number < 1:
+        raise argparse.ArgumentTypeError("invalid positive int value: '{}'".format(value))
+    return number
+
+
+def positive_float(value):
+    """
+    argparse type for arguments that must be a positive number of seconds
+    """
+    try:
+        number = float(value)
+    except ValueError as value_error:
+        raise argparse.ArgumentTypeError("invalid positive float value: '{}'".format(value)) from value_error
+    if not number > 0:
+        raise argparse.ArgumentTypeError("invalid positive float value: '{}'".format(value))
+    return number
+
+
+def non_negative_int(value):
+    """
+    argparse type for arguments that must be zero or a positive integer
+    """
+    if value == "0":
+        return 0
+    try:
+        return positive_int(value)
+    except argparse.ArgumentTypeError as type_error:
+        raise argparse.ArgumentTypeError("invalid non-negative int value: '{}'".format(value)) from type_error
+
+
+def add_subcmd_parsers(sub_parsers):
+    """
+    adds the parsers of the stow, unstow, clean and link sub-commands, which
+    can also be planned, and returns them
+    """
     stow_parser = sub_parsers.add_parser("stow")
     stow_parser.add_argument("source", nargs="+", help="source directory to stow")
     stow_parser.add_argument("dest", help="destination path to stow into")
     add_ignore_argument(stow_parser)
+    stow_parser.add_argument(
+        "--incremental",
+        dest="incremental",
+        action="store_true",
+        help="only look at the source directories modified since the last stow recorded in the manifest",
+    )
 
     unstow_parser = sub_parsers.add_parser("unstow")
     unstow_parser.add_argument("source", nargs="+", help="source directory to unstow from")
@@ -58,19 +107,192 @@ def create_parser():
     clean_parser.add_argument("source", nargs="+", help="source directory to clean from")
     clean_parser.add_argument("dest", help="destination path to clean")
     add_ignore_argument(clean_parser)
+    clean_parser.add_argument(
+        "--max-depth",
+        dest="max_depth",
+        type=non_negative_int,
+        default=None,
+        metavar="N",
+        help="only look for broken links N directories deep into the destination",
+    )
+    clean_parser.add_argument(
+        "--prune",
+        dest="prune_patterns",
+        action="append",
+        default=None,
+        metavar="PATTERN",
+        help="glob pattern of destination directories not to look into, e.g. node_modules",
+    )
 
     link_parser = sub_parsers.add_parser("link")
     link_parser.add_argument("source", help="source file or directory to link")
     link_parser.add_argument("dest", help="destination path to link")
     add_ignore_argument(link_parser)
+    return [stow_parser, unstow_parser, clean_parser, link_parser]
+
+
+def create_parser():
+    """
+    create the CLI argument parser
+    """
+    parser = argparse.ArgumentParser(prog="dploy")
+
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s {version}".format(version=version.__version__),
+    )
+    parser.add_argument("--silent", dest="is_silent", action="store_true", help="suppress all output")
+    parser.add_argument(
+        "--dry-run",
+        dest="is_dry_run",
+        action="store_true",
+        help="show what would be done without doing it",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        dest="jobs",
+        type=positive_int,
+        default=1,
+        metavar="N",
+        help="list directories and execute independent actions on N threads (default: 1)",
+    )
+    parser.add_argument(
+        "--manifest",
+        dest="use_manifest",
+        action="store_true",
+        help="record the links created in a manifest in the destination and unstow and clean from it",
+    )
+    parser.add_argument(
+        "--output",
+        dest="output_format",
+        choices=sorted(output.FORMATS),
+        default="text",
+        help="print every action (text), a line per directory (summary) or a JSON event per line (jsonl)",
+    )
+    parser.add_argument(
+        "--summary",
+        dest="output_format",
+        action="store_const",
+        const="summary",
+        help="print how many entries each kind of action changed in each directory, same as --output=summary",
+    )
+    parser.add_argument(
+        "--timings",
+        dest="show_timings",
+        action="store_true",
+        help="print the wall and CPU time of each phase of the sub-command to stderr",
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile_file",
+        default=None,
+        metavar="FILE",
+        help="profile the sub-command with cProfile and save the stats to FILE for pstats",
+    )
+    parser.add_argument(
+        "--stats",
+        dest="show_stats",
+        action="store_true",
+        help="print the system calls made by each phase of the sub-command for each source to stderr",
+    )
+    parser.add_argument(
+        "--journal",
+        dest="use_journal",
+        action="store_true",
+        help="record the progress of the execution in the destination so that dploy resume can finish it",
+    )
+
+    sub_parsers = parser.add_subparsers(dest="subcmd")
+    add_subcmd_parsers(sub_parsers)
+
+    plan_parser = sub_parsers.add_parser("plan")
+    plan_sub_parsers = plan_parser.add_subparsers(dest="plan_subcmd")
+    for subcmd_parser in add_subcmd_parsers(plan_sub_parsers):
+        subcmd_parser.add_argument(
+            "--plan-file",
+            "-o",
+            dest="plan_file",
+            required=True,
+            metavar="FILE",
+            help="file to save the plan to",
+        )
+
+    apply_parser = sub_parsers.add_parser("apply")
+    apply_parser.add_argument("plan_file", help="plan saved by dploy plan")
+
+    resume_parser = sub_parsers.add_parser("resume")
+    resume_parser.add_argument("dest", help="destination path with the journal of an interrupted execution")
+    resume_parser.add_argument(
+        "--rollback",
+        dest="rollback",
+        action="store_true",
+        help="undo what the interrupted execution did instead of finishing it",
+    )
+
+    watch_parser = sub_parsers.add_parser("watch")
+    watch_parser.add_argument("source", nargs="+", help="source directory to stow and watch")
+    watch_parser.add_argument("dest", help="destination path to keep in sync")
+    add_ignore_argument(watch_parser)
+    watch_parser.add_argument(
+        "--interval",
+        dest="interval",
+        type=positive_float,
+        default=1.0,
+        metavar="SECONDS",
+        help="how often to look for changes when polling (default: 1)",
+    )
+    watch_parser.add_argument(
+        "--debounce",
+        dest="debounce",
+        type=positive_float,
+        default=0.2,
+        metavar="SECONDS",
+        help="wait until there were no changes for this long before restowing (default: 0.2)",
+    )
+    watch_parser.add_argument(
+        "--poll",
+        dest="use_polling",
+        action="store_true",
+        help="poll for changes even where inotify is available",
+    )
+
+    status_parser = sub_parsers.add_parser("status")
+    status_parser.add_argument("source", nargs="*", help="only show the links of these source directories")
+    status_parser.add_argument("dest", help="destination path with a manifest")
+    add_verify_argument(status_parser)
     return parser
 
 
-def run(arguments=None):
+def print_status(args):
     """
-    interpret the parser arguments and execute the corresponding commands
+    print the links recorded in the manifest of the destination
     """
+    for entry, state in manifest.get_status(args.dest, args.source or None, args.verify):
+        if not args.is_silent:
+            print("dploy status: {state} {link} => {target}".format(state=state, link=entry.link, target=entry.target))
 
+
+def get_subcmd_options(subcmd, args):
+    """
+    get the keyword arguments that only some sub-commands take
+    """
+    options = {"use_journal": args.use_journal}
+    if subcmd != "link":
+        options["use_manifest"] = args.use_manifest
+    if subcmd == "stow":
+        options["incremental"] = args.incremental
+    if subcmd == "clean":
+        options["max_depth"] = args.max_depth
+        options["prune_patterns"] = args.prune_patterns
+    return options
+
+
+def run_subcmd(parser, args):
+    """
+    execute the sub-command chosen by the parser arguments
+    """
     subcmd_map = {
         "stow": stowcmd.Stow,
         "unstow": stowcmd.UnStow,
@@ -78,31 +300,138 @@ def run(arguments=None):
         "link": linkcmd.Link,
     }
 
-    try:
-        parser = create_parser()
+    if args.subcmd == "status":
+        print_status(args)
+        return
 
-        if arguments is None:
-            args = parser.parse_args()
-        else:
-            args = parser.parse_args(arguments)
+    if args.subcmd == "watch":
+        if args.is_dry_run:
+            parser.error("--dry-run can't be used with watch, use stow --dry-run")
+        try:
+            watchcmd.Watch(
+                args.source,
+                args.dest,
+                is_silent=args.is_silent,
+                ignore_patterns=args.ignore_patterns,
+                jobs=args.jobs,
+                interval=args.interval,
+                debounce=args.debounce,
+                use_polling=args.use_polling,
+            ).run()
+        except DployError:
+            sys.exit(1)
+        return
 
-        if args.subcmd in subcmd_map:
-            subcmd = subcmd_map[args.subcmd]
-        else:
-            parser.print_help()
-            sys.exit(0)
+    if args.subcmd == "apply":
+        try:
+            plancmd.apply(
+                args.plan_file,
+                is_silent=args.is_silent,
+                is_dry_run=args.is_dry_run,
+                jobs=args.jobs,
+                use_journal=args.use_journal,
+            )
+        except DployError:
+            sys.exit(1)
+        return
 
+    if args.subcmd == "resume":
+        resume = journal.rollback if args.rollback else journal.resume
         try:
-            subcmd(
+            resume(args.dest, is_silent=args.is_silent, is_dry_run=args.is_dry_run, jobs=args.jobs)
+        except DployError:
+            sys.exit(1)
+        return
+
+    if args.subcmd == "plan":
+        if args.plan_subcmd is None:
+            parser.error("plan needs one of the sub-commands: {}".format(", ".join(subcmd_map)))
+        try:
+            plancmd.make_plan(
+                args.plan_subcmd,
                 args.source,
                 args.dest,
+                args.plan_file,
                 is_silent=args.is_silent,
-                is_dry_run=args.is_dry_run,
                 ignore_patterns=args.ignore_patterns,
+                jobs=args.jobs,
+                **get_subcmd_options(args.plan_subcmd, args),
             )
         except DployError:
             sys.exit(1)
+        return
+
+    if args.subcmd in subcmd_map:
+        subcmd = subcmd_map[args.subcmd]
+    else:
+        parser.print_help()
+        sys.exit(0)
+
+    options = get_subcmd_options(args.subcmd, args)
+
+    try:
+        subcmd(
+            args.source,
+            args.dest,
+            is_silent=args.is_silent,
+            is_dry_run=args.is_dry_run,
+            ignore_patterns=args.ignore_patterns,
+            jobs=args.jobs,
+            **options,
+        )
+    except DployError:
+        sys.exit(1)
+
+
+def run(arguments=None):
+    """
+    interpret the parser arguments and execute the corresponding commands
+    """
+    try:
+        parser = create_parser()
+
+        if arguments is None:
+            args = parser.parse_args()
+        else:
+            args = parser.parse_args(arguments)
+
+        # every sub-command executed in this run, e.g. by watch, reports to it
+        action_output = None if args.is_silent else output.FORMATS[args.output_format]()
+        with output.use(action_output):
+            run_instrumented(parser, args)
 
     except KeyboardInterrupt as error:
         print(error, file=sys.stderr)
         sys.exit(130)
+
+
+def run_instrumented(parser, args):
+    """
+    execute the sub-command while recording what --timings, --profile and
+    --stats asked for
+    """
+    if not args.show_timings and args.profile_file is None and not args.show_stats:
+        run_subcmd(parser, args)
+        return
+
+    recorded_timings = timings.Timings()
+    counter = syscalls.Counter()
+    profiler = cProfile.Profile() if args.profile_file is not None else None
+    try:
+        # counting the system calls would skew the timings and profile if
+        # it wasn't asked for
+        counting = syscalls.record(counter) if args.show_stats else nullcontext()
+        with timings.record(recorded_timings), counting:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                run_subcmd(parser, args)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    profiler.dump_stats(args.profile_file)
+    finally:
+        if args.show_timings:
+            recorded_timings.print()
+        if args.show_stats:
+            counter.print()
@@ -0,0 +1,159 @@
+"""
+Open descriptors of the directories that actions are executed in, so that each
+action is a system call relative to its parent directory instead of a walk of
+its full path
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+_FUNCTIONS = (os.open, os.stat, os.symlink, os.unlink, os.mkdir, os.rmdir)
+
+# a descriptor only for use as dir_fd needs the directory to be searchable but
+# not readable, where the platform has O_PATH
+_OPEN_FLAGS = os.O_DIRECTORY | getattr(os, "O_PATH", os.O_RDONLY) if hasattr(os, "O_DIRECTORY") else 0
+
+
+def is_supported() -> bool:
+    """
+    check if the platform can create and remove files relative to a directory
+    descriptor, which is the case on Linux and macOS but not Windows
+    """
+    return hasattr(os, "O_DIRECTORY") and all(function in os.supports_dir_fd for function in _FUNCTIONS)
+
+
+def _open_directory(directory: str) -> int:
+    return os.open(directory, _OPEN_FLAGS)
+
+
+def _close(descriptor: Optional[int]) -> None:
+    if descriptor is not None:
+        os.close(descriptor)
+
+
+class DirectoryDescriptors:
+    """
+    A bounded pool of open directory descriptors shared by the threads
+    executing actions.
+
+    A directory is opened the first time an action in it runs and stays open
+    for the actions after it, so a directory with many links in it is only
+    looked up once. The least recently used descriptors that aren't in use are
+    closed once more than max_open are open.
+    """
+
+    def __init__(self, max_open: int = 128):
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        # directory => [descriptor, number of users, is stale]
+        self._descriptors: Dict[str, List[Any]] = OrderedDict()
+
+    @contextmanager
+    def open(self, directory: Path) -> Iterator[Optional[int]]:
+        """
+        get an open descriptor of a directory for the duration of a with block,
+        None if the directory can't be opened because it isn't readable
+        """
+        key = os.fspath(directory)
+        record = self._acquire(key)
+        if record is None:
+            # opened outside of the lock, so the other threads don't wait on it
+            try:
+                descriptor: Optional[int] = _open_directory(key)
+            except PermissionError:
+                descriptor = None
+            record = self._acquire(key, descriptor)
+
+        try:
+            yield record[0]
+        finally:
+            with self._lock:
+                record[1] -= 1
+                if record[2] and record[1] == 0:
+                    _close(record[0])
+                self._close_least_recently_used()
+
+    def _acquire(self, key: str, descriptor: Optional[int] = -1) -> Optional[List[Any]]:
+        """
+        get the record of a directory and count one more user of it, adding
+        one for descriptor unless it is -1, i.e. the directory wasn't opened
+        yet. A descriptor opened by another thread in the meantime wins.
+        """
+        with self._lock:
+            record = self._descriptors.get(key)
+            if record is None:
+                if descriptor == -1:
+                    return None
+                record = [descriptor, 0, False]
+                self._descriptors[key] = record
+            else:
+                if descriptor != -1:
+                    _close(descriptor)
+                self._descriptors.move_to_end(key)  # type: ignore[attr-defined]
+            record[1] += 1
+        return record
+
+    def call(self, function: Callable[..., Any], path: Path, *args: Any, **kwargs: Any) -> Any:
+        """
+        call function(*args, path.name, dir_fd=...) relative to the parent of
+        path, or on the full path if the parent can't be opened. Any error
+        raised names the full path like the call on the full path would.
+        """
+        try:
+            with self.open(path.parent) as descriptor:
+                if descriptor is None:
+                    return function(*args, os.fspath(path), **kwargs)
+                return function(*args, path.name, dir_fd=descriptor, **kwargs)
+        except OSError as os_error:
+            if os_error.filename in (path.name, os.fspath(path.parent)):
+                os_error.filename = str(path)
+            if os_error.filename2 == path.name:
+                os_error.filename2 = str(path)
+            raise
+
+    def forget(self, path: Path, recursive: bool = False) -> None:
+        """
+        stop using the descriptor of a path, and with recursive of everything
+        below it too, e.g. because the directory was removed
+        """
+        key = os.fspath(path)
+        prefix = os.path.join(key, "")
+        with self._lock:
+            if recursive:
+                directories = [d for d in self._descriptors if d == key or d.startswith(prefix)]
+            else:
+                directories = [key] if key in self._descriptors else []
+            for directory in directories:
+                record = self._descriptors.pop(directory)
+                record[2] = True
+                if record[1] == 0:
+                    _close(record[0])
+
+    def close(self) -> None:
+        """
+        close all the descriptors
+        """
+        with self._lock:
+            for record in self._descriptors.values():
+                record[2] = True
+                if record[1] == 0:
+                    _close(record[0])
+            self._descriptors.clear()
+
+    def __len__(self) -> int:
+        return len(self._descriptors)
+
+    def _close_least_recently_used(self) -> None:
+        if len(self._descriptors) <= self.max_open:
+            return
+        for directory in list(self._descriptors):
+            if len(self._descriptors) <= self.max_open:
+                return
+            record = self._descriptors[directory]
+            if record[1] == 0:
+                del self._descriptors[directory]
+                _close(record[0])
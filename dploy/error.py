@@ -3,7 +3,6 @@
 """
 
 import re
-import sys
 
 ERROR_HEAD = "dploy {subcmd}: can not {subcmd} "
 
@@ -30,14 +29,17 @@ def add(self, error):
         """
         self.exceptions.append(error)
 
-    def handle(self):
+    def handle(self, error_output):
         """
-        Prints and handles errors
+        Prints the errors to error_output, an output.Output, unless silent and
+        raises the first one
         """
         if len(self.exceptions) > 0:
             if not self.is_silent:
                 for exception in self.exceptions:
-                    print(exception, file=sys.stderr)
+                    error_output.error(exception)
+            # the others are kept on the one raised for the callers catching it
+            self.exceptions[0].errors = list(self.exceptions)
             raise self.exceptions[0]
 
 
@@ -190,3 +192,58 @@ def __init__(self, subcmd, file):
 
     def __str__(self):
         return self.msg
+
+
+class InvalidPlan(DployError):
+    """The plan file can not be read"""
+
+    def __init__(self, subcmd, file):
+        self.msg = ERROR_HEAD + "'{file}': Not a valid plan"
+        self.msg = self.msg.format(subcmd=subcmd, file=file)
+
+    def __str__(self):
+        return self.msg
+
+
+class PlanIsOutOfDate(DployError):
+    """A path the plan changes is not as it was when the plan was made"""
+
+    def __init__(self, subcmd, file, path):
+        self.msg = ERROR_HEAD + "'{file}': The plan is out of date, '{path}' changed since it was made"
+        self.msg = self.msg.format(subcmd=subcmd, file=file, path=path)
+
+    def __str__(self):
+        return self.msg
+
+
+class NoJournal(DployError):
+    """There is no journal of an interrupted execution in the destination"""
+
+    def __init__(self, subcmd, file):
+        self.msg = ERROR_HEAD + "'{file}': No journal of an interrupted execution"
+        self.msg = self.msg.format(subcmd=subcmd, file=file)
+
+    def __str__(self):
+        return self.msg
+
+
+class InvalidJournal(DployError):
+    """The journal file can not be read"""
+
+    def __init__(self, subcmd, file):
+        self.msg = ERROR_HEAD + "'{file}': Not a valid journal"
+        self.msg = self.msg.format(subcmd=subcmd, file=file)
+
+    def __str__(self):
+        return self.msg
+
+
+class UnfinishedJournal(DployError):
+    """An interrupted execution has to be resumed or rolled back first"""
+
+    def __init__(self, subcmd, file):
+        self.msg = ERROR_HEAD + "'{file}': An interrupted execution has to be resumed or rolled back first"
+        self.msg = self.msg.format(subcmd=subcmd, file=file)
+
+    def __str__(self):
+        return self.msg
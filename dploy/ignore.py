@@ -2,40 +2,189 @@
 Module for the --ignore IGNORE_PATTERN flag and .dploystowignore file
 """
 
+import fnmatch
+import os
 import pathlib
+import re
 
-from dploy import utils
+from dploy import syscalls
+
+
+class Matcher:
+    """
+    Glob patterns compiled once so that checking an entry is a string match on
+    its name instead of a glob of its parent directory.
+
+    A pattern is matched relative to the parent of the entry being checked, and
+    the entry matches if the pattern matches it or something beneath it, just
+    like globbing the parent directory would. Only patterns with more than one
+    path component need to look beneath the entry on disk.
+    """
+
+    def __init__(self, patterns):
+        flags = re.IGNORECASE if os.path.normcase("A") == "a" else 0
+        names = []
+        directory_names = []
+        self.nested_patterns = []
+
+        for pattern in patterns:
+            parts = pathlib.PurePath(pattern).parts
+            if not parts:  # a blank line in an ignore file
+                continue
+            if pathlib.PurePath(pattern).anchor:
+                raise NotImplementedError("Non-relative patterns are unsupported")
+
+            # like pathlib, a trailing separator only matches directories
+            suffix = "/" if pattern.endswith(("/", os.sep)) else ""
+
+            if len(parts) == 1 and parts[0] != "**":
+                (directory_names if suffix else names).append(fnmatch.translate(parts[0]))
+            elif parts[0] == "**":
+                rest = Matcher(["/".join(parts[1:]) + suffix]) if len(parts) > 1 else None
+                self.nested_patterns.append((None, "/".join(parts) + suffix, rest))
+            else:
+                head = re.compile(fnmatch.translate(parts[0]), flags)
+                self.nested_patterns.append((head, "/".join(parts[1:]) + suffix, None))
+
+        self.names = re.compile("|".join(names), flags) if names else None
+        self.directory_names = re.compile("|".join(directory_names), flags) if directory_names else None
+
+    def matches(self, path):
+        """
+        check if a path or anything beneath it matches one of the patterns
+        """
+        name = path.name
+        if self.names is not None and self.names.match(name):
+            return True
+        if self.directory_names is not None and self.directory_names.match(name) and path.is_dir():
+            return True
+
+        for head, rest_pattern, rest in self.nested_patterns:
+            if head is None:
+                # '**' matches the parent of the path and every directory
+                # beneath it, so it may also match zero directories
+                if rest.matches(path) if rest else path.is_dir():
+                    return True
+                if path.is_dir() and _has_match(path, rest_pattern):
+                    return True
+            elif head.match(name) and path.is_dir() and _has_match(path, rest_pattern):
+                return True
+        return False
+
+
+def _has_match(directory, pattern):
+    """
+    check if a glob below directory matches anything without listing more
+    than needed
+    """
+    with syscalls.count("glob"):
+        return next(iter(directory.glob(pattern)), None) is not None
+
+
+IGNORE_FILE = ".dploystowignore"
+
+# parsed ignore files by path along with the mtime and size they were read at
+_ignore_file_cache = {}
+
+
+def read_ignore_file(file):
+    """
+    read the patterns from an ignore file, reusing the patterns parsed earlier
+    in this process as long as the file has not been modified since
+    """
+    key = str(file)
+    try:
+        with syscalls.count("stat"):
+            file_stat = os.stat(key)
+    except (FileNotFoundError, NotADirectoryError):
+        _ignore_file_cache.pop(key, None)
+        return ()
+
+    version = (file_stat.st_mtime_ns, file_stat.st_size)
+    cached = _ignore_file_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    try:
+        with open(key, "r", encoding="utf8") as input_file:
+            patterns = tuple(input_file.read().splitlines())
+    except FileNotFoundError:
+        return ()
+
+    _ignore_file_cache[key] = (version, patterns)
+    return patterns
+
+
+def clear_ignore_file_cache():
+    """
+    forget all of the ignore files read so far
+    """
+    _ignore_file_cache.clear()
 
 
 class Ignore:
     """
     Handles ignoring of files via glob patterns either passed in directly in or
     in a specified ignore file.
+
+    The ignore file next to the source applies to everything in it, and an
+    ignore file inside the source, at any level, adds its patterns for the
+    directory it is in and everything below it.
     """
 
-    def __init__(self, patterns, source):
+    def __init__(self, patterns, source, stat_cache=None):
         if patterns is None:
             input_patterns = []
         else:
             input_patterns = patterns
         self.ignored_files = []
+        self.source = source
+        self.stat_cache = stat_cache
 
-        file = source.parent / pathlib.Path(".dploystowignore")
+        file = source.parent / pathlib.Path(IGNORE_FILE)
 
         self.patterns = [str(file.name)]  # ignore the ignore file
         self.patterns.extend(input_patterns)
         self._read_ignore_file_patterns(file)
+        self.matcher = Matcher(self.patterns)
+        self._directory_matchers = {}
 
     def _read_ignore_file_patterns(self, file):
         """
         read ignore patterns from a specified file
         """
-        try:
-            with open(str(file), "r", encoding="utf8") as input_file:
-                file_patterns = input_file.read().splitlines()
-                self.patterns.extend(file_patterns)
-        except FileNotFoundError:
-            pass
+        self.patterns.extend(read_ignore_file(file))
+
+    def _get_directory_patterns(self, directory):
+        """
+        get the patterns and their matcher that apply to the entries of a
+        directory, cascading the ignore files from the source down to it
+        """
+        cached = self._directory_matchers.get(directory)
+        if cached is not None:
+            return cached
+
+        if directory != self.source and self.source not in directory.parents:
+            result = (self.patterns, self.matcher)
+        else:
+            if directory == self.source:
+                patterns, matcher = self.patterns, self.matcher
+            else:
+                patterns, matcher = self._get_directory_patterns(directory.parent)
+
+            file = directory / IGNORE_FILE
+            if self.stat_cache is None or self.stat_cache.lexists(file):
+                file_patterns = read_ignore_file(file)
+            else:
+                file_patterns = ()
+
+            if file_patterns:
+                patterns = patterns + list(file_patterns)
+                matcher = Matcher(patterns)
+            result = (patterns, matcher)
+
+        self._directory_matchers[directory] = result
+        return result
 
     def should_ignore(self, source):
         """
@@ -43,18 +192,11 @@ def should_ignore(self, source):
         self.patterns
 
         This checks if the ignore patterns match either the file exactly or
-        its parents
+        its parents. Since a match is decided from the name of the source, an
+        ignored directory is pruned before anything inside of it is listed.
         """
-        for pattern in self.patterns:
-            try:
-                files = sorted(source.parent.glob(pattern))
-            except IndexError:  # the glob result was empty
-                continue
-
-            for file in files:
-                if utils.is_same_file(file, source) or source in file.parents:
-                    return True
-        return False
+        _, matcher = self._get_directory_patterns(source.parent)
+        return matcher.matches(source)
 
     def ignore(self, file):
         """
@@ -0,0 +1,307 @@
+"""
+A write-ahead journal of the actions executed in a destination, so that an
+execution that failed or was interrupted can be resumed or rolled back without
+walking the trees again
+"""
+
+import json
+import os
+import stat
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from dploy import actions, error, manifest
+
+JOURNAL_FILE = ".dploy-journal"
+VERSION = 1
+
+# the number of lines written between two fsync() of the journal
+SYNC_INTERVAL = 64
+
+
+class Journal:
+    """
+    The actions of an execution and which of them completed.
+
+    The first line of the journal file is a header with every action, written
+    before the first one is executed. Then a line "+index" is appended as each
+    action completes and "-index" as a rollback undoes it. Each line is
+    written to the file before the actions that depend on that action start,
+    so the journal survives the process being killed. Only actions running at
+    that moment may have completed without a line, which is_applied() checks.
+
+    Lines are also synced to disk every SYNC_INTERVAL lines and when the
+    execution stops, so a crash of the machine loses at most the lines of the
+    last interval, whose actions is_applied() checks the same way.
+
+    The file is removed once the execution completes.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, dest, subcmd: str, sources, use_manifest: bool = False):
+        self.dest = Path(os.path.abspath(dest))
+        self.path = self.dest / JOURNAL_FILE
+        self.subcmd = subcmd
+        self.sources = [os.path.abspath(source) for source in sources]
+        self.use_manifest = use_manifest
+        self.actions: List[actions.AbstractBaseAction] = []
+        self.completed: Set[int] = set()
+        # the text of the links removed by UnLink actions by index, to undo them
+        self.link_texts: Dict[int, str] = {}
+        # action => line recorded once it completes, for a loaded journal
+        self._lines: Dict[actions.AbstractBaseAction, str] = {}
+        # whether begin() wrote the header, the lines are then the positions
+        # of the actions in the plan
+        self._is_planned = False
+        self._file = None
+        self._unsynced_lines = 0
+
+    @classmethod
+    def load(cls, dest, subcmd: str):
+        """
+        read the journal of an interrupted execution in dest, errors are
+        reported as subcmd
+        """
+        path = Path(dest, JOURNAL_FILE)
+        try:
+            with open(path, "rb") as input_file:
+                data = input_file.read()
+        except FileNotFoundError as not_found_error:
+            raise error.NoJournal(subcmd, dest) from not_found_error
+        except OSError as os_error:
+            raise error.InvalidJournal(subcmd, path) from os_error
+
+        # a line cut short by the process being killed while writing it is
+        # dropped, is_applied() tells if its action completed
+        complete_size = data.rfind(b"\n") + 1
+        try:
+            header_line, *lines = data[:complete_size].decode("utf8").splitlines()
+            header = json.loads(header_line)
+            if header["version"] != VERSION:
+                raise ValueError(header["version"])
+            journal = cls(header["dest"], header["subcmd"], header["sources"], header["use_manifest"])
+            cwd = header["cwd"]
+            for action_data in header["actions"]:
+                action_data = [action_data[0]] + [os.path.join(cwd, path) for path in action_data[1:]]
+                journal.actions.append(actions.from_data(journal.subcmd, action_data))
+            journal.link_texts = {int(index): text for index, text in header["link_texts"].items()}
+            for index, text in journal.link_texts.items():
+                journal.actions[index].source = text
+            for line in lines:
+                if line[0] == "+":
+                    journal.completed.add(int(line[1:]))
+                else:
+                    journal.completed.discard(int(line[1:]))
+        except (ValueError, KeyError, TypeError, IndexError) as journal_error:
+            raise error.InvalidJournal(subcmd, path) from journal_error
+
+        if complete_size < len(data):
+            os.truncate(path, complete_size)
+        journal._file = open(path, "a", encoding="utf8")  # pylint: disable=consider-using-with
+        return journal
+
+    def begin(self, plan_actions):
+        """
+        write the header before the first action is executed, a loaded
+        journal is continued instead
+
+        plan_actions is iterated over rather than kept, a second time if it
+        removes links that don't exist yet, which it makes itself, e.g. when
+        unfolding a directory linked by an earlier source
+        """
+        if self._file is not None:
+            return
+        header = {
+            "version": VERSION,
+            "subcmd": self.subcmd,
+            "sources": self.sources,
+            "dest": os.fspath(self.dest),
+            "use_manifest": self.use_manifest,
+            "cwd": os.getcwd(),
+        }
+        self._file = open(self.path, "w", encoding="utf8")  # pylint: disable=consider-using-with
+        # the actions are written one by one rather than made into a list
+        self._file.write(json.dumps(header, separators=(",", ":"))[:-1] + ',"actions":[')
+        # target => index of the UnLink actions of links that don't exist yet
+        planned_unlinks: Dict[Path, int] = {}
+        for index, action in enumerate(plan_actions):
+            self._file.write(("," if index else "") + json.dumps(actions.to_data(action), separators=(",", ":")))
+            if isinstance(action, actions.UnLink):
+                try:
+                    self.link_texts[index] = os.readlink(action.target)
+                except (FileNotFoundError, NotADirectoryError):
+                    planned_unlinks[action.target] = index
+                except OSError:
+                    pass
+        if planned_unlinks:
+            for index, action in enumerate(plan_actions):
+                if isinstance(action, actions.SymbolicLink) and index < planned_unlinks.get(action.dest, -1):
+                    self.link_texts[planned_unlinks[action.dest]] = os.fspath(action.source_relative)
+
+        link_texts = {str(index): text for index, text in sorted(self.link_texts.items())}
+        self._file.write('],"link_texts":' + json.dumps(link_texts, separators=(",", ":")) + "}\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._is_planned = True
+
+    def expect(self, action, line: str):
+        """
+        record line once action completes, for actions executed to resume or
+        roll back a loaded journal
+        """
+        self._lines[action] = line
+
+    def record(self, action, index: Optional[int] = None):
+        """
+        record that an action completed, index is its position in the plan if
+        it was passed to begin()
+        """
+        if self._is_planned:
+            # nothing reads completed before the journal is loaded again
+            if index is None:
+                return
+            line = "+{}\n".format(index)
+        else:
+            line = self._lines.get(action)
+            if line is None:
+                return
+            if line.startswith("+"):
+                self.completed.add(int(line[1:]))
+            else:
+                self.completed.discard(int(line[1:]))
+        self._file.write(line)
+        self._file.flush()
+        self._unsynced_lines += 1
+        if self._unsynced_lines >= SYNC_INTERVAL:
+            self.sync()
+
+    def sync(self):
+        """
+        write the lines recorded so far to disk
+        """
+        if self._file is not None and self._unsynced_lines:
+            os.fsync(self._file.fileno())
+            self._unsynced_lines = 0
+
+    def close(self, is_complete: bool):
+        """
+        stop recording, and remove the journal if is_complete because there is
+        nothing left to resume
+        """
+        if self._file is not None:
+            if not is_complete:
+                self.sync()
+            self._file.close()
+            self._file = None
+        if is_complete:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def has_journal(dest) -> bool:
+    """
+    check if a destination has the journal of an interrupted execution
+    """
+    return os.path.lexists(os.path.join(dest, JOURNAL_FILE))
+
+
+def is_applied(action) -> bool:
+    """
+    check if what an action does is already done, which is only meaningful
+    for the actions of a journal, i.e. ones that were planned when it wasn't
+    """
+    if isinstance(action, (actions.AlreadyLinked, actions.AlreadyUnlinked)):
+        return True
+    try:
+        path_stat = os.lstat(action.path)
+    except (FileNotFoundError, NotADirectoryError):
+        return isinstance(action, (actions.UnLink, actions.RemoveDirectory))
+    if isinstance(action, actions.SymbolicLink):
+        return stat.S_ISLNK(path_stat.st_mode) and os.readlink(action.dest) == os.fspath(action.source_relative)
+    if isinstance(action, actions.MakeDirectory):
+        return stat.S_ISDIR(path_stat.st_mode)
+    return False
+
+
+def get_inverse_action(journal: Journal, index: int) -> Optional[actions.AbstractBaseAction]:
+    """
+    get the action that undoes an action of a journal, if it changed anything
+    """
+    action = journal.actions[index]
+    if isinstance(action, actions.SymbolicLink):
+        return actions.UnLink("rollback", action.dest, action.source_relative)
+    if isinstance(action, actions.UnLink) and index in journal.link_texts:
+        link_text = journal.link_texts[index]
+        return actions.SymbolicLink("rollback", action.target.parent / link_text, action.target, link_text)
+    if isinstance(action, actions.MakeDirectory):
+        return actions.RemoveDirectory("rollback", action.target)
+    if isinstance(action, actions.RemoveDirectory):
+        return actions.MakeDirectory("rollback", action.target)
+    return None
+
+
+def _open_manifest(journal: Journal, is_dry_run: bool):
+    if is_dry_run:
+        return None
+    return manifest.open_manifest(journal.dest, journal.sources, journal.use_manifest)
+
+
+def _catch_up_manifest(dest_manifest, action):
+    if isinstance(action, actions.SymbolicLink) and dest_manifest.get(action.dest) is not None:
+        return
+    dest_manifest.record(action)
+
+
+def resume(dest, is_silent: bool = True, is_dry_run: bool = False, jobs: int = 1) -> Journal:
+    """
+    execute the actions of the journal in dest that didn't complete, which
+    costs one lstat() per remaining action
+    """
+    journal = Journal.load(dest, "resume")
+    remaining_actions = actions.Actions(is_silent, is_dry_run, jobs)
+    remaining_actions.manifest = _open_manifest(journal, is_dry_run)
+    remaining_actions.journal = journal
+    for index, action in enumerate(journal.actions):
+        if index in journal.completed:
+            # the manifest is saved after the last action, so it misses these
+            # if the process was killed
+            if remaining_actions.manifest is not None:
+                _catch_up_manifest(remaining_actions.manifest, action)
+            continue
+        journal.expect(action, "+{}\n".format(index))
+        if is_applied(action):
+            if not is_dry_run:
+                journal.record(action)
+            if remaining_actions.manifest is not None:
+                remaining_actions.manifest.record(action)
+        else:
+            remaining_actions.add(action)
+    _execute(remaining_actions, journal, is_dry_run)
+    return journal
+
+
+def rollback(dest, is_silent: bool = True, is_dry_run: bool = False, jobs: int = 1) -> Journal:
+    """
+    undo the actions of the journal in dest that completed, in reverse order
+    """
+    journal = Journal.load(dest, "rollback")
+    inverse_actions = actions.Actions(is_silent, is_dry_run, jobs)
+    inverse_actions.manifest = _open_manifest(journal, is_dry_run)
+    inverse_actions.journal = journal
+    for index in reversed(range(len(journal.actions))):
+        if index not in journal.completed and not is_applied(journal.actions[index]):
+            continue
+        inverse_action = get_inverse_action(journal, index)
+        if inverse_action is not None:
+            journal.expect(inverse_action, "-{}\n".format(index))
+            inverse_actions.add(inverse_action)
+    _execute(inverse_actions, journal, is_dry_run)
+    return journal
+
+
+def _execute(journal_actions: actions.Actions, journal: Journal, is_dry_run: bool):
+    if is_dry_run:
+        journal.close(is_complete=False)
+    journal_actions.execute()
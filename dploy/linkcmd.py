@@ -12,14 +12,32 @@ class Link(main.AbstractBaseSubCommand):
     """
 
     # pylint: disable=too-many-arguments
-    def __init__(self, source, dest, is_silent=True, is_dry_run=False, ignore_patterns=None):
-        super().__init__("link", [source], dest, is_silent, is_dry_run, ignore_patterns)
+    def __init__(
+        self,
+        source,
+        dest,
+        is_silent=True,
+        is_dry_run=False,
+        ignore_patterns=None,
+        stat_cache=None,
+        jobs=1,
+        use_journal=False,
+    ):
+        super().__init__(
+            "link", [source], dest, is_silent, is_dry_run, ignore_patterns, stat_cache, jobs, use_journal=use_journal
+        )
 
     def _is_valid_input(self, sources, dest):
         """
         Check to see if the input is valid
         """
-        return LinkInput(self.errors, self.subcmd).is_valid(sources, dest)
+        return LinkInput(self.errors, self.subcmd, self.stat_cache).is_valid(sources, dest)
+
+    def _open_manifest(self, sources, dest):
+        """
+        links aren't recorded in a manifest
+        """
+        return None
 
     def _collect_actions(self, source, dest):
         """
@@ -27,15 +45,15 @@ def _collect_actions(self, source, dest):
         sub-command
         """
 
-        if dest.exists():
-            if utils.is_same_file(dest, source):
+        if self.stat_cache.exists(dest):
+            if utils.is_same_file(dest, source, self.stat_cache):
                 self.actions.add(actions.AlreadyLinked(self.subcmd, source, dest))
             else:
                 self.errors.add(error.ConflictsWithExistingFile(self.subcmd, source, dest))
-        elif dest.is_symlink():
+        elif self.stat_cache.is_symlink(dest):
             self.errors.add(error.ConflictsWithExistingLink(self.subcmd, source, dest))
 
-        elif not dest.parent.exists():
+        elif not self.stat_cache.exists(dest.parent):
             self.errors.add(error.NoSuchDirectoryToSubcmdInto(self.subcmd, dest.parent))
 
         else:
@@ -48,22 +66,26 @@ class LinkInput(main.Input):
     """
 
     def _is_valid_dest(self, dest):
-        if not dest.parent.exists():
+        if not self.stat_cache.exists(dest.parent):
             self.errors.add(error.NoSuchFileOrDirectory(self.subcmd, dest.parent))
             return False
 
-        if not utils.is_file_writable(dest.parent) or not utils.is_directory_writable(dest.parent):
+        if not utils.is_file_writable(dest.parent, self.stat_cache) or not utils.is_directory_writable(
+            dest.parent, self.stat_cache
+        ):
             self.errors.add(error.InsufficientPermissions(self.subcmd, dest))
             return False
 
         return True
 
     def _is_valid_source(self, source):
-        if not source.exists():
+        if not self.stat_cache.exists(source):
             self.errors.add(error.NoSuchFileOrDirectory(self.subcmd, source))
             return False
 
-        if not utils.is_file_readable(source) or not utils.is_directory_readable(source):
+        if not utils.is_file_readable(source, self.stat_cache) or not utils.is_directory_readable(
+            source, self.stat_cache
+        ):
             self.errors.add(error.InsufficientPermissions(self.subcmd, source))
             return False
 
@@ -4,20 +4,34 @@
 
 import pathlib
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
 
-from dploy import actions, error, ignore
+from dploy import actions, error, ignore, journal, output, statcache, syscalls, timings
 from dploy.utils import StowIgnorePatterns, StowPath, StowSources
 
 
+@contextmanager
+def phase(name, subcmd, command=None):
+    """
+    time a phase of a sub-command, count its system calls and report it to
+    the output, each only if asked for
+    """
+    with timings.phase(name, command), syscalls.phase(name), output.phase(name, subcmd):
+        yield
+
+
 # pylint: disable=too-few-public-methods
 class Input:
     """
     Input validator abstract base class
     """
 
-    def __init__(self, errors, subcmd):
+    def __init__(self, errors, subcmd, stat_cache=None):
         self.errors = errors
         self.subcmd = subcmd
+        self.stat_cache = statcache.StatCache() if stat_cache is None else stat_cache
 
     def is_valid(self, sources, dest):
         """
@@ -79,30 +93,98 @@ def __init__(
         is_silent: bool,
         is_dry_run: bool,
         ignore_patterns: StowIgnorePatterns,
+        stat_cache: Optional[statcache.StatCache] = None,
+        jobs: int = 1,
+        use_manifest: bool = False,
+        use_journal: bool = False,
     ):
         self.subcmd = subcmd
 
-        self.actions = actions.Actions(is_silent, is_dry_run)
+        self.actions = actions.Actions(is_silent, is_dry_run, jobs)
         self.errors = error.Errors(is_silent)
+        self.stat_cache = statcache.StatCache() if stat_cache is None else stat_cache
 
         self.is_silent = is_silent
         self.is_dry_run = is_dry_run
+        self.use_manifest = use_manifest
+        self.manifest = None
 
         self.dest_input = pathlib.Path(dest)
         source_inputs = [pathlib.Path(source) for source in sources]
 
-        if self._is_valid_input(source_inputs, self.dest_input):
-            for source in source_inputs:
-                self.ignore = ignore.Ignore(ignore_patterns, source)
+        # source => the ignore handler of the source
+        self.ignores = {}
+
+        self._start_workers(jobs)
+        try:
+            with phase("validate", self.subcmd, self):
+                is_valid_input = self._is_valid_input(source_inputs, self.dest_input)
+
+            if is_valid_input:
+                self.manifest = self._open_manifest(source_inputs, self.dest_input)
+                self.actions.manifest = self.manifest
+                if use_journal and not is_dry_run:
+                    self._open_journal(source_inputs, self.dest_input)
+
+                with phase("collect", self.subcmd, self):
+                    for source in source_inputs:
+                        with syscalls.source(source):
+                            self._collect_source_actions(source, ignore_patterns)
+
+            with phase("check", self.subcmd, self):
+                self._check_for_other_actions()
+        finally:
+            self._stop_workers()
 
-                if self.ignore.should_ignore(source):
-                    self.ignore.ignore(source)
-                    continue
+        with phase("execute", self.subcmd, self):
+            self._execute_actions()
+
+    def _collect_source_actions(self, source, ignore_patterns):
+        """
+        collect the actions of a source unless it is ignored
+        """
+        self.ignore = ignore.Ignore(ignore_patterns, source, self.stat_cache)
+        self.ignores.setdefault(self.ignore.source, self.ignore)
+
+        if self.ignore.should_ignore(source):
+            self.ignore.ignore(source)
+            return
+
+        self._collect_package_actions(source, self.dest_input)
+
+    def _start_workers(self, jobs):
+        """
+        let the stat cache list directories ahead of the traversal on a pool
+        of jobs threads, which hides the latency of network file systems
+        """
+        self.executor = None
+        if jobs > 1 and self.stat_cache.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="dploy")
+            self.stat_cache.executor = self.executor
 
-                self._collect_actions(source, self.dest_input)
+    def _stop_workers(self):
+        """
+        stop the threads started by _start_workers()
+        """
+        if self.executor is not None:
+            self.stat_cache.cancel_prefetching()
+            self.stat_cache.executor = None
+            self.executor.shutdown(wait=True)
+            self.executor = None
 
-        self._check_for_other_actions()
-        self._execute_actions()
+    def _get_ignore(self, path):
+        """
+        get the ignore handler of the source that a path belongs to, falling
+        back to the one of the source currently being collected
+        """
+        source_ignore = self.ignores.get(path)
+        if source_ignore is not None:
+            return source_ignore
+        for parent in path.parents:
+            source_ignore = self.ignores.get(parent)
+            if source_ignore is not None:
+                return source_ignore
+        return self.ignore
 
     def _check_for_other_actions(self):
         """
@@ -115,7 +197,31 @@ def _is_valid_input(self, sources, dest):
         """
         Abstract method to check if the input to a sub-command is valid
         """
-        pass
+        raise NotImplementedError
+
+    def _open_manifest(self, sources, dest):
+        """
+        Abstract method to get the manifest of the links in dest to keep up to
+        date, None if the sub-command has none
+        """
+        raise NotImplementedError
+
+    def _open_journal(self, sources, dest):
+        """
+        record the progress of the execution in a journal in dest, unless
+        there already is one that has to be resumed or rolled back first
+        """
+        journal_dest = dest.parent if self.subcmd == "link" else dest
+        if journal.has_journal(journal_dest):
+            self.errors.add(error.UnfinishedJournal(self.subcmd, journal_dest))
+            return
+        self.actions.journal = journal.Journal(journal_dest, self.subcmd, sources, self.manifest is not None)
+
+    def _collect_package_actions(self, source, dest):
+        """
+        collect the actions for one of the source arguments
+        """
+        self._collect_actions(source, dest)
 
     def _collect_actions(self, source, dest):
         """
@@ -129,5 +235,5 @@ def _execute_actions(self):
         Either executes collected actions by a sub command or raises collected
         exceptions.
         """
-        self.errors.handle()
+        self.errors.handle(output.get_output())
         self.actions.execute()
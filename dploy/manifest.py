@@ -0,0 +1,402 @@
+"""
+A record of the links dploy created in a destination, kept in a file in the
+destination so that later commands can find them without walking the trees
+"""
+
+import json
+import os
+import stat
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from dploy import actions
+
+MANIFEST_FILE = ".dploy-manifest.json"
+VERSION = 1
+
+# the states of a link returned by Manifest.verify()
+LINKED = "linked"
+BROKEN = "broken"  # the link is there but what it links to is gone
+CHANGED = "changed"  # something else is at the path of the link
+MISSING = "missing"
+
+
+# the modification time of a source directory and the type of each of its
+# entries by name, see get_entry_type()
+Listing = Tuple[int, Dict[str, str]]
+
+# the ignore patterns in effect for a package by the directory relative to it
+# they apply to, "" for the ones that apply to all of it
+IgnorePatterns = Dict[str, List[str]]
+
+
+def get_entry_type(entry) -> str:
+    """
+    a one letter code for the type of a utils.DirectoryEntry
+    """
+    if entry.is_symlink():
+        return "l"
+    return "d" if entry.is_dir(follow_symlinks=False) else "f"
+
+
+class Entry(NamedTuple):
+    """
+    a link created by dploy
+    """
+
+    link: Path
+    target: str
+    package: Optional[str]
+    inode: Optional[Tuple[int, int]]
+    timestamp: float
+
+
+class Manifest:
+    """
+    The links dploy created in a destination along with the package (the
+    source argument) each one belongs to.
+
+    The manifest is updated by Actions.execute() as actions are executed, and
+    is only written back to the destination by save(). It is a record of what
+    was done, not a lock, so verify() checks an entry against the file system.
+
+    It also keeps the listings of the source directories stow walked, so that
+    an incremental stow only needs to look at the ones modified since, and
+    the ignore patterns in effect when they were taken, since a change to
+    those can change what any directory links. Listings and patterns are
+    staged while actions are collected and only kept once the actions were
+    all executed.
+    """
+
+    def __init__(self, dest):
+        self.dest = Path(dest)
+        self.path = self.dest / MANIFEST_FILE
+        self.entries: Dict[str, Entry] = {}
+        self.packages: List[str] = []
+        # package => directory relative to the package => listing
+        self.listings: Dict[str, Dict[str, Listing]] = {}
+        self._staged_listings: Dict[str, Dict[str, Optional[Listing]]] = {}
+        # package => the ignore patterns its listings were taken with
+        self.ignore_patterns: Dict[str, IgnorePatterns] = {}
+        self._staged_ignore_patterns: Dict[str, IgnorePatterns] = {}
+        self._replaced_packages: Set[str] = set()
+        self.is_modified = False
+
+    @classmethod
+    def load(cls, dest):
+        """
+        read the manifest of a destination, an unreadable or missing manifest
+        is an empty one
+        """
+        manifest = cls(dest)
+        try:
+            with open(manifest.path, "r", encoding="utf8") as input_file:
+                data = json.load(input_file)
+        except (OSError, ValueError):
+            return manifest
+        if not isinstance(data, dict) or data.get("version") != VERSION:
+            return manifest
+
+        packages = data.get("packages", [])
+        manifest.packages = list(packages)
+        for name, (target, package, inode, timestamp) in data.get("links", {}).items():
+            manifest.entries[name] = Entry(
+                manifest.dest / name,
+                target,
+                None if package is None else packages[package],
+                None if inode is None else tuple(inode),
+                timestamp,
+            )
+        for package, listings in data.get("listings", {}).items():
+            manifest.listings[package] = {directory: (mtime, names) for directory, (mtime, names) in listings.items()}
+        manifest.ignore_patterns = dict(data.get("ignores", {}))
+        return manifest
+
+    def save(self, is_complete=True):
+        """
+        write the manifest to the destination if it was modified, removing it
+        once it no longer records any links
+
+        The staged listings are kept if is_complete, i.e. every action was
+        executed, and dropped otherwise.
+        """
+        if is_complete:
+            self._commit_listings()
+        self._staged_listings.clear()
+        self._staged_ignore_patterns.clear()
+        self._replaced_packages.clear()
+
+        if not self.is_modified:
+            return
+
+        if not self.entries:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.is_modified = False
+            return
+
+        used_packages = {entry.package for entry in self.entries.values()}
+        packages = [package for package in self.packages if package in used_packages]
+        indexes = {package: index for index, package in enumerate(packages)}
+        links = {
+            name: [entry.target, indexes.get(entry.package), entry.inode, entry.timestamp]
+            for name, entry in sorted(self.entries.items())
+        }
+        # listings of unstowed packages would make an incremental stow skip them
+        listings = {package: self.listings[package] for package in packages if package in self.listings}
+        self.listings = listings
+        ignores = {package: self.ignore_patterns[package] for package in listings if package in self.ignore_patterns}
+        self.ignore_patterns = ignores
+
+        data = {"version": VERSION, "packages": packages, "links": links, "listings": listings, "ignores": ignores}
+        temporary_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temporary_path, "w", encoding="utf8") as output_file:
+            json.dump(data, output_file, separators=(",", ":"))
+        os.replace(temporary_path, self.path)
+        self.packages = packages
+        self.is_modified = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add_packages(self, packages: Iterable[Path]):
+        """
+        make packages known so that the links into them are recorded as
+        belonging to them
+        """
+        for package in packages:
+            package_path = os.path.abspath(package)
+            if package_path not in self.packages:
+                self.packages.append(package_path)
+
+    def has_package(self, package: Path) -> bool:
+        """
+        check if the manifest records any links of a package
+        """
+        package_path = os.path.abspath(package)
+        return any(entry.package == package_path for entry in self.entries.values())
+
+    def get_entries(self, package: Optional[Path] = None) -> List[Entry]:
+        """
+        get the recorded links, optionally only those of a package, in the
+        order a walk of the destination would find them
+        """
+        entries = self.entries.values()
+        if package is not None:
+            package_path = os.path.abspath(package)
+            entries = [entry for entry in entries if entry.package == package_path]
+        return sorted(entries, key=lambda entry: entry.link.parts)
+
+    def get_entries_under(self, link: Path) -> List[Entry]:
+        """
+        get the recorded links at or beneath a path
+        """
+        name = self._get_name(link)
+        prefix = name + "/"
+        return [entry for key, entry in self.entries.items() if key == name or key.startswith(prefix)]
+
+    def get(self, link: Path) -> Optional[Entry]:
+        """
+        get the entry of a link if it is recorded
+        """
+        return self.entries.get(self._get_name(link))
+
+    def add(self, link: Path, target: str, source: Path):
+        """
+        record a link to source, whose text is target
+        """
+        try:
+            link_stat = os.lstat(link)
+            inode: Optional[Tuple[int, int]] = (link_stat.st_dev, link_stat.st_ino)
+        except OSError:
+            inode = None
+        name = self._get_name(link)
+        self.entries[name] = Entry(self.dest / name, target, self._get_package(source), inode, time.time())
+        self.is_modified = True
+
+    def discard(self, link: Path):
+        """
+        forget a link if it is recorded
+        """
+        if self.entries.pop(self._get_name(link), None) is not None:
+            self.is_modified = True
+
+    def record(self, action):
+        """
+        update the manifest for an action that was just executed
+        """
+        if isinstance(action, actions.SymbolicLink):
+            self.add(action.dest, os.fspath(action.source_relative), action.source)
+        elif isinstance(action, actions.AlreadyLinked):
+            if self.get(action.dest) is None:
+                self.add(action.dest, os.readlink(action.dest), action.source)
+        elif isinstance(action, actions.UnLink):
+            self.discard(action.target)
+
+    def get_listings(self, package: Path) -> Dict[str, Listing]:
+        """
+        get the listings of the directories of a package kept by the last
+        complete stow, by path relative to the package
+        """
+        return self.listings.get(os.path.abspath(package), {})
+
+    def reset_listings(self, package: Path):
+        """
+        replace the listings kept for a package with the ones staged from now
+        on, because all of it is walked again
+        """
+        package_path = os.path.abspath(package)
+        self._replaced_packages.add(package_path)
+        self._staged_listings[package_path] = {}
+
+    def stage_listing(self, directory: Path, mtime_ns: int, entries):
+        """
+        stage the listing of a source directory, taken when it had the
+        modification time mtime_ns
+        """
+        package_path = self.get_package_path(directory)
+        if package_path is not None:
+            package, relative_path = package_path
+            names = {entry.name: get_entry_type(entry) for entry in entries}
+            self._staged_listings.setdefault(package, {})[relative_path] = (mtime_ns, names)
+
+    def get_staged_listings(self, package: Path) -> Dict[str, Optional[Listing]]:
+        """
+        get the listings of the directories of a package staged so far, None
+        for the ones staged as removed
+        """
+        return self._staged_listings.get(os.path.abspath(package), {})
+
+    def get_ignore_patterns(self, package: Path) -> Optional[IgnorePatterns]:
+        """
+        get the ignore patterns the listings of a package were taken with, if
+        known
+        """
+        return self.ignore_patterns.get(os.path.abspath(package))
+
+    def stage_ignore_patterns(self, package: Path, patterns: IgnorePatterns):
+        """
+        stage the ignore patterns the listings staged for a package are taken
+        with
+        """
+        self._staged_ignore_patterns[os.path.abspath(package)] = patterns
+
+    def stage_removed_listing(self, package: Path, relative_path: str):
+        """
+        stage forgetting the listing of a directory that no longer exists
+        """
+        self._staged_listings.setdefault(os.path.abspath(package), {})[relative_path] = None
+
+    def _commit_listings(self):
+        if self._staged_ignore_patterns:
+            self.ignore_patterns.update(self._staged_ignore_patterns)
+            self.is_modified = True
+        for package, staged in self._staged_listings.items():
+            if package in self._replaced_packages:
+                listings = {}
+            else:
+                listings = dict(self.listings.get(package, {}))
+            for relative_path, listing in staged.items():
+                if listing is None:
+                    listings.pop(relative_path, None)
+                else:
+                    listings[relative_path] = listing
+            self.listings[package] = listings
+            self.is_modified = True
+
+    def verify(self, entry: Entry, stat_cache=None) -> str:
+        """
+        check that the link of an entry is still the one dploy created and
+        that what it links to exists
+        """
+        state = self.get_link_state(entry, stat_cache)
+        if state != LINKED:
+            return state
+        exists = os.path.exists if stat_cache is None else stat_cache.exists
+        return LINKED if exists(entry.link) else BROKEN
+
+    def get_link_state(self, entry: Entry, stat_cache=None) -> str:
+        """
+        check that the link of an entry is still the one dploy created, which
+        costs an lstat() and at most a readlink(), LINKED even if what it
+        links to is gone
+        """
+        lstat = os.lstat if stat_cache is None else stat_cache.lstat
+        try:
+            link_stat = lstat(entry.link)
+        except (FileNotFoundError, NotADirectoryError):
+            return MISSING
+
+        if not stat.S_ISLNK(link_stat.st_mode):
+            return CHANGED
+        # a symbolic link can't be modified in place so the same inode means
+        # the same link text
+        if entry.inode != (link_stat.st_dev, link_stat.st_ino) and os.readlink(entry.link) != entry.target:
+            return CHANGED
+        return LINKED
+
+    def _get_name(self, link: Path) -> str:
+        try:
+            return Path(link).relative_to(self.dest).as_posix()
+        except ValueError:
+            return Path(os.path.relpath(link, self.dest)).as_posix()
+
+    def get_package_path(self, source: Path) -> Optional[Tuple[str, str]]:
+        """
+        get the package a source belongs to and its path relative to it
+        """
+        package = self._get_package(source)
+        if package is None:
+            return None
+        source_path = os.path.abspath(source)
+        package_root = package
+        if source_path != package and not source_path.startswith(os.path.join(package, "")):
+            source_path = os.path.realpath(source_path)
+            package_root = os.path.realpath(package)
+        return package, Path(os.path.relpath(source_path, package_root)).as_posix()
+
+    def _get_package(self, source: Path) -> Optional[str]:
+        source_path = os.path.abspath(source)
+        package = _find_package(source_path, self.packages)
+        if package is None:
+            # the source may have been resolved while unfolding
+            resolved_packages = [os.path.realpath(package) for package in self.packages]
+            resolved_package = _find_package(os.path.realpath(source_path), resolved_packages)
+            if resolved_package is not None:
+                package = self.packages[resolved_packages.index(resolved_package)]
+        return package
+
+
+def _find_package(source_path: str, packages: List[str]) -> Optional[str]:
+    for package in sorted(packages, key=len, reverse=True):
+        if source_path == package or source_path.startswith(os.path.join(package, "")):
+            return package
+    return None
+
+
+def open_manifest(dest, packages, use_manifest) -> Optional[Manifest]:
+    """
+    get the manifest of a destination to keep up to date, if it already has
+    one or if use_manifest is set
+    """
+    if not use_manifest and not os.path.lexists(os.path.join(dest, MANIFEST_FILE)):
+        return None
+    manifest = Manifest.load(dest)
+    manifest.add_packages(packages)
+    return manifest
+
+
+def get_status(dest, sources=None, verify=False) -> List[Tuple[Entry, str]]:
+    """
+    get the links recorded in the manifest of a destination, optionally only
+    those of some packages, along with their state if verify is set
+    """
+    manifest = Manifest.load(dest)
+    if sources is None:
+        entries = manifest.get_entries()
+    else:
+        entries = [entry for source in sources for entry in manifest.get_entries(Path(source))]
+    return [(entry, manifest.verify(entry) if verify else LINKED) for entry in entries]
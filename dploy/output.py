@@ -0,0 +1,190 @@
+"""
+Where the messages of the actions, errors and phases of the sub-commands go,
+either a line per action written in batches, a line per directory with
+--summary or a JSON event per line with --output=jsonl
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dploy import actions
+
+# lines written to the stream at once
+BATCH_SIZE = 512
+
+# the name of a kind of action => the verb and the nouns its summary uses
+_SUMMARIES = {
+    "link": ("linked", "entry", "entries"),
+    "already_linked": ("already linked", "entry", "entries"),
+    "already_unlinked": ("already unlinked", "entry", "entries"),
+    "unlink": ("unlinked", "entry", "entries"),
+    "make_directory": ("made", "directory", "directories"),
+    "remove_directory": ("removed", "directory", "directories"),
+}
+
+_NOT_REPORTING = nullcontext()
+
+
+class Output:
+    """
+    Writes a line per action, in batches so that large plans don't pay for a
+    write to the stream per action. The stream is stdout unless given.
+    """
+
+    def __init__(self, stream=None, batch_size: int = BATCH_SIZE):
+        self.stream = stream
+        self.batch_size = batch_size
+        self._lines: List[str] = []
+
+    def add(self, action: "actions.AbstractBaseAction") -> None:
+        """
+        report an action, which is about to be executed
+        """
+        self._lines.append(repr(action))
+        if len(self._lines) >= self.batch_size:
+            self.flush()
+
+    def error(self, exception: Exception) -> None:
+        """
+        report an error, to stderr
+        """
+        self.flush()
+        print(exception, file=sys.stderr)
+
+    def phase(self, name: str, subcmd: str):  # pylint: disable=unused-argument
+        """
+        get a context manager reporting a phase of a sub-command, which only
+        the outputs that report phases need
+        """
+        return _NOT_REPORTING
+
+    def flush(self) -> None:
+        """
+        write the lines reported so far
+        """
+        if not self._lines:
+            return
+        stream = sys.stdout if self.stream is None else self.stream
+        stream.write("\n".join(self._lines) + "\n")
+        stream.flush()
+        self._lines.clear()
+
+    def close(self) -> None:
+        """
+        write whatever is left once the actions are done
+        """
+        self.flush()
+
+
+class SummaryOutput(Output):
+    """
+    Writes a line per directory and kind of action once the actions are done,
+    e.g. "dploy stow: linked 3,214 entries under /home/user/.local/share"
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(stream)
+        # (sub-command, kind of action, directory) => number of actions
+        self.counts: Dict[Tuple[str, str, str], int] = {}
+
+    def add(self, action: "actions.AbstractBaseAction") -> None:
+        path = action.path if action.path is not None else action.dest  # type: ignore[attr-defined]
+        key = (action.subcmd, actions.get_name(action), os.path.dirname(path))  # type: ignore[attr-defined]
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def close(self) -> None:
+        for (subcmd, name, directory), count in self.counts.items():
+            verb, noun, plural_noun = _SUMMARIES[name]
+            self._lines.append(
+                "dploy {subcmd}: {verb} {count:,} {noun} under {directory}".format(
+                    subcmd=subcmd,
+                    verb=verb,
+                    count=count,
+                    noun=noun if count == 1 else plural_noun,
+                    directory=directory,
+                )
+            )
+        self.counts.clear()
+        self.flush()
+
+
+class JsonlOutput(Output):
+    """
+    Writes an event per line as a JSON object for every action, error and
+    phase boundary, e.g.
+    {"event":"action","subcmd":"stow","action":"link","source":"...","dest":"..."}
+
+    Events are written in batches like the lines of Output, and right away at
+    the end of each phase and for errors, so nothing is held for long.
+    """
+
+    def add(self, action: "actions.AbstractBaseAction") -> None:
+        event: Dict[str, Any] = {"event": "action", "subcmd": action.subcmd}  # type: ignore[attr-defined]
+        event.update(actions.to_dict(action))
+        self._add_event(event)
+
+    def error(self, exception: Exception) -> None:
+        self._add_event({"event": "error", "error": type(exception).__name__, "message": str(exception)})
+        self.flush()
+
+    @contextmanager
+    def phase(self, name: str, subcmd: str) -> Iterator[None]:
+        self._add_event({"event": "phase_start", "subcmd": subcmd, "phase": name})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_event(
+                {"event": "phase_end", "subcmd": subcmd, "phase": name, "wall": time.perf_counter() - start}
+            )
+            self.flush()
+
+    def _add_event(self, event: Dict[str, Any]) -> None:
+        self._lines.append(json.dumps(event, separators=(",", ":")))
+        if len(self._lines) >= self.batch_size:
+            self.flush()
+
+
+# the names of the formats of --output
+FORMATS = {
+    "text": Output,
+    "summary": SummaryOutput,
+    "jsonl": JsonlOutput,
+}
+
+_current: Optional[Output] = None
+
+
+def get_output() -> Output:
+    """
+    get the output set by use(), or a new one writing to stdout
+    """
+    return Output() if _current is None else _current
+
+
+def phase(name: str, subcmd: str):
+    """
+    get a context manager reporting a phase of a sub-command to the output set
+    by use(), if any
+    """
+    if _current is None:
+        return _NOT_REPORTING
+    return _current.phase(name, subcmd)
+
+
+@contextmanager
+def use(output: Optional[Output]) -> Iterator[Optional[Output]]:
+    """
+    report the actions executed in a with block to output
+    """
+    global _current  # pylint: disable=global-statement
+    previous = _current
+    _current = output
+    try:
+        yield output
+    finally:
+        _current = previous
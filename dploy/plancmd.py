@@ -0,0 +1,203 @@
+"""
+The plan and apply sub-commands, which compute the actions of a sub-command
+ahead of time and save them to a file, and execute them later without walking
+the trees again
+"""
+
+import json
+import os
+import stat
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dploy import actions, error, journal, linkcmd, main, manifest, output, stowcmd
+from dploy.utils import StowIgnorePatterns, StowPath
+
+VERSION = 1
+
+# the fingerprint of a path that doesn't exist
+MISSING = "-"
+
+SUBCOMMANDS = {
+    "stow": stowcmd.Stow,
+    "unstow": stowcmd.UnStow,
+    "clean": stowcmd.Clean,
+    "link": linkcmd.Link,
+}
+
+
+def get_fingerprint(path: StowPath) -> str:
+    """
+    the state of a path that the actions of a plan rely on: whether it is a
+    directory, a file or missing, and the text of a symbolic link
+
+    Unlike inodes and modification times this is the same on every machine
+    with the same tree, so a plan made in one place can be applied in another.
+    """
+    try:
+        path_stat = os.lstat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return MISSING
+    if stat.S_ISLNK(path_stat.st_mode):
+        return "l:" + os.readlink(path)
+    return "d" if stat.S_ISDIR(path_stat.st_mode) else "f"
+
+
+def get_affected_paths(action) -> List[Path]:
+    """
+    get the paths an action changes or relies on
+    """
+    if isinstance(action, actions.SymbolicLink):
+        return [action.dest, action.dest.parent, action.source]
+    if isinstance(action, actions.MakeDirectory):
+        return [action.target, action.target.parent]
+    if isinstance(action, (actions.AlreadyLinked, actions.AlreadyUnlinked)):
+        return [action.dest]
+    return [action.path]
+
+
+class Plan:
+    """
+    The actions of a sub-command along with the fingerprints of the paths
+    they affect, see get_fingerprint().
+
+    Paths are kept as they were given, so a plan made with relative paths is
+    applied relative to the working directory it is applied in.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        subcmd: str,
+        sources: List[str],
+        dest: str,
+        plan_actions: List[actions.AbstractBaseAction],
+        use_manifest: bool = False,
+        fingerprints: Optional[Dict[str, str]] = None,
+    ):
+        self.subcmd = subcmd
+        self.sources = sources
+        self.dest = dest
+        self.actions = plan_actions
+        self.use_manifest = use_manifest
+        if fingerprints is None:
+            fingerprints = {}
+            for action in plan_actions:
+                for path in get_affected_paths(action):
+                    key = os.fspath(path)
+                    if key not in fingerprints:
+                        fingerprints[key] = get_fingerprint(key)
+        self.fingerprints = fingerprints
+
+    @classmethod
+    def load(cls, plan_file: StowPath):
+        """
+        read a plan saved by save()
+        """
+        try:
+            with open(plan_file, "r", encoding="utf8") as input_file:
+                data = json.load(input_file)
+            if data["version"] != VERSION:
+                raise ValueError(data["version"])
+            subcmd = data["subcmd"]
+            plan = cls(
+                subcmd,
+                data["sources"],
+                data["dest"],
+                [actions.from_data(subcmd, action) for action in data["actions"]],
+                data["use_manifest"],
+                data["fingerprints"],
+            )
+        except (OSError, ValueError, KeyError, TypeError) as plan_error:
+            raise error.InvalidPlan("apply", plan_file) from plan_error
+
+        # the links to remove were fingerprinted with their text
+        for action in plan.actions:
+            if isinstance(action, actions.UnLink):
+                fingerprint = plan.fingerprints.get(os.fspath(action.target), MISSING)
+                if fingerprint.startswith("l:"):
+                    action.source = fingerprint[2:]
+        return plan
+
+    def save(self, plan_file: StowPath):
+        """
+        write the plan to a file
+        """
+        data = {
+            "version": VERSION,
+            "subcmd": self.subcmd,
+            "sources": self.sources,
+            "dest": self.dest,
+            "use_manifest": self.use_manifest,
+            "actions": [actions.to_data(action) for action in self.actions],
+            "fingerprints": self.fingerprints,
+        }
+        with open(plan_file, "w", encoding="utf8") as output_file:
+            json.dump(data, output_file, separators=(",", ":"))
+
+    def get_changed_paths(self) -> List[str]:
+        """
+        get the affected paths whose fingerprint changed since the plan was
+        made, which costs one lstat() per path and no traversal
+        """
+        return [path for path, fingerprint in self.fingerprints.items() if get_fingerprint(path) != fingerprint]
+
+
+# pylint: disable=too-many-arguments
+def make_plan(
+    subcmd: str,
+    sources,
+    dest: StowPath,
+    plan_file: StowPath,
+    is_silent: bool = True,
+    ignore_patterns: StowIgnorePatterns = None,
+    jobs: int = 1,
+    **options,
+) -> Plan:
+    """
+    compute the actions of a sub-command with a dry run and save them to
+    plan_file, sources is a single source for link
+    """
+    command = SUBCOMMANDS[subcmd](
+        sources, dest, is_silent=is_silent, is_dry_run=True, ignore_patterns=ignore_patterns, jobs=jobs, **options
+    )
+    source_list = [sources] if subcmd == "link" else list(sources)
+    plan = Plan(
+        subcmd,
+        [os.fspath(source) for source in source_list],
+        os.fspath(dest),
+        command.actions.actions,
+        command.manifest is not None,
+    )
+    plan.save(plan_file)
+    return plan
+
+
+def apply(
+    plan_file: StowPath, is_silent: bool = True, is_dry_run: bool = False, jobs: int = 1, use_journal: bool = False
+) -> Plan:
+    """
+    execute the actions of a plan saved by make_plan() if none of the paths
+    they affect changed since
+    """
+    plan = Plan.load(plan_file)
+
+    errors = error.Errors(is_silent)
+    journal_dest = os.path.dirname(plan.dest) if plan.subcmd == "link" else plan.dest
+    with main.phase("validate", "apply"):
+        if use_journal and journal.has_journal(journal_dest):
+            errors.add(error.UnfinishedJournal("apply", journal_dest))
+        for path in plan.get_changed_paths():
+            errors.add(error.PlanIsOutOfDate("apply", plan_file, path))
+    errors.handle(output.get_output())
+
+    plan_actions = actions.Actions(is_silent, is_dry_run, jobs)
+    for action in plan.actions:
+        plan_actions.add(action)
+    if not is_dry_run:
+        plan_actions.manifest = manifest.open_manifest(plan.dest, plan.sources, plan.use_manifest)
+        if use_journal:
+            plan_actions.journal = journal.Journal(journal_dest, plan.subcmd, plan.sources, plan.use_manifest)
+    with main.phase("execute", "apply"):
+        plan_actions.execute()
+    return plan
@@ -0,0 +1,184 @@
+"""
+A compact store for the actions of a plan: the paths are interned in a trie of
+their names and the actions are kept as columns of integers, so a plan with
+millions of actions doesn't hold millions of action and path objects
+"""
+
+import functools
+import pathlib
+from array import array
+from typing import Dict, List, Optional
+
+# the id of a missing path, e.g. the source of an action that has none
+NO_PATH = -1
+
+# the sources column holds _SAME_NAME - the id of its directory for a source
+# with the name of the target, see PlanStore
+_SAME_NAME = -2
+
+# the number of directory paths PathTable.get_path() keeps around
+DIRECTORY_CACHE_SIZE = 1024
+
+
+class PathTable:
+    """
+    Paths interned as the nodes of a trie of their names, so the directories
+    many paths share are only kept once. The id of a path is the index of its
+    last name, and parents holds the id of the parent of each node, NO_PATH
+    for the first name of a path, e.g. "/" or "..".
+    """
+
+    def __init__(self):
+        self.parents = array("i")
+        # the name of each node, the strings are shared through self._names
+        self.names: List[str] = []
+        self._names: Dict[str, str] = {}
+        # the children of each node that has any by name
+        self._children: Dict[int, Dict[str, int]] = {}
+        self._roots: Dict[str, int] = {}
+        # the paths of the directories made recently, which the next paths
+        # mostly share, until clear_cache()
+        self._get_directory = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, path) -> int:
+        """
+        get the id of a path, adding it and the directories it is in if needed
+        """
+        node = NO_PATH
+        for name in _get_names(path):
+            children = self._roots if node == NO_PATH else self._children.get(node)
+            child = None if children is None else children.get(name)
+            if child is None:
+                if children is None:
+                    children = self._children[node] = {}
+                name = self._names.setdefault(name, name)
+                child = len(self.names)
+                self.parents.append(node)
+                self.names.append(name)
+                children[name] = child
+            node = child
+        return node
+
+    def find(self, path) -> Optional[int]:
+        """
+        get the id of a path if it was interned, without adding it
+        """
+        node = NO_PATH
+        children: Optional[Dict[str, int]] = self._roots
+        for name in _get_names(path):
+            if children is None or name not in children:
+                return None
+            node = children[name]
+            children = self._children.get(node)
+        return node
+
+    def get_path(self, node: int) -> pathlib.Path:
+        """
+        get the path of an id returned by intern()
+        """
+        parent = self.parents[node]
+        if parent == NO_PATH:
+            return pathlib.Path(self.names[node])
+        if self._get_directory is None:
+            self._get_directory = functools.lru_cache(maxsize=DIRECTORY_CACHE_SIZE)(self.get_path)
+        return self._get_directory(parent) / self.names[node]
+
+    def clear_cache(self) -> None:
+        """
+        forget the paths of the directories made so far, e.g. once the paths
+        are no longer made one after the other
+        """
+        self._get_directory = None
+
+
+def _get_names(path):
+    parts = path.parts if isinstance(path, pathlib.PurePath) else pathlib.PurePath(path).parts
+    # a path such as "." has no parts
+    return parts or (".",)
+
+
+class PlanStore:
+    """
+    The actions of a plan as records in columns: a code for the kind of each
+    action, its sub-command, the id of the path it is about in self.paths,
+    i.e. the destination of a link or the target of the other actions, and
+    the id of a second path if any, i.e. the source of a link or the text of
+    the link an unlink removes. The source of a link mostly has the name of
+    its destination, so it is kept as the id of its directory instead, encoded
+    below NO_PATH, and doesn't take a node of its own.
+
+    Removed records keep their place with a kind of 0, so the index of a
+    record is also its position in the plan. The few links whose text isn't
+    the one computed from their paths have it in link_texts.
+    """
+
+    def __init__(self):
+        self.paths = PathTable()
+        self.kinds = array("b")
+        self.subcmds = array("b")
+        self.targets = array("i")
+        self.sources = array("i")
+        self.link_texts: Dict[int, str] = {}
+        self.subcmd_names: List[str] = []
+        self._subcmd_ids: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def append(self, kind: int, subcmd: str, target, source=None) -> int:
+        """
+        add a record and get its index, kind must not be 0
+        """
+        subcmd_id = self._subcmd_ids.get(subcmd)
+        if subcmd_id is None:
+            subcmd_id = self._subcmd_ids[subcmd] = len(self.subcmd_names)
+            self.subcmd_names.append(subcmd)
+        self.kinds.append(kind)
+        self.subcmds.append(subcmd_id)
+        target = self.paths.intern(target)
+        self.targets.append(target)
+        self.sources.append(self._get_source_value(target, source, self.paths.intern))
+        return len(self.kinds) - 1
+
+    def find_source(self, target: int, source) -> Optional[int]:
+        """
+        get the value of the sources column for the source of a record about
+        target, without adding paths, None if no record can have it
+        """
+        return self._get_source_value(target, source, self.paths.find)
+
+    def _get_source_value(self, target: int, source, get_node) -> Optional[int]:
+        if source is None:
+            return NO_PATH
+        source = source if isinstance(source, pathlib.PurePath) else pathlib.PurePath(source)
+        names = _get_names(source)
+        if len(names) > 1 and names[-1] == self.paths.names[target]:
+            directory = get_node(source.parent)
+            return None if directory is None else _SAME_NAME - directory
+        return get_node(source)
+
+    def discard(self, record: int):
+        """
+        remove a record
+        """
+        self.kinds[record] = 0
+
+    def get_subcmd(self, record: int) -> str:
+        """
+        get the sub-command of a record
+        """
+        return self.subcmd_names[self.subcmds[record]]
+
+    def get_source(self, record: int) -> Optional[pathlib.Path]:
+        """
+        get the second path of a record, if any
+        """
+        source = self.sources[record]
+        if source == NO_PATH:
+            return None
+        if source < NO_PATH:
+            return self.paths.get_path(_SAME_NAME - source) / self.paths.names[self.targets[record]]
+        return self.paths.get_path(source)
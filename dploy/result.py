@@ -0,0 +1,68 @@
+"""
+What a sub-command run from the Python API did, so that callers don't have to
+parse what it printed
+"""
+
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Union
+
+from dploy import actions, error, syscalls, timings
+
+
+class Result:
+    """
+    The outcome of a stow, unstow, clean or link sub-command.
+
+    actions is the plan that was executed, or would have been for a dry run,
+    whose action objects are only made as they are looked at, and counts has
+    the number of its actions by kind, e.g. "link" or "unlink".
+    When the sub-command fails, errors has every error it found and the first
+    one is raised with the result as its result attribute.
+
+    timings has the wall and CPU time of each phase along with the directories
+    listed and the system calls made through the stat cache. syscalls counts
+    every system call by phase and source, but only for the sub-commands asked
+    to with count_syscalls since it slows them down a little.
+    """
+
+    # pylint: disable=too-few-public-methods
+    def __init__(self, subcmd: str, is_dry_run: bool, count_syscalls: bool = False):
+        self.subcmd = subcmd
+        self.is_dry_run = is_dry_run
+        self.actions: Union[actions.Actions, List[actions.AbstractBaseAction]] = []
+        self.counts: Dict[str, int] = {}
+        self.errors: List[error.DployError] = []
+        self.timings = timings.Timings()
+        self.syscalls: Optional[syscalls.Counter] = syscalls.Counter() if count_syscalls else None
+
+    @property
+    def is_successful(self) -> bool:
+        """
+        check if the sub-command completed without errors
+        """
+        return not self.errors
+
+    def __repr__(self):
+        return "Result(subcmd={!r}, is_dry_run={!r}, counts={!r}, errors={!r})".format(
+            self.subcmd, self.is_dry_run, self.counts, self.errors
+        )
+
+
+def run(subcmd: str, command_type, is_dry_run: bool, count_syscalls: bool, *args, **kwargs) -> Result:
+    """
+    run a sub-command by constructing command_type with args and kwargs, and
+    get its result
+    """
+    result = Result(subcmd, is_dry_run, count_syscalls)
+    counting = syscalls.record(result.syscalls) if result.syscalls is not None else nullcontext()
+    try:
+        with timings.record(result.timings), counting:
+            command = command_type(*args, **kwargs)
+    except error.DployError as dploy_error:
+        result.errors = getattr(dploy_error, "errors", [dploy_error])
+        dploy_error.result = result
+        raise
+
+    result.actions = command.actions
+    result.counts = command.actions.get_counts()
+    return result
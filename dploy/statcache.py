@@ -0,0 +1,452 @@
+"""
+A run scoped snapshot of file system metadata so that the many existence, type
+and permission checks made while collecting actions only hit the file system
+once per path
+"""
+
+import errno
+import os
+import stat
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from dploy import syscalls, utils
+from dploy.oschmod import IS_WINDOWS, get_mode
+from dploy.utils import DirectoryEntry, StowPath
+
+# errors that pathlib treats as "does not exist" rather than raising
+_IGNORED_ERRNOS = (errno.ENOENT, errno.ENOTDIR, errno.EBADF, errno.ELOOP)
+_IGNORED_WINERRORS = (21, 123, 1921)  # not ready, invalid name, cant access
+
+_StatRecord = Union[os.stat_result, OSError]
+
+
+def is_ignored_error(exception: OSError) -> bool:
+    """
+    check if an error means the path does not exist, like pathlib does
+    """
+    return (
+        getattr(exception, "errno", None) in _IGNORED_ERRNOS
+        or getattr(exception, "winerror", None) in _IGNORED_WINERRORS
+    )
+
+
+def _copy_error(exception: OSError) -> OSError:
+    """
+    create a fresh copy of a cached error so that raising it again does not
+    keep extending the traceback of the original
+    """
+    return type(exception)(exception.errno, exception.strerror, exception.filename)
+
+
+class _Records:
+    """
+    A mapping of path to stat record that is optionally bounded in size, in
+    which case the least recently used records are evicted first
+    """
+
+    def __init__(self, max_entries: Optional[int]):
+        self.max_entries = max_entries
+        self.records: Dict[str, Any] = OrderedDict() if max_entries else {}
+
+    def get(self, key: str) -> Any:
+        """
+        get a record and mark it as recently used
+        """
+        record = self.records.get(key)
+        if record is not None and self.max_entries:
+            self.records.move_to_end(key)  # type: ignore[attr-defined]
+        return record
+
+    def put(self, key: str, record: Any) -> None:
+        """
+        store a record evicting the least recently used one if needed
+        """
+        self.records[key] = record
+        if self.max_entries and len(self.records) > self.max_entries:
+            self.records.popitem(last=False)  # type: ignore[call-arg]
+
+    def discard(self, key: str) -> None:
+        """
+        forget a record if it is present
+        """
+        self.records.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+class FileSystem:
+    """
+    The system calls a StatCache makes. Replace it to run dploy against
+    something other than the local file system, e.g. to simulate a slow one.
+    Each call is reported to syscalls.count().
+    """
+
+    def lstat(self, path: str) -> os.stat_result:
+        """os.lstat()"""
+        with syscalls.count("lstat"):
+            return os.lstat(path)
+
+    def stat(self, path: str) -> os.stat_result:
+        """os.stat()"""
+        with syscalls.count("stat"):
+            return os.stat(path)
+
+    def scan_directory(self, directory: Path) -> List[DirectoryEntry]:
+        """utils.scan_directory()"""
+        return utils.scan_directory(directory)
+
+    def readlink(self, path: str) -> str:
+        """os.readlink()"""
+        with syscalls.count("readlink"):
+            return os.readlink(path)
+
+    def get_mode(self, path: str) -> int:
+        """oschmod.get_mode()"""
+        with syscalls.count("stat"):
+            return get_mode(path)
+
+
+class StatCache:
+    """
+    Caches the results of lstat() and stat() by path, including failed lookups,
+    for the duration of a single dploy run.
+
+    Directories listed with scan() are remembered as well, so the type of any
+    of their children, or the fact that a child does not exist, is known
+    without another system call.
+
+    The cache is a snapshot: it assumes nothing changes on disk while actions
+    are being collected. Pass max_entries to bound memory use on very large
+    trees, in which case the least recently used results are dropped first.
+
+    When an executor is set, prefetch() lists directories on its worker
+    threads ahead of time. Only the system calls run on the workers, the cache
+    itself is only ever updated from the thread that uses it.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, backend: Optional[FileSystem] = None):
+        self.backend = FileSystem() if backend is None else backend
+        self.executor: Optional[Executor] = None
+        self._pending: Dict[str, "Future[Tuple[_StatRecord, Any]]"] = {}
+        self._lstats = _Records(max_entries)
+        self._stats = _Records(max_entries)
+        self._modes = _Records(max_entries)
+        self._listings = _Records(max_entries)
+        self._resolved = _Records(max_entries)
+        self._link_texts = _Records(max_entries)
+        self._resolving = set()
+        self.syscalls = 0
+        self.saved_syscalls = 0
+        # directories listed and the entries found in them
+        self.directories = 0
+        self.entries = 0
+
+    def __len__(self) -> int:
+        return len(self._lstats) + len(self._stats)
+
+    def scan(self, directory: Path) -> List[DirectoryEntry]:
+        """
+        list a directory with utils.scan_directory() and remember its entries
+        """
+        key = os.fspath(directory)
+        listing = self._listings.get(key)
+        if listing is None:
+            if key in self._pending:
+                entries = self._consume_prefetched(key)
+                if isinstance(entries, OSError):
+                    raise entries
+                return entries
+            self.syscalls += 1
+            entries = self.backend.scan_directory(directory)
+            self._listings.put(key, {entry.name: entry for entry in entries})
+            self.directories += 1
+            self.entries += len(entries)
+            return entries
+        self.saved_syscalls += 1
+        return list(listing.values())
+
+    @property
+    def is_prefetching(self) -> bool:
+        """
+        check if directories can be prefetched on worker threads
+        """
+        return self.executor is not None
+
+    def prefetch(self, directories: Iterable[Path]) -> None:
+        """
+        start to lstat() and list directories on the worker threads so that
+        they are ready by the time scan() or lstat() asks for them
+        """
+        if self.executor is None:
+            return
+        for directory in directories:
+            key = os.fspath(directory)
+            if key not in self._pending and key not in self._listings.records:
+                self._pending[key] = self.executor.submit(self._fetch_directory, directory)
+
+    def cancel_prefetching(self) -> None:
+        """
+        drop the directories that were prefetched but never asked for
+        """
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+    def _fetch_directory(self, directory: Path) -> Tuple[_StatRecord, Any]:
+        """
+        runs on a worker thread, so it must not modify the cache
+        """
+        key = os.fspath(directory)
+        try:
+            lstat_record: _StatRecord = self.backend.lstat(key)
+        except OSError as os_error:
+            lstat_record = os_error
+        try:
+            entries: Any = self.backend.scan_directory(directory)
+        except OSError as os_error:
+            entries = os_error
+        return lstat_record, entries
+
+    def _consume_prefetched(self, key: str) -> Any:
+        """
+        store the results of a prefetched directory and return its entries or
+        the error listing it raised
+        """
+        future = self._pending.pop(key)
+        lstat_record, entries = future.result()
+        self.syscalls += 2
+        if self._lstats.get(key) is None:
+            self._lstats.put(key, lstat_record)
+        if not isinstance(entries, OSError):
+            self._listings.put(key, {entry.name: entry for entry in entries})
+            self.directories += 1
+            self.entries += len(entries)
+        return entries
+
+    def entry(self, path: StowPath) -> Union[DirectoryEntry, bool, None]:
+        """
+        look up a path in the directory listings seen so far, returns the
+        entry if found, False if its parent was listed and it wasn't there or
+        None when nothing is known about it
+        """
+        parent, name = os.path.split(os.fspath(path))
+        listing = self._listings.get(parent)
+        if listing is None:
+            if parent not in self._pending or isinstance(self._consume_prefetched(parent), OSError):
+                return None
+            listing = self._listings.get(parent)
+        return listing.get(name, False)
+
+    def lstat(self, path: StowPath) -> os.stat_result:
+        """
+        os.lstat() of a path, raising the same OSError the syscall would
+        """
+        key = os.fspath(path)
+        if key in self._pending:
+            self._consume_prefetched(key)
+            return self._unwrap(self._lstats.get(key))
+
+        record = self._lstats.get(key)
+        if record is None:
+            if self.entry(key) is False:
+                record = FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), key)
+                self.saved_syscalls += 1
+            else:
+                record = self._call(self.backend.lstat, key)
+            self._lstats.put(key, record)
+        else:
+            self.saved_syscalls += 1
+        return self._unwrap(record)
+
+    def stat(self, path: StowPath) -> os.stat_result:
+        """
+        os.stat() of a path, raising the same OSError the syscall would
+        """
+        key = os.fspath(path)
+        record = self._stats.get(key)
+        if record is None:
+            entry = self.entry(key)
+            if entry and entry.is_symlink():  # type: ignore[union-attr]
+                record = self._call(self.backend.stat, key)
+            else:
+                # stat() and lstat() agree on anything that isn't a symlink so
+                # only symlinks ever need a second system call
+                try:
+                    record = self.lstat(key)
+                except OSError as os_error:
+                    record = os_error
+                else:
+                    if stat.S_ISLNK(record.st_mode):
+                        record = self._call(self.backend.stat, key)
+            self._stats.put(key, record)
+        else:
+            self.saved_syscalls += 1
+        return self._unwrap(record)
+
+    def mode(self, path: StowPath) -> int:
+        """
+        the permission bits of a path as returned by oschmod.get_mode()
+        """
+        if not IS_WINDOWS:
+            return self.stat(path).st_mode & (stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
+
+        key = os.fspath(path)
+        record = self._modes.get(key)
+        if record is None:
+            record = self.backend.get_mode(key)
+            self._modes.put(key, record)
+            self.syscalls += 1
+        else:
+            self.saved_syscalls += 1
+        return record  # type: ignore[return-value]
+
+    def exists(self, path: StowPath) -> bool:
+        """
+        equivalent of pathlib.Path.exists(), following symbolic links
+        """
+        entry = self.entry(path)
+        if entry is False or (entry is not None and not entry.is_symlink()):
+            self.saved_syscalls += 1
+            return entry is not False
+        try:
+            self.stat(path)
+        except OSError as os_error:
+            if not is_ignored_error(os_error):
+                raise
+            return False
+        return True
+
+    def lexists(self, path: StowPath) -> bool:
+        """
+        check if a path exists without following a final symbolic link
+        """
+        entry = self.entry(path)
+        if entry is not None:
+            self.saved_syscalls += 1
+            return entry is not False
+        try:
+            self.lstat(path)
+        except OSError as os_error:
+            if not is_ignored_error(os_error):
+                raise
+            return False
+        return True
+
+    def is_dir(self, path: StowPath) -> bool:
+        """
+        equivalent of pathlib.Path.is_dir(), following symbolic links
+        """
+        entry = self.entry(path)
+        if entry is False or (entry is not None and not entry.is_symlink()):
+            self.saved_syscalls += 1
+            return entry is not False and entry.is_dir(follow_symlinks=False)
+        try:
+            return stat.S_ISDIR(self.stat(path).st_mode)
+        except OSError as os_error:
+            if not is_ignored_error(os_error):
+                raise
+            return False
+        except ValueError:
+            return False
+
+    def is_symlink(self, path: StowPath) -> bool:
+        """
+        equivalent of pathlib.Path.is_symlink()
+        """
+        entry = self.entry(path)
+        if entry is not None:
+            self.saved_syscalls += 1
+            return entry is not False and entry.is_symlink()
+        try:
+            return stat.S_ISLNK(self.lstat(path).st_mode)
+        except OSError as os_error:
+            if not is_ignored_error(os_error):
+                raise
+            return False
+        except ValueError:
+            return False
+
+    def resolve(self, path: StowPath) -> Path:
+        """
+        equivalent of pathlib.Path.resolve(), memoized for every directory on
+        the way so that paths sharing a prefix only resolve it once
+        """
+        key = os.fspath(path)
+        resolved = self._resolved.get(key)
+        if resolved is None:
+            resolved = self._resolve(Path(key))
+            self._resolved.put(key, resolved)
+        else:
+            self.saved_syscalls += 1
+        return resolved
+
+    def _resolve(self, path: Path) -> Path:
+        if not path.is_absolute():
+            path = Path(os.getcwd()) / path
+
+        parent = path.parent
+        if parent == path:  # the root of the file system
+            return path
+
+        resolved_parent = self.resolve(parent)
+        if path.name == "..":
+            return resolved_parent.parent
+
+        candidate = resolved_parent / path.name
+        if not self.is_symlink(candidate):
+            return candidate
+
+        key = os.fspath(candidate)
+        if IS_WINDOWS or key in self._resolving:  # let realpath handle loops
+            self.syscalls += 1
+            return Path(os.path.realpath(key))
+
+        self._resolving.add(key)
+        try:
+            return self.resolve(resolved_parent / self.readlink(candidate))
+        finally:
+            self._resolving.discard(key)
+
+    def readlink(self, path: StowPath) -> str:
+        """
+        get the text of a symbolic link, remembered from resolving it if it was
+        """
+        key = os.fspath(path)
+        link_text = self._link_texts.get(key)
+        if link_text is None:
+            self.syscalls += 1
+            link_text = self.backend.readlink(key)
+            self._link_texts.put(key, link_text)
+        else:
+            self.saved_syscalls += 1
+        return link_text
+
+    def invalidate(self, path: StowPath) -> None:
+        """
+        forget everything known about a path, e.g. after it has been modified
+        """
+        key = os.fspath(path)
+        self._lstats.discard(key)
+        self._stats.discard(key)
+        self._modes.discard(key)
+        self._listings.discard(key)
+        self._listings.discard(os.path.dirname(key))
+        self._resolved.discard(key)
+        self._link_texts.discard(key)
+
+    def _call(self, function, key: str) -> _StatRecord:
+        self.syscalls += 1
+        try:
+            return function(key)
+        except OSError as os_error:
+            return os_error
+
+    @staticmethod
+    def _unwrap(record: _StatRecord) -> os.stat_result:
+        if isinstance(record, OSError):
+            raise _copy_error(record)
+        return record
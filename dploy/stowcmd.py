@@ -2,10 +2,14 @@
 The logic and workings behind the stow and unstow sub-commands
 """
 
+import functools
+import os
 import pathlib
-from collections import Counter
+import stat
+from typing import Optional
 
-from dploy import actions, error, ignore, main, utils
+from dploy import actions, error, ignore, main, manifest, utils
+from dploy.statcache import FileSystem, StatCache, is_ignored_error
 from dploy.utils import StowIgnorePatterns, StowPath, StowSources
 
 
@@ -25,15 +29,33 @@ def __init__(
         is_silent: bool,
         is_dry_run: bool,
         ignore_patterns: StowIgnorePatterns,
+        stat_cache: Optional[StatCache] = None,
+        jobs: int = 1,
+        use_manifest: bool = False,
+        use_journal: bool = False,
     ):
         self.is_unfolding = False
-        super().__init__(subcmd, source, dest, is_silent, is_dry_run, ignore_patterns)
+        super().__init__(
+            subcmd,
+            source,
+            dest,
+            is_silent,
+            is_dry_run,
+            ignore_patterns,
+            stat_cache,
+            jobs,
+            use_manifest,
+            use_journal,
+        )
 
     def _is_valid_input(self, sources, dest):
         """
         Check to see if the input is valid
         """
-        return StowInput(self.errors, self.subcmd).is_valid(sources, dest)
+        return StowInput(self.errors, self.subcmd, self.stat_cache).is_valid(sources, dest)
+
+    def _open_manifest(self, sources, dest):
+        return manifest.open_manifest(dest, sources, self.use_manifest)
 
     def get_directory_contents(self, directory):
         """
@@ -42,7 +64,7 @@ def get_directory_contents(self, directory):
         contents = []
 
         try:
-            contents = utils.get_directory_contents(directory)
+            contents = self.stat_cache.scan(directory)
         except PermissionError:
             self.errors.add(error.PermissionDenied(self.subcmd, directory))
         except FileNotFoundError:
@@ -78,54 +100,100 @@ def _collect_actions_existing_dest(self, source, dest):
         _collect_actions() helper to collect required actions to perform a stow
         command when the destination already exists
         """
-        if utils.is_same_file(dest, source):
-            if dest.is_symlink() or self.is_unfolding:
+        if utils.is_same_file(dest, source, self.stat_cache):
+            if self.stat_cache.is_symlink(dest) or self.is_unfolding:
                 self._are_same_file(source, dest)
             else:
                 self.errors.add(error.SourceIsSameAsDest(self.subcmd, dest.parent))
 
-        elif dest.is_dir() and source.is_dir:
+        elif self.stat_cache.is_dir(dest) and source.is_dir:
             self._are_directories(source, dest)
         else:
             self.errors.add(error.ConflictsWithExistingFile(self.subcmd, source, dest))
 
+    def _prefetch_subdirectories(self, entries, dest, source_ignore):
+        """
+        start listing the directories the traversal will descend into next,
+        i.e. the source sub-directories and their existing dest counterparts
+        """
+        directories = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and not source_ignore.should_ignore(entry.path):
+                directories.append(entry.path)
+                dest_entry = self.stat_cache.entry(dest / entry.name)
+                if dest_entry and dest_entry.is_dir(follow_symlinks=False):
+                    directories.append(dest_entry.path)
+        self.stat_cache.prefetch(directories)
+
     def _collect_actions(self, source, dest):
         """
         Concrete method to collect required actions to perform a stow
         sub-command
         """
 
-        if self.ignore.should_ignore(source):
-            self.ignore.ignore(source)
+        source_ignore = self._get_ignore(source)
+
+        if source_ignore.should_ignore(source):
+            source_ignore.ignore(source)
             return
 
-        if not StowInput(self.errors, self.subcmd).is_valid_collection_input(source, dest):
+        if not StowInput(self.errors, self.subcmd, self.stat_cache).is_valid_collection_input(source, dest):
             return
 
         sources = self.get_directory_contents(source)
 
-        for subsources in sources:
-            if self.ignore.should_ignore(subsources):
-                self.ignore.ignore(subsources)
-                continue
+        if sources and self.stat_cache.is_dir(dest):
+            try:
+                # list dest once instead of looking up each of its children
+                self.stat_cache.scan(dest)
+            except OSError:
+                pass
 
-            dest_path = dest / pathlib.Path(subsources.name)
+        self._record_listing(source, sources)
 
-            does_dest_path_exist = False
-            try:
-                does_dest_path_exist = dest_path.exists()
-            except PermissionError:
-                self.errors.add(error.PermissionDenied(self.subcmd, dest_path))
+        if self.stat_cache.is_prefetching:
+            self._prefetch_subdirectories(sources, dest, source_ignore)
+
+        for entry in sources:
+            if not self._collect_entry_actions(entry, dest, source_ignore):
                 return
 
-            if does_dest_path_exist:
-                self._collect_actions_existing_dest(subsources, dest_path)
-            elif dest_path.is_symlink():
-                self.errors.add(error.ConflictsWithExistingLink(self.subcmd, subsources, dest_path))
-            elif not dest_path.parent.exists() and not self.is_unfolding:
-                self.errors.add(error.NoSuchDirectory(self.subcmd, dest_path.parent))
-            else:
-                self._are_other(subsources, dest_path)
+    def _collect_entry_actions(self, entry, dest, source_ignore):
+        """
+        _collect_actions() helper to collect the actions for one entry of a
+        source directory, returns False if the rest of the directory should
+        be skipped
+        """
+        subsources = entry.path
+        if source_ignore.should_ignore(subsources):
+            source_ignore.ignore(subsources)
+            return True
+
+        dest_path = dest / entry.name
+
+        does_dest_path_exist = False
+        try:
+            does_dest_path_exist = self.stat_cache.exists(dest_path)
+        except PermissionError:
+            self.errors.add(error.PermissionDenied(self.subcmd, dest_path))
+            return False
+
+        if does_dest_path_exist:
+            self._collect_actions_existing_dest(subsources, dest_path)
+        elif self.stat_cache.is_symlink(dest_path):
+            self.errors.add(error.ConflictsWithExistingLink(self.subcmd, subsources, dest_path))
+        elif not self.stat_cache.exists(dest_path.parent) and not self.is_unfolding:
+            self.errors.add(error.NoSuchDirectory(self.subcmd, dest_path.parent))
+        else:
+            self._are_other(subsources, dest_path)
+        return True
+
+    def _record_listing(self, directory, entries):
+        """
+        Abstract method to remember the listing of a source directory that
+        was walked
+        """
+        pass
 
 
 # pylint: disable=too-few-public-methods
@@ -142,15 +210,129 @@ def __init__(
         is_silent: bool = True,
         is_dry_run: bool = False,
         ignore_patterns: StowIgnorePatterns = None,
+        stat_cache: Optional[StatCache] = None,
+        jobs: int = 1,
+        use_manifest: bool = False,
+        incremental: bool = False,
+        use_journal: bool = False,
     ):
-        super().__init__("stow", source, dest, is_silent, is_dry_run, ignore_patterns)
+        self.incremental = incremental
+        super().__init__(
+            "stow",
+            source,
+            dest,
+            is_silent,
+            is_dry_run,
+            ignore_patterns,
+            stat_cache,
+            jobs,
+            use_manifest or incremental,
+            use_journal=use_journal,
+        )
+
+    def _record_listing(self, directory, entries):
+        """
+        stage the listing of a walked source directory in the manifest for a
+        later incremental stow
+        """
+        if self.manifest is None:
+            return
+        try:
+            mtime_ns = self.stat_cache.stat(directory).st_mtime_ns
+        except OSError:
+            return
+        self.manifest.stage_listing(directory, mtime_ns, entries)
 
-    def _unfold(self, source, dest):
+    def _collect_package_actions(self, source, dest):
+        listings = self.manifest.get_listings(source) if self.incremental else {}
+        if listings and self.manifest.get_ignore_patterns(source) == self._get_ignore_patterns(source, listings):
+            if self._collect_incremental_actions(source, dest, listings):
+                return
+
+        if self.manifest is not None:
+            self.manifest.reset_listings(source)
+        self._collect_actions(source, dest)
+        if self.manifest is not None:
+            staged_listings = self.manifest.get_staged_listings(source)
+            self.manifest.stage_ignore_patterns(source, self._get_ignore_patterns(source, staged_listings))
+
+    def _get_ignore_patterns(self, source, listings):
+        """
+        get the ignore patterns in effect for a package, from the ignore file
+        next to it, --ignore and the ignore files in the listed directories
+        """
+        patterns = {"": list(self._get_ignore(source).patterns)}
+        for relative_path, listing in listings.items():
+            if listing is not None and ignore.IGNORE_FILE in listing[1]:
+                patterns[relative_path] = list(ignore.read_ignore_file(source / relative_path / ignore.IGNORE_FILE))
+        return patterns
+
+    def _collect_incremental_actions(self, source, dest, listings):
+        """
+        collect the actions for the entries added, removed or changed in type
+        in the directories of a package that were modified since the last stow,
+        instead of walking all of it, returns False without collecting any if
+        an ignore file was added, which needs a full walk instead
+
+        This trusts that the destination wasn't changed by anything else since.
+        """
+        if not StowInput(self.errors, self.subcmd, self.stat_cache).is_valid_collection_input(source, dest):
+            return True
+
+        modified = []
+        for relative_path in sorted(listings, key=lambda path: pathlib.PurePosixPath(path).parts):
+            mtime_ns, names = listings[relative_path]
+            directory = source / relative_path
+            try:
+                directory_stat = self.stat_cache.stat(directory)
+            except OSError:
+                directory_stat = None
+            if directory_stat is None or not stat.S_ISDIR(directory_stat.st_mode):
+                # the entry in its parent was removed or changed in type
+                self.manifest.stage_removed_listing(source, relative_path)
+                continue
+            if directory_stat.st_mtime_ns == mtime_ns:
+                continue
+
+            entries = self.get_directory_contents(directory)
+            if ignore.IGNORE_FILE not in names and any(entry.name == ignore.IGNORE_FILE for entry in entries):
+                return False
+            modified.append((relative_path, names, entries))
+
+        source_ignore = self._get_ignore(source)
+        package = self.manifest.get_package_path(source)[0]
+        for relative_path, names, entries in modified:
+            directory = source / relative_path
+            self._record_listing(directory, entries)
+            directory_dest = dest / relative_path
+            types = {entry.name: manifest.get_entry_type(entry) for entry in entries}
+
+            for name in names:
+                if name not in types:
+                    self._collect_removed_entry_actions(package, directory_dest / name)
+
+            for entry in entries:
+                if names.get(entry.name) != types[entry.name]:
+                    if not self._collect_entry_actions(entry, directory_dest, source_ignore):
+                        break
+        return True
+
+    def _collect_removed_entry_actions(self, package, dest):
+        """
+        unlink the links of a package at or beneath dest that were left
+        broken by removing their source
         """
-        Method unfold a destination directory
+        for entry in self.manifest.get_entries_under(dest):
+            if entry.package == package and self.manifest.verify(entry, self.stat_cache) == manifest.BROKEN:
+                self.actions.add(actions.UnLink(self.subcmd, entry.link, entry.target))
+
+    def _unfold(self, source, dest, link_text):
+        """
+        Method unfold a destination directory, replacing the link to source
+        whose text is link_text
         """
         self.is_unfolding = True
-        self.actions.add(actions.UnLink(self.subcmd, dest))
+        self.actions.add(actions.UnLink(self.subcmd, dest, link_text))
         self.actions.add(actions.MakeDirectory(self.subcmd, dest))
         self._collect_actions(source, dest)
         self.is_unfolding = False
@@ -161,37 +343,37 @@ def _handle_duplicate_actions(self):
         links to the same destination. Also check for actions that conflict but
         are candidates for unfolding instead.
         """
-        has_conflicts = False
         dupes = self.actions.get_duplicates()
 
-        if len(dupes) == 0:
-            return
+        while len(dupes) > 0:
+            has_conflicts = False
 
-        for indices in dupes:
-            first_action = self.actions.actions[indices[0]]
-            remaining_actions = [self.actions.actions[i] for i in indices[1:]]
+            for duplicates in dupes:
+                first_action = duplicates[0]
+                remaining_actions = duplicates[1:]
 
-            if first_action.source.is_dir():
-                self._unfold(first_action.source, first_action.dest)
+                if self.stat_cache.is_dir(first_action.source):
+                    self._unfold(first_action.source, first_action.dest, first_action.source_relative)
 
-                for action in remaining_actions:
-                    self.is_unfolding = True
-                    self._collect_actions(action.source, action.dest)
-                    self.is_unfolding = False
-            else:
-                duplicate_action_sources = [str(self.actions.actions[i].source) for i in indices]
-                self.errors.add(error.ConflictsWithAnotherSource(self.subcmd, duplicate_action_sources))
-                has_conflicts = True
+                    for action in remaining_actions:
+                        self.is_unfolding = True
+                        self._collect_actions(action.source, action.dest)
+                        self.is_unfolding = False
+                else:
+                    duplicate_action_sources = [str(action.source) for action in duplicates]
+                    self.errors.add(error.ConflictsWithAnotherSource(self.subcmd, duplicate_action_sources))
+                    has_conflicts = True
 
-        if has_conflicts:
-            return
+            if has_conflicts:
+                return
 
-        # remove duplicates
-        for indices in dupes:
-            for index in reversed(indices[1:]):
-                del self.actions.actions[index]
+            # remove duplicates
+            for duplicates in dupes:
+                for action in duplicates[1:]:
+                    self.actions.remove(action)
 
-        self._handle_duplicate_actions()
+            # unfolding may have introduced new duplicates further down
+            dupes = self.actions.get_duplicates()
 
     def _check_for_other_actions(self):
         self._handle_duplicate_actions()
@@ -206,8 +388,8 @@ def _are_same_file(self, source, dest):
             self.actions.add(actions.AlreadyLinked(self.subcmd, source, dest))
 
     def _are_directories(self, source, dest):
-        if dest.is_symlink():
-            self._unfold(dest.resolve(), dest)
+        if self.stat_cache.is_symlink(dest):
+            self._unfold(self.stat_cache.resolve(dest), dest, self.stat_cache.readlink(dest))
         self._collect_actions(source, dest)
 
     def _are_other(self, source, dest):
@@ -221,14 +403,56 @@ class UnStow(AbstractBaseStow):
     """
 
     # pylint: disable=too-many-arguments
-    def __init__(self, source, dest, is_silent=True, is_dry_run=False, ignore_patterns=None):
-        super().__init__("unstow", source, dest, is_silent, is_dry_run, ignore_patterns)
+    def __init__(
+        self,
+        source,
+        dest,
+        is_silent=True,
+        is_dry_run=False,
+        ignore_patterns=None,
+        stat_cache=None,
+        jobs=1,
+        use_manifest=False,
+        use_journal=False,
+    ):
+        super().__init__(
+            "unstow",
+            source,
+            dest,
+            is_silent,
+            is_dry_run,
+            ignore_patterns,
+            stat_cache,
+            jobs,
+            use_manifest,
+            use_journal,
+        )
+
+    def _collect_package_actions(self, source, dest):
+        """
+        unlink the links recorded in the manifest for a package instead of
+        walking it, when the manifest is used and knows about the package
+        """
+        if not self.use_manifest or not self.manifest.has_package(source):
+            self._collect_actions(source, dest)
+            return
+
+        if not StowInput(self.errors, self.subcmd, self.stat_cache).is_valid_collection_input(source, dest):
+            return
+
+        for entry in self.manifest.get_entries(source):
+            # a link removed or replaced since it was recorded isn't dploy's
+            # to remove anymore
+            if self.manifest.get_link_state(entry, self.stat_cache) != manifest.LINKED:
+                self.manifest.discard(entry.link)
+                continue
+            self.actions.add(actions.UnLink(self.subcmd, entry.link, entry.target))
 
     def _are_same_file(self, source, dest):
         """
         what to do if source and dest are the same files
         """
-        self.actions.add(actions.UnLink(self.subcmd, dest))
+        self.actions.add(actions.UnLink(self.subcmd, dest, self.stat_cache.readlink(dest)))
 
     def _are_directories(self, source, dest):
         self._collect_actions(source, dest)
@@ -244,40 +468,45 @@ def _collect_folding_actions(self):
         find candidates for folding i.e. when a directory contains symlinks to
         files that all share the same parent directory
         """
+        source_listings = {}
+
         for parent in self.actions.get_unlink_target_parents():
-            items = utils.get_directory_contents(parent)
-            other_links_parents = []
-            other_links = []
-            source_parent = None
+            # the links left in parent once unstowed, keyed by the directory
+            # they link into
+            links_by_source_parent = {}
             is_normal_files_detected = False
 
-            for item in items:
-                if item not in self.actions.get_unlink_targets():
-                    does_item_exist = False
-                    try:
-                        does_item_exist = item.exists()
-                    except PermissionError:
-                        self.errors.add(error.PermissionDenied(self.subcmd, item))
-                        return
-
-                    if does_item_exist and item.is_symlink():
-                        source_parent = item.resolve().parent
-                        other_links_parents.append(item.resolve().parent)
-                        other_links.append(item)
-                    else:
-                        is_normal_files_detected = True
-                        break
-
-            if not is_normal_files_detected:
-                other_links_parent_count = len(Counter(other_links_parents))
+            for entry in self.stat_cache.scan(parent):
+                item = entry.path
+                if self.actions.is_unlink_target(item):
+                    continue
+
+                does_item_exist = False
+                try:
+                    does_item_exist = self.stat_cache.exists(item)
+                except PermissionError:
+                    self.errors.add(error.PermissionDenied(self.subcmd, item))
+                    return
+
+                if does_item_exist and entry.is_symlink():
+                    source_parent = self.stat_cache.resolve(item).parent
+                    links_by_source_parent.setdefault(source_parent, []).append(item)
+                else:
+                    is_normal_files_detected = True
+                    break
+
+            if is_normal_files_detected:
+                continue
 
-                if other_links_parent_count == 1:
-                    assert source_parent is not None
-                    if utils.is_same_files(utils.get_directory_contents(source_parent), other_links):
-                        self._fold(source_parent, parent)
+            if len(links_by_source_parent) == 1:
+                source_parent, other_links = next(iter(links_by_source_parent.items()))
+                if source_parent not in source_listings:
+                    source_listings[source_parent] = [e.path for e in self.stat_cache.scan(source_parent)]
+                if utils.is_same_files(source_listings[source_parent], other_links, self.stat_cache):
+                    self._fold(source_parent, parent)
 
-                elif other_links_parent_count == 0 and not utils.is_same_file(parent, self.dest_input):
-                    self.actions.add(actions.RemoveDirectory(self.subcmd, parent))
+            elif len(links_by_source_parent) == 0 and not utils.is_same_file(parent, self.dest_input, self.stat_cache):
+                self.actions.add(actions.RemoveDirectory(self.subcmd, parent))
 
     def _fold(self, source, dest):
         """
@@ -299,19 +528,19 @@ def _is_valid_dest(self, dest):
         """
         result = True
 
-        if not dest.is_dir():
+        if not self.stat_cache.is_dir(dest):
             self.errors.add(error.NoSuchDirectoryToSubcmdInto(self.subcmd, dest))
             result = False
         else:
-            if not utils.is_directory_writable(dest):
+            if not utils.is_directory_writable(dest, self.stat_cache):
                 self.errors.add(error.InsufficientPermissionsToSubcmdTo(self.subcmd, dest))
                 result = False
 
-            if not utils.is_directory_readable(dest):
+            if not utils.is_directory_readable(dest, self.stat_cache):
                 self.errors.add(error.InsufficientPermissionsToSubcmdTo(self.subcmd, dest))
                 result = False
 
-            if not utils.is_directory_executable(dest):
+            if not utils.is_directory_executable(dest, self.stat_cache):
                 self.errors.add(error.InsufficientPermissionsToSubcmdTo(self.subcmd, dest))
                 result = False
 
@@ -323,15 +552,15 @@ def _is_valid_source(self, source):
         """
         result = True
 
-        if not source.is_dir():
+        if not self.stat_cache.is_dir(source):
             self.errors.add(error.NoSuchDirectory(self.subcmd, source))
             result = False
         else:
-            if not utils.is_directory_readable(source):
+            if not utils.is_directory_readable(source, self.stat_cache):
                 self.errors.add(error.InsufficientPermissionsToSubcmdFrom(self.subcmd, source))
                 result = False
 
-            if not utils.is_directory_executable(source):
+            if not utils.is_directory_executable(source, self.stat_cache):
                 self.errors.add(error.InsufficientPermissionsToSubcmdFrom(self.subcmd, source))
                 result = False
 
@@ -346,7 +575,7 @@ def is_valid_collection_input(self, source, dest):
         if not self._is_valid_source(source):
             result = False
 
-        if dest.exists():
+        if self.stat_cache.exists(dest):
             if not self._is_valid_dest(dest):
                 result = False
         return result
@@ -360,17 +589,46 @@ class Clean(main.AbstractBaseSubCommand):
     """
 
     # pylint: disable=too-many-arguments
-    def __init__(self, source, dest, is_silent, is_dry_run, ignore_patterns):
+    def __init__(
+        self,
+        source,
+        dest,
+        is_silent,
+        is_dry_run,
+        ignore_patterns,
+        stat_cache=None,
+        jobs=1,
+        use_manifest=False,
+        max_depth=None,
+        prune_patterns=None,
+        use_journal=False,
+    ):
         self.source = [pathlib.Path(s) for s in source]
         self.dest = pathlib.Path(dest)
         self.ignore_patterns = ignore_patterns
-        super().__init__("clean", source, dest, is_silent, is_dry_run, ignore_patterns)
+        self.max_depth = max_depth
+        self.prune_matcher = ignore.Matcher(prune_patterns or [])
+        super().__init__(
+            "clean",
+            source,
+            dest,
+            is_silent,
+            is_dry_run,
+            ignore_patterns,
+            stat_cache,
+            jobs,
+            use_manifest,
+            use_journal=use_journal,
+        )
 
     def _is_valid_input(self, sources, dest):
         """
         Check to see if the input is valid
         """
-        return StowInput(self.errors, self.subcmd).is_valid(sources, dest)
+        return StowInput(self.errors, self.subcmd, self.stat_cache).is_valid(sources, dest)
+
+    def _open_manifest(self, sources, dest):
+        return manifest.open_manifest(dest, sources, self.use_manifest)
 
     def get_directory_contents(self, directory):
         """
@@ -379,7 +637,7 @@ def get_directory_contents(self, directory):
         contents = []
 
         try:
-            contents = utils.get_directory_contents(directory)
+            contents = self.stat_cache.scan(directory)
         except PermissionError:
             self.errors.add(error.PermissionDenied(self.subcmd, directory))
         except FileNotFoundError:
@@ -390,14 +648,96 @@ def get_directory_contents(self, directory):
         return contents
 
     def _collect_clean_actions(self, source, source_names, dest):
-        subdests = utils.get_directory_contents(dest)
-        for subdest in subdests:
-            if subdest.is_symlink():
-                link_target = utils.readlink(subdest, absolute_target=True)
-                if not link_target.exists() and not source_names.isdisjoint(set(link_target.parents)):
-                    self.actions.add(actions.UnLink(self.subcmd, subdest))
-            elif subdest.is_dir():
-                self._collect_clean_actions(source, source_names, subdest)
+        """
+        collect the actions to unlink the broken links into the sources in
+        dest
+        """
+        source_roots = SourceRoots(source_names)
+        links = []
+        # the texts of the links already read by _should_descend(), by path
+        read_link_texts = {}
+        self._collect_links(source, source_roots, dest, links, read_link_texts)
+
+        # reading and following the links is most of the work, so it runs
+        # on the worker threads when there are any
+        get_broken_link_text = functools.partial(_get_broken_link_text, self.stat_cache.backend, source_roots)
+        link_paths = [os.fspath(link) for link in links]
+        known_link_texts = [read_link_texts.get(link_path) for link_path in link_paths]
+        if self.executor is None:
+            link_texts = map(get_broken_link_text, link_paths, known_link_texts)
+        else:
+            link_texts = self.executor.map(get_broken_link_text, link_paths, known_link_texts, chunksize=64)
+
+        for link, link_text in zip(links, link_texts):
+            if link_text is not None:
+                self.actions.add(actions.UnLink(self.subcmd, link.path, link_text))
+
+    def _collect_links(self, source, source_roots, dest, links, read_link_texts, depth=0):
+        """
+        collect the symbolic links in dest, only descending into the
+        directories that could contain links into the sources, see
+        _should_descend()
+        """
+        entries = self.stat_cache.scan(dest)
+        subdirectories = [
+            entry.path
+            for entry in entries
+            if entry.is_dir(follow_symlinks=False) and self._can_descend(entry.path, depth)
+        ]
+        self.stat_cache.prefetch(subdirectories)
+        descendable = set(subdirectories)
+        for entry in entries:
+            if entry.is_symlink():
+                links.append(entry)
+            elif entry.is_dir(follow_symlinks=False):
+                subdest = entry.path
+                if subdest in descendable and self._should_descend(source, source_roots, subdest, read_link_texts):
+                    self._collect_links(source, source_roots, subdest, links, read_link_texts, depth + 1)
+
+    def _can_descend(self, directory, depth):
+        """
+        check the --max-depth and --prune limits for a directory
+        """
+        if self.max_depth is not None and depth >= self.max_depth:
+            return False
+        return not self.prune_matcher.matches(directory)
+
+    def _should_descend(self, sources, source_roots, directory, read_link_texts):
+        """
+        check if a dest directory can contain links from stowing the sources,
+        i.e. it mirrors a directory in one of them or it holds links into
+        them, so that clean does not walk caches and checkouts in dest, and
+        keep the texts of the links read in read_link_texts
+        """
+        relative_path = directory.relative_to(self.dest)
+        if any(self.stat_cache.is_dir(source / relative_path) for source in sources):
+            return True
+
+        try:
+            entries = self.stat_cache.scan(directory)
+        except OSError:
+            return False
+        directory_path = os.fspath(directory)
+        for entry in entries:
+            if entry.is_symlink():
+                link_path = os.fspath(entry.path)
+                link_text = self.stat_cache.backend.readlink(link_path)
+                read_link_texts[link_path] = link_text
+                if source_roots.contains(directory_path, link_text):
+                    return True
+        return False
+
+    def _collect_clean_actions_from_manifest(self, package):
+        """
+        unlink the broken links recorded in the manifest for a package, which
+        are checked to still be the links dploy created
+        """
+        for entry in self.manifest.get_entries(package):
+            state = self.manifest.verify(entry, self.stat_cache)
+            if state == manifest.BROKEN:
+                self.actions.add(actions.UnLink(self.subcmd, entry.link, entry.target))
+            elif state != manifest.LINKED:
+                self.manifest.discard(entry.link)
 
     def _check_for_other_actions(self):
         """
@@ -406,14 +746,21 @@ def _check_for_other_actions(self):
         """
         valid_files = []
         for a_file in self.source:
-            self.ignore = ignore.Ignore(self.ignore_patterns, a_file)
+            self.ignore = ignore.Ignore(self.ignore_patterns, a_file, self.stat_cache)
             if self.ignore.should_ignore(a_file):
                 self.ignore.ignore(a_file)
                 continue
 
             valid_files.append(a_file)
 
-            if not StowInput(self.errors, self.subcmd).is_valid_collection_input(a_file, self.dest):
+            if not StowInput(self.errors, self.subcmd, self.stat_cache).is_valid_collection_input(a_file, self.dest):
+                return
+
+        if self.use_manifest and self.manifest is not None:
+            for package in [f for f in valid_files if self.manifest.has_package(f)]:
+                self._collect_clean_actions_from_manifest(package)
+                valid_files.remove(package)
+            if not valid_files:
                 return
 
         # NOTE: an option to make clean more aggressive is to change f.name to
@@ -421,3 +768,60 @@ def _check_for_other_actions(self):
         files_names = [utils.get_absolute_path(f.name) for f in valid_files]
         files_names_set = set(files_names)
         self._collect_clean_actions(valid_files, files_names_set, self.dest)
+
+
+class SourceRoots:
+    """
+    The directories clean removes broken links into, normalized once so that
+    a link target is classified with string prefix tests instead of building
+    all of its parents
+    """
+
+    def __init__(self, roots):
+        self.prefixes = tuple(os.path.normcase(os.path.join(os.fspath(root), "")) for root in roots)
+
+    def contains(self, link_directory: str, link_text: str) -> bool:
+        """
+        check if the target of a link in link_directory is beneath one of the
+        roots, without resolving it, i.e. a root is one of its parents
+        """
+        target = os.path.join(link_directory, link_text)
+        if not _is_pure_path(target):
+            # normalize it the way pathlib does, which keeps any '..'
+            target = os.fspath(pathlib.PurePath(target))
+        return os.path.normcase(target).startswith(self.prefixes)
+
+
+def _is_pure_path(path: str) -> bool:
+    """
+    check if pathlib.PurePath() would leave a path as it is
+    """
+    return (
+        os.sep == "/"
+        and "//" not in path
+        and "/./" not in path
+        and not path.startswith("./")
+        and not path.endswith(("/", "/."))
+        and path not in ("", ".")
+    )
+
+
+def _get_broken_link_text(
+    backend: FileSystem, source_roots: SourceRoots, link: str, link_text: Optional[str] = None
+) -> Optional[str]:
+    """
+    get the text of a link if it points into the sources but what it points
+    to doesn't exist, reading it unless its text is passed, runs on the
+    worker threads
+    """
+    if link_text is None:
+        link_text = backend.readlink(link)
+    if not source_roots.contains(os.path.dirname(link), link_text):
+        return None
+    try:
+        backend.stat(link)
+    except OSError as os_error:
+        if not is_ignored_error(os_error):
+            raise
+        return link_text
+    return None
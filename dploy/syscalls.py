@@ -0,0 +1,193 @@
+"""
+The system calls made by the sub-commands and the time spent in them, counted
+only while record() is active
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+# in the order they are printed, "glob" stands for the directories pathlib
+# lists itself while globbing
+CALLS = ("stat", "lstat", "readlink", "listdir", "symlink", "unlink", "mkdir", "rmdir", "glob")
+
+_NOT_COUNTING = nullcontext()
+
+
+class CallCount:
+    """
+    how many times a system call was made and the time spent in it
+    """
+
+    # pylint: disable=too-few-public-methods
+    def __init__(self, calls: int = 0, seconds: float = 0.0):
+        self.calls = calls
+        self.seconds = seconds
+
+    def __repr__(self):
+        return "CallCount(calls={}, seconds={:.6f})".format(self.calls, self.seconds)
+
+
+class Counter:
+    """
+    The system calls made while it is recording, by phase of the sub-commands
+    and by the source being collected when they were made.
+
+    Calls made outside of a phase or while no source is being collected, e.g.
+    when the actions are executed, are counted with a phase or source of None.
+    Calls made by the threads listing directories ahead of the traversal are
+    counted as part of the source being collected at the time.
+    """
+
+    def __init__(self):
+        self.phase: Optional[str] = None
+        self.source: Optional[str] = None
+        self.counts: Dict[Tuple[Optional[str], Optional[str]], Dict[str, CallCount]] = {}
+        # the Counter that was recording when this one started to, which
+        # counts everything this one does as well
+        self.parent: Optional["Counter"] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def count(self, call: str) -> Iterator[None]:
+        """
+        count a system call made in a with block
+        """
+        key = (self.phase, self.source)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            counter: Optional[Counter] = self
+            while counter is not None:
+                with counter._lock:  # pylint: disable=protected-access
+                    call_count = counter.counts.setdefault(key, {}).setdefault(call, CallCount())
+                    call_count.calls += 1
+                    call_count.seconds += seconds
+                counter = counter.parent
+
+    @contextmanager
+    def attribute(self, **attributes) -> Iterator[None]:
+        """
+        count the calls made in a with block as part of a phase or a source
+        """
+        previous = {name: getattr(self, name) for name in attributes}
+        for name, value in attributes.items():
+            setattr(self, name, value)
+        try:
+            yield
+        finally:
+            for name, value in previous.items():
+                setattr(self, name, value)
+
+    def _get_totals(self, index: Optional[int]) -> Dict[Optional[str], Dict[str, CallCount]]:
+        totals: Dict[Optional[str], Dict[str, CallCount]] = {}
+        for key, call_counts in self.counts.items():
+            group = totals.setdefault(None if index is None else key[index], {})
+            for call, call_count in call_counts.items():
+                total = group.setdefault(call, CallCount())
+                total.calls += call_count.calls
+                total.seconds += call_count.seconds
+        return totals
+
+    def get_totals(self) -> Dict[str, CallCount]:
+        """
+        get the counts of each system call
+        """
+        return self._get_totals(None).get(None, {})
+
+    def get_totals_by_phase(self) -> Dict[Optional[str], Dict[str, CallCount]]:
+        """
+        get the counts of each system call by phase
+        """
+        return self._get_totals(0)
+
+    def get_totals_by_source(self) -> Dict[Optional[str], Dict[str, CallCount]]:
+        """
+        get the counts of each system call by source
+        """
+        return self._get_totals(1)
+
+    def print(self, file=None) -> None:
+        """
+        print a table of the counts by phase and source followed by the totals,
+        to stderr by default
+        """
+        file = sys.stderr if file is None else file
+        line_format = "{:<10} {:<30} {:<10} {:>10} {:>12}"
+        print(line_format.format("phase", "source", "call", "calls", "time (s)"), file=file)
+        rows = list(self.counts.items())
+        rows.append((("total", ""), self.get_totals()))
+        for (phase_name, source_name), call_counts in rows:
+            for call in sorted(call_counts, key=_get_call_order):
+                call_count = call_counts[call]
+                print(
+                    line_format.format(
+                        phase_name or "-",
+                        source_name or "-",
+                        call,
+                        call_count.calls,
+                        "{:.6f}".format(call_count.seconds),
+                    ),
+                    file=file,
+                )
+
+
+def _get_call_order(call: str) -> Tuple[int, str]:
+    return (CALLS.index(call) if call in CALLS else len(CALLS), call)
+
+
+_recording: Optional[Counter] = None
+
+
+def count(call: str):
+    """
+    get a context manager counting a system call made in a with block if
+    recording, which costs nothing otherwise
+    """
+    if _recording is None:
+        return _NOT_COUNTING
+    return _recording.count(call)
+
+
+def phase(name: str):
+    """
+    get a context manager counting the calls made in a with block as part of
+    a phase if recording
+    """
+    if _recording is None:
+        return _NOT_COUNTING
+    return _recording.attribute(phase=name)
+
+
+def source(path: Union["os.PathLike[str]", str]):
+    """
+    get a context manager counting the calls made in a with block as part of
+    a source if recording
+    """
+    if _recording is None:
+        return _NOT_COUNTING
+    return _recording.attribute(source=os.fspath(path))
+
+
+@contextmanager
+def record(counter: Counter) -> Iterator[Counter]:
+    """
+    count the system calls made by the sub-commands run in a with block in
+    counter, and in whatever was already counting them
+    """
+    global _recording  # pylint: disable=global-statement
+    previous = _recording
+    if previous is not counter:
+        counter.parent = previous
+    _recording = counter
+    try:
+        yield counter
+    finally:
+        _recording = previous
+        if previous is not counter:
+            counter.parent = None
@@ -0,0 +1,152 @@
+"""
+Wall and CPU time spent in each phase of the sub-commands, recorded only
+while record() is active
+"""
+
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, Optional
+
+PHASES = ("validate", "collect", "check", "execute")
+
+_NOT_RECORDING = nullcontext()
+
+
+class PhaseTimings:
+    """
+    what one phase took, added up over every sub-command run while recording
+    """
+
+    # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.directories = 0
+        self.entries = 0
+        self.syscalls = 0
+        self.actions = 0
+        # the most memory tracemalloc traced during the phase above what it
+        # traced as the phase started, and in all, 0 unless it was tracing,
+        # e.g. in the benchmarks
+        self.peak_memory = 0
+        self.peak_traced_memory = 0
+
+    def add(self, other: "PhaseTimings") -> None:
+        """
+        add up what other took, keeping the highest of the peaks
+        """
+        self.wall += other.wall
+        self.cpu += other.cpu
+        self.directories += other.directories
+        self.entries += other.entries
+        self.syscalls += other.syscalls
+        self.actions += other.actions
+        self.peak_memory = max(self.peak_memory, other.peak_memory)
+        self.peak_traced_memory = max(self.peak_traced_memory, other.peak_traced_memory)
+
+
+class Timings:
+    """
+    The time spent in each phase of a sub-command along with the number of
+    directories listed, of entries found in them and of the system calls made
+    while collecting, and the number of actions once the phase is over.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, PhaseTimings] = {}
+        # the Timings that was recording when this one started to, which gets
+        # everything this one records as well
+        self.parent: Optional["Timings"] = None
+
+    @contextmanager
+    def phase(self, name: str, command=None) -> Iterator[None]:
+        """
+        time a phase of command, a main.AbstractBaseSubCommand
+        """
+        stat_cache = getattr(command, "stat_cache", None)
+        if stat_cache is not None:
+            directories, entries, syscalls = stat_cache.directories, stat_cache.entries, stat_cache.syscalls
+        is_tracing = tracemalloc.is_tracing()
+        if is_tracing:
+            start_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            phase_timings = PhaseTimings()
+            phase_timings.wall = time.perf_counter() - wall_start
+            phase_timings.cpu = time.process_time() - cpu_start
+            if is_tracing:
+                phase_timings.peak_traced_memory = tracemalloc.get_traced_memory()[1]
+                phase_timings.peak_memory = phase_timings.peak_traced_memory - start_memory
+            if stat_cache is not None:
+                phase_timings.directories = stat_cache.directories - directories
+                phase_timings.entries = stat_cache.entries - entries
+                phase_timings.syscalls = stat_cache.syscalls - syscalls
+            if command is not None:
+                phase_timings.actions = len(command.actions)
+            recorder: Optional[Timings] = self
+            while recorder is not None:
+                recorder.phases.setdefault(name, PhaseTimings()).add(phase_timings)
+                recorder = recorder.parent
+
+    def print(self, file=None) -> None:
+        """
+        print a table of the phases, to stderr by default
+        """
+        file = sys.stderr if file is None else file
+        print(
+            "{:<10} {:>10} {:>10} {:>12} {:>10} {:>10} {:>10}".format(
+                "phase", "wall (s)", "cpu (s)", "directories", "entries", "syscalls", "actions"
+            ),
+            file=file,
+        )
+        for name, timings in self.phases.items():
+            print(
+                "{:<10} {:>10.4f} {:>10.4f} {:>12} {:>10} {:>10} {:>10}".format(
+                    name,
+                    timings.wall,
+                    timings.cpu,
+                    timings.directories,
+                    timings.entries,
+                    timings.syscalls,
+                    timings.actions,
+                ),
+                file=file,
+            )
+
+
+_recording: Optional[Timings] = None
+
+
+def phase(name: str, command=None):
+    """
+    get a context manager timing a phase if recording, which costs nothing
+    otherwise
+    """
+    if _recording is None:
+        return _NOT_RECORDING
+    return _recording.phase(name, command)
+
+
+@contextmanager
+def record(timings: Timings) -> Iterator[Timings]:
+    """
+    record the phases of the sub-commands run in a with block in timings, and
+    in whatever was already recording
+    """
+    global _recording  # pylint: disable=global-statement
+    previous = _recording
+    if previous is not timings:
+        timings.parent = previous
+    _recording = timings
+    try:
+        yield timings
+    finally:
+        _recording = previous
+        if previous is not timings:
+            timings.parent = None
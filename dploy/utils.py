@@ -5,16 +5,21 @@
 
 from __future__ import print_function, unicode_literals
 
+import functools
 import os
 import pathlib
 import shutil
 import stat
 from enum import Enum, auto
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Type, Union
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Type, Union
 
+from dploy import syscalls
 from dploy.oschmod import get_mode, set_mode
 
+if TYPE_CHECKING:
+    from dploy.statcache import StatCache
+
 StowPath = Union[os.PathLike[str], str, Path]
 StowTreeIterable = Union[Dict[str, "StowTreeNode"], List["StowTreeNode"]]
 StowTreeNode = Union[StowTreeIterable, StowPath]
@@ -359,16 +364,72 @@ def update_permissions(path: StowPath, operation: Operation, *permissions: Permi
         pass
 
 
-def get_directory_contents(directory: Path) -> list[Path]:
+class DirectoryEntry:
     """
-    return a sorted list of the contents of a directory
+    A child of a directory as reported by os.scandir(). The type of the entry
+    is known from the directory listing itself so asking for it does not cost
+    another system call, except for following symbolic links.
     """
-    contents: list[Path] = []
 
-    for child in directory.iterdir():
-        contents.append(child)
+    __slots__ = ("_directory", "_entry", "_path")
+
+    def __init__(self, directory: Path, entry: "os.DirEntry[str]"):
+        self._directory = directory
+        self._entry = entry
+        self._path: Optional[Path] = None
+
+    @property
+    def path(self) -> Path:
+        """the path of the entry, which is only built when asked for"""
+        if self._path is None:
+            self._path = self._directory / self._entry.name
+        return self._path
+
+    def __fspath__(self) -> str:
+        return self._entry.path
+
+    @property
+    def name(self) -> str:
+        """the name of the entry"""
+        return self._entry.name
+
+    @property
+    def inode(self) -> int:
+        """the inode number of the entry"""
+        return self._entry.inode()
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        """check if the entry is a directory"""
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        """check if the entry is a file"""
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self) -> bool:
+        """check if the entry is a symbolic link"""
+        return self._entry.is_symlink()
 
-    return sorted(contents)
+    def __repr__(self):
+        return "DirectoryEntry({path!r})".format(path=self.path)
+
+
+def scan_directory(directory: Path) -> list[DirectoryEntry]:
+    """
+    return a list of the entries of a directory sorted in the same order as
+    the paths returned by get_directory_contents()
+    """
+    with syscalls.count("listdir"), os.scandir(str(directory)) as entries:
+        contents = [DirectoryEntry(directory, entry) for entry in entries]
+    contents.sort(key=lambda entry: os.path.normcase(entry.name))
+    return contents
+
+
+def get_directory_contents(directory: Path) -> list[Path]:
+    """
+    return a sorted list of the contents of a directory
+    """
+    return [entry.path for entry in scan_directory(directory)]
 
 
 def rmtree(tree: StowPath):
@@ -379,23 +440,50 @@ def rmtree(tree: StowPath):
     shutil.rmtree(str(tree))
 
 
-def is_same_file(file1: Path, file2: Path) -> bool:
+def get_file_identity(file: StowPath, stat_cache: Optional["StatCache"] = None) -> Optional[tuple[int, int]]:
+    """
+    get the (device, inode) pair that identifies the file a path refers to,
+    following symbolic links. None is returned when the file doesn't exist or
+    the file system doesn't provide inode numbers.
+    """
+    try:
+        if stat_cache is None:
+            with syscalls.count("stat"):
+                file_stat = os.stat(file)
+        else:
+            file_stat = stat_cache.stat(file)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    if file_stat.st_ino == 0:
+        return None
+    return file_stat.st_dev, file_stat.st_ino
+
+
+def is_same_file(file1: Path, file2: Path, stat_cache: Optional["StatCache"] = None) -> bool:
     """
     test if two pathlib.Path() objects are the same file
 
-    NOTE: python 3.5 supports pathlib.Path.samefile(file)
-    NOTE: this can raise exception FileNotFoundError
+    Files are compared by device and inode number which, unlike resolving
+    both paths, doesn't need to walk every component of either path. Paths
+    that can't be identified that way are compared by their resolved paths.
     """
-    return file1.resolve() == file2.resolve()
+    identity1 = get_file_identity(file1, stat_cache)
+    identity2 = get_file_identity(file2, stat_cache)
+    if identity1 is not None and identity2 is not None:
+        return identity1 == identity2
 
+    if stat_cache is None:
+        return file1.resolve() == file2.resolve()
+    return stat_cache.resolve(file1) == stat_cache.resolve(file2)
 
-def is_same_files(files1: list[Path], files2: list[Path]) -> bool:
+
+def is_same_files(files1: list[Path], files2: list[Path], stat_cache: Optional["StatCache"] = None) -> bool:
     """
     test if two collection of files are equivalent
     """
-    files1_resolved = [f.resolve() for f in files1]
-    files2_resolved = [f.resolve() for f in files2]
-    return files1_resolved == files2_resolved
+    if len(files1) != len(files2):
+        return False
+    return all(is_same_file(file1, file2, stat_cache) for file1, file2 in zip(files1, files2))
 
 
 def get_absolute_path(file: StowPath) -> Path:
@@ -421,41 +509,78 @@ def get_relative_path(path: StowPath, start_at: StowPath) -> Path:
     return pathlib.Path(relative_path)
 
 
-def _get_access(path_item: StowPath) -> Permissions:
-    return Permissions(mode=get_mode(path_item))
+@functools.lru_cache(maxsize=4096)
+def _get_relative_directory(directory: str, start_at: str) -> Optional[str]:
+    """
+    get the relative path from start_at to directory, both absolute, or None
+    if there is none
+    """
+    try:
+        return os.path.relpath(directory, start_at)
+    except ValueError:  # e.g. on different drives
+        return None
+
+
+def get_relative_link_target(source: StowPath, dest: StowPath) -> Path:
+    """
+    get the relative path of source from the directory of dest, i.e. the text
+    of a relative link at dest to source, like get_relative_path()
+
+    The relative path between the parent directories is memoized, so the
+    entries of a directory linked from the same directory only compute it
+    once and only have the name of the entry appended.
+    """
+    source_parent, name = os.path.split(os.fspath(source))
+    dest_parent = os.path.dirname(os.fspath(dest))
+    if not name or not os.path.isabs(source_parent) or not os.path.isabs(dest_parent):
+        return get_relative_path(source, dest_parent)
+
+    relative_directory = _get_relative_directory(source_parent, dest_parent)
+    if relative_directory is None:
+        return get_absolute_path(source)
+    if relative_directory == os.curdir:
+        return pathlib.Path(name)
+    return pathlib.Path(relative_directory, name)
+
+
+def _get_access(path_item: StowPath, stat_cache: Optional["StatCache"] = None) -> Permissions:
+    if stat_cache is None:
+        with syscalls.count("stat"):
+            return Permissions(mode=get_mode(path_item))
+    return Permissions(mode=stat_cache.mode(path_item))
 
 
-def is_file_readable(a_file: StowPath) -> bool:
+def is_file_readable(a_file: StowPath, stat_cache: Optional["StatCache"] = None) -> bool:
     """check if a pathlib.Path() file is readable"""
-    return _get_access(a_file).u_r
+    return _get_access(a_file, stat_cache).u_r
 
 
-def is_file_writable(a_file: StowPath) -> bool:
+def is_file_writable(a_file: StowPath, stat_cache: Optional["StatCache"] = None) -> bool:
     """
     check if a pathlib.Path() file is writable
     """
-    return _get_access(a_file).u_w
+    return _get_access(a_file, stat_cache).u_w
 
 
-def is_directory_readable(directory: StowPath) -> bool:
+def is_directory_readable(directory: StowPath, stat_cache: Optional["StatCache"] = None) -> bool:
     """
     check if a pathlib.Path() directory is readable
     """
-    return _get_access(directory).u_r
+    return _get_access(directory, stat_cache).u_r
 
 
-def is_directory_writable(directory: StowPath) -> bool:
+def is_directory_writable(directory: StowPath, stat_cache: Optional["StatCache"] = None) -> bool:
     """
     check if a pathlib.Path() directory is writable
     """
-    return _get_access(directory).u_w
+    return _get_access(directory, stat_cache).u_w
 
 
-def is_directory_executable(directory: StowPath) -> bool:
+def is_directory_executable(directory: StowPath, stat_cache: Optional["StatCache"] = None) -> bool:
     """
     check if a pathlib.Path() directory is executable
     """
-    return _get_access(directory).u_x
+    return _get_access(directory, stat_cache).u_x
 
 
 def readlink(path: StowPath, absolute_target: bool = False) -> Path:
@@ -469,7 +594,8 @@ def readlink(path: StowPath, absolute_target: bool = False) -> Path:
     relative path
 
     """
-    link_target = os.readlink(str(path))
+    with syscalls.count("readlink"):
+        link_target = os.readlink(str(path))
     path_dir = os.path.dirname(str(path))
     if absolute_target:
         if not os.path.isabs(link_target):
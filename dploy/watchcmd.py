@@ -0,0 +1,343 @@
+"""
+The watch sub-command, which keeps a destination in sync with its sources by
+restowing them incrementally whenever they change
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from dploy import ignore, stowcmd
+from dploy.error import DployError
+from dploy.utils import StowIgnorePatterns, StowPath, StowSources
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+)
+_EVENT = struct.Struct("iIII")
+
+
+def _walk_directories(directory: Path) -> List[Path]:
+    """
+    get a directory and all the directories beneath it without following
+    symbolic links
+    """
+    return [Path(parent) for parent, _, _ in os.walk(directory)]
+
+
+class PollingWatcher:
+    """
+    Finds changes by comparing the modification times of the directories in
+    the sources every time it is asked, which works everywhere but costs a
+    stat() per directory.
+
+    Only the entries of a directory changing modifies it, so an edited
+    ignore file is only noticed by the InotifyWatcher.
+    """
+
+    def __init__(self, directories: Iterable[Path]):
+        self.mtimes: Dict[Path, int] = {}
+        for directory in directories:
+            self._add(directory)
+
+    def _add(self, directory: Path) -> None:
+        for path in _walk_directories(directory):
+            try:
+                self.mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+
+    def wait(self, timeout: float) -> Set[Path]:
+        """
+        wait for timeout seconds and get the directories that changed
+        """
+        time.sleep(timeout)
+        return self.poll()
+
+    def poll(self) -> Set[Path]:
+        """
+        get the directories that changed since the last poll
+        """
+        changes = set()
+        for directory, mtime_ns in list(self.mtimes.items()):
+            try:
+                current_mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                del self.mtimes[directory]
+                changes.add(directory)
+                continue
+            if current_mtime_ns != mtime_ns:
+                changes.add(directory)
+                self.mtimes[directory] = current_mtime_ns
+                try:
+                    with os.scandir(directory) as entries:
+                        subdirectories = [Path(entry.path) for entry in entries if entry.is_dir(follow_symlinks=False)]
+                except (FileNotFoundError, NotADirectoryError):
+                    # removed since the stat(), which the next one notices
+                    continue
+                for path in subdirectories:
+                    if path not in self.mtimes:
+                        self._add(path)
+                        changes.add(path)
+        return changes
+
+    def close(self) -> None:
+        """
+        stop watching
+        """
+        self.mtimes.clear()
+
+
+class InotifyWatcher:
+    """
+    Finds changes with the Linux inotify API, called through ctypes so that
+    there is nothing to install. Raises OSError if inotify isn't available or
+    the limit of watches is reached.
+    """
+
+    def __init__(self, directories: Iterable[Path]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            inotify_init1 = libc.inotify_init1
+        except AttributeError as attribute_error:
+            raise OSError(errno.ENOSYS, "inotify is not available") from attribute_error
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number))
+
+        self.watches: Dict[int, Path] = {}
+        try:
+            for directory in directories:
+                self._add(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def _add(self, directory: Path) -> None:
+        for path in _walk_directories(directory):
+            watch = self._add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+            if watch < 0:
+                error_number = ctypes.get_errno()
+                if error_number in (errno.ENOENT, errno.ENOTDIR):
+                    continue  # it was removed again in the meantime
+                raise OSError(error_number, os.strerror(error_number), str(path))
+            self.watches[watch] = path
+
+    def wait(self, timeout: float) -> Set[Path]:
+        """
+        wait up to timeout seconds for changes and get the directories that
+        changed along with the ignore files that were written to
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changes = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                watch, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size : offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                self._handle_event(watch, mask, os.fsdecode(name), changes)
+        return changes
+
+    def _handle_event(self, watch: int, mask: int, name: str, changes: Set[Path]) -> None:
+        if mask & IN_Q_OVERFLOW:
+            changes.update(self.watches.values())
+            return
+        directory = self.watches.get(watch)
+        if directory is None:
+            return
+        if mask & IN_IGNORED:
+            del self.watches[watch]
+            return
+        if mask & IN_CLOSE_WRITE:
+            if name == ignore.IGNORE_FILE:
+                changes.add(directory / name)
+            return
+
+        changes.add(directory)
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            try:
+                self._add(directory / name)
+            except OSError:
+                # most likely out of watches, the incremental stow will
+                # still pick up the new directory itself
+                pass
+
+    def close(self) -> None:
+        """
+        stop watching
+        """
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.watches.clear()
+
+
+def create_watcher(directories: Iterable[Path], use_polling: bool = False):
+    """
+    get an InotifyWatcher on Linux, or a PollingWatcher elsewhere or when
+    inotify can't be used
+    """
+    directories = list(directories)
+    if not use_polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directories)
+        except OSError:
+            pass
+    return PollingWatcher(directories)
+
+
+class Watch:
+    """
+    Stows the sources into dest and then restows them with an incremental
+    stow every time they change, until stopped.
+
+    Changes arriving in a burst, e.g. from a checkout, are gathered until
+    there are none for debounce seconds so they are applied together. The
+    incremental stow relies on the manifest in dest, which watch keeps.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        sources: StowSources,
+        dest: StowPath,
+        is_silent: bool = True,
+        ignore_patterns: StowIgnorePatterns = None,
+        jobs: int = 1,
+        interval: float = 1.0,
+        debounce: float = 0.2,
+        use_polling: bool = False,
+    ):
+        self.sources = [Path(source) for source in sources]
+        self.dest = Path(dest)
+        self.is_silent = is_silent
+        self.ignore_patterns = ignore_patterns
+        self.jobs = jobs
+        self.interval = interval
+        self.debounce = debounce
+        self.use_polling = use_polling
+        self.watcher = None
+
+    def run(self, stop_event: Optional[threading.Event] = None) -> None:
+        """
+        stow and then keep watching until stop_event is set, errors from the
+        initial stow are raised, later ones are reported and watching goes on
+        """
+        self.watcher = create_watcher(self.sources, self.use_polling)
+        try:
+            self.update(is_incremental=False)
+            is_failing = False
+            while stop_event is None or not stop_event.is_set():
+                changes = self.watcher.wait(self.interval)
+                if changes:
+                    changes |= self._wait_for_quiet(stop_event)
+                elif not is_failing or not self._can_update():
+                    # a conflict in dest is fixed without any change to the
+                    # sources, so a failed update is retried once it would work
+                    continue
+                # changed ignore patterns can affect any part of the sources
+                is_incremental = not any(path.name == ignore.IGNORE_FILE for path in changes)
+                try:
+                    self.update(is_incremental, changes=changes if is_incremental and not is_failing else None)
+                    is_failing = False
+                except DployError:
+                    is_failing = True  # it was printed unless silent
+        finally:
+            self.watcher.close()
+
+    def get_changed_sources(self, changes: Iterable[Path]) -> List[Path]:
+        """
+        get the sources that contain any of the changed paths, in the order
+        they were given
+        """
+        sources = set(self.sources)
+        changed_sources = set()
+        for path in changes:
+            for directory in (path, *path.parents):
+                if directory in sources:
+                    changed_sources.add(directory)
+                    break
+        return [source for source in self.sources if source in changed_sources]
+
+    def _wait_for_quiet(self, stop_event: Optional[threading.Event]) -> Set[Path]:
+        changes: Set[Path] = set()
+        while stop_event is None or not stop_event.is_set():
+            more_changes = self.watcher.wait(self.debounce)
+            if not more_changes:
+                break
+            changes |= more_changes
+        return changes
+
+    def _can_update(self) -> bool:
+        try:
+            self.update(is_silent=True, is_dry_run=True)
+        except DployError:
+            return False
+        return True
+
+    def update(
+        self,
+        is_incremental: bool = True,
+        is_silent: Optional[bool] = None,
+        is_dry_run: bool = False,
+        changes: Optional[Set[Path]] = None,
+    ) -> None:
+        """
+        stow the sources, only looking at what changed if is_incremental and
+        only the sources with changes in them if changes are given
+        """
+        sources = self.sources if changes is None else self.get_changed_sources(changes)
+        if not sources:
+            return
+        stowcmd.Stow(
+            sources,
+            self.dest,
+            self.is_silent if is_silent is None else is_silent,
+            is_dry_run,
+            self.ignore_patterns,
+            jobs=self.jobs,
+            use_manifest=True,
+            incremental=is_incremental,
+        )
@@ -81,6 +81,15 @@ def test(ctx: Context):
     ctx.run(cmd, **RUN_ARGS)
 
 
+@task
+def benchmark(ctx: Context, baseline=None):
+    """Run the benchmark suite, flagging regressions against a baseline of saved results"""
+    cmd = "python -m benchmarks.bench_dploy --output benchmark.json"
+    if baseline:
+        cmd += " --baseline {baseline}".format(baseline=baseline)
+    ctx.run(cmd, **RUN_ARGS)
+
+
 @task(clean)
 def build(ctx: Context):
     """Task to build an executable using pyinstaller"""
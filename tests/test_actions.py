@@ -0,0 +1,115 @@
+"""
+Tests for the actions collection
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import pathlib
+
+import pytest
+
+from dploy import actions
+
+SUBCMD = "stow"
+
+
+def test_actions_with_duplicate_links():
+    plan = actions.Actions(is_silent=True, is_dry_run=True)
+    dest = pathlib.Path("dest")
+    link_a = actions.SymbolicLink(SUBCMD, pathlib.Path("source_a", "aaa"), dest / "aaa")
+    link_b = actions.SymbolicLink(SUBCMD, pathlib.Path("source_b", "bbb"), dest / "bbb")
+    link_c = actions.SymbolicLink(SUBCMD, pathlib.Path("source_c", "bbb"), dest / "bbb")
+    link_d = actions.SymbolicLink(SUBCMD, pathlib.Path("source_d", "aaa"), dest / "aaa")
+    for action in (link_a, link_b, link_c, link_d):
+        plan.add(action)
+
+    assert plan.get_duplicates() == [[link_a, link_d], [link_b, link_c]]
+
+    plan.remove(link_d)
+    assert plan.get_duplicates() == [[link_b, link_c]]
+    assert plan.actions == [link_a, link_b, link_c]
+
+    plan.remove(link_c)
+    assert plan.get_duplicates() == []
+    assert len(plan) == 2
+
+
+def test_actions_with_unlink_targets():
+    plan = actions.Actions(is_silent=True, is_dry_run=True)
+    target_a = pathlib.Path("dest", "bbb", "aaa")
+    target_b = pathlib.Path("dest", "aaa", "aaa")
+    unlink_a = actions.UnLink("unstow", target_a)
+    unlink_b = actions.UnLink("unstow", target_b)
+    plan.add(unlink_a)
+    plan.add(actions.MakeDirectory("unstow", pathlib.Path("dest", "ccc")))
+    plan.add(unlink_b)
+
+    assert plan.get_unlink_targets() == [target_a, target_b]
+    assert plan.get_unlink_target_parents() == [target_b.parent, target_a.parent]
+    assert plan.is_unlink_target(target_a)
+    assert plan.get_actions_of_type(actions.UnLink) == [unlink_a, unlink_b]
+
+    plan.remove(unlink_a)
+    assert not plan.is_unlink_target(target_a)
+    assert plan.get_unlink_target_parents() == [target_b.parent]
+
+
+def test_get_dependencies_with_unfolding_and_folding():
+    dest = pathlib.Path("dest")
+    plan = [
+        actions.UnLink(SUBCMD, dest / "aaa"),
+        actions.MakeDirectory(SUBCMD, dest / "aaa"),
+        actions.SymbolicLink(SUBCMD, pathlib.Path("source_a", "aaa", "aaa"), dest / "aaa" / "aaa"),
+        actions.SymbolicLink(SUBCMD, pathlib.Path("source_b", "aaa", "bbb"), dest / "aaa" / "bbb"),
+        actions.AlreadyLinked(SUBCMD, pathlib.Path("source_a", "bbb"), dest / "bbb"),
+        actions.SymbolicLink(SUBCMD, pathlib.Path("source_a", "ccc"), dest / "ccc"),
+        actions.UnLink("unstow", dest / "aaa" / "aaa"),
+        actions.UnLink("unstow", dest / "aaa" / "bbb"),
+        actions.RemoveDirectory("unstow", dest / "aaa"),
+    ]
+    assert actions.get_dependencies(plan) == [[], [0], [1], [1], [], [], [1, 2], [1, 3], [1, 2, 3, 6, 7]]
+
+    plan_actions = actions.Actions(is_silent=True, is_dry_run=True)
+    for action in plan:
+        plan_actions.add(action)
+    # pylint: disable=protected-access
+    assert list(plan_actions._get_dependencies(plan_actions._get_records())) == actions.get_dependencies(plan)
+
+
+def test_actions_execute_in_parallel(tmp_path, capsys):
+    plan = actions.Actions(is_silent=False, is_dry_run=False, jobs=4)
+    source = tmp_path / "source"
+    dest = tmp_path / "dest"
+    source.mkdir()
+    dest.mkdir()
+    for directory in ("aaa", "bbb"):
+        plan.add(actions.MakeDirectory(SUBCMD, dest / directory))
+        for index in range(50):
+            name = "file_{}".format(index)
+            plan.add(actions.SymbolicLink(SUBCMD, source / name, dest / directory / name))
+    plan.execute()
+
+    assert capsys.readouterr().out.splitlines() == [repr(action) for action in plan]
+    assert len(list((dest / "aaa").iterdir())) == 50
+    assert len(list((dest / "bbb").iterdir())) == 50
+
+
+def test_actions_execute_in_parallel_with_failures(tmp_path):
+    plan = actions.Actions(is_silent=True, is_dry_run=False, jobs=4)
+    plan.add(actions.MakeDirectory(SUBCMD, tmp_path / "aaa"))
+    plan.add(actions.MakeDirectory(SUBCMD, tmp_path / "aaa" / "bbb"))
+    plan.add(actions.MakeDirectory(SUBCMD, tmp_path / "ccc" / "ddd"))
+    plan.add(actions.MakeDirectory(SUBCMD, tmp_path / "eee" / "fff"))
+    with pytest.raises(FileNotFoundError) as exception_info:
+        plan.execute()
+    assert exception_info.value.filename == str(tmp_path / "ccc" / "ddd")
+    assert (tmp_path / "aaa" / "bbb").is_dir()
+
+
+def test_link_text_is_computed_when_needed(tmp_path):
+    link = actions.SymbolicLink(SUBCMD, tmp_path / "source" / "aaa", tmp_path / "dest" / "aaa")
+    link_text = pathlib.Path("..", "source", "aaa")
+    assert link._source_relative is None  # pylint: disable=protected-access
+    assert repr(link) == "dploy stow: link {} => {}".format(tmp_path / "dest" / "aaa", link_text)
+    assert link.source_relative == link_text
@@ -6,8 +6,11 @@
 # pylint: disable=invalid-name
 
 import os
+import pathlib
 
 import dploy
+from dploy import stowcmd
+from tests import utils
 
 SUBCMD = "clean"
 
@@ -40,3 +43,69 @@ def test_clean_after_stow_not_removing_invalid_link_from_other_source(source_a,
     assert os.readlink(dest_path) == broken
     dploy.clean([source_a], dest)
     assert os.readlink(dest_path) == broken
+
+
+def test_clean_only_descends_into_directories_matching_the_source(tmp_path, source_a, dest):
+    dploy.stow([source_a], dest)
+    cache_link = os.path.join(dest, "cache", "deep", "bbb")
+    os.makedirs(os.path.dirname(cache_link))
+    os.symlink(os.path.join(source_a, "non_existant"), cache_link)
+    stray_link = os.path.join(dest, "stray", "bbb")
+    os.makedirs(os.path.dirname(stray_link))
+    os.symlink(os.path.join(source_a, "non_existant"), stray_link)
+    nested_link = os.path.join(dest, "aaa", "ccc", "ddd")
+    os.symlink(os.path.join(source_a, "non_existant"), os.path.join(source_a, "aaa", "ccc", "ddd"))
+    os.unlink(os.path.join(dest, "aaa"))
+    os.makedirs(os.path.dirname(nested_link))
+    os.symlink(os.path.join(source_a, "non_existant"), nested_link)
+
+    with utils.ChangeDirectory(tmp_path):
+        dploy.clean([source_a], dest)
+    assert os.path.islink(cache_link)
+    assert not os.path.lexists(stray_link)
+    assert not os.path.lexists(nested_link)
+
+
+def test_clean_with_max_depth_and_prune_patterns(tmp_path, source_a, dest):
+    link = os.path.join(dest, "aaa", "bbb")
+    os.makedirs(os.path.dirname(link))
+    os.symlink(os.path.join(source_a, "aaa", "non_existant"), link)
+    with utils.ChangeDirectory(tmp_path):
+        dploy.clean([source_a], dest, max_depth=0)
+        assert os.path.islink(link)
+        dploy.clean([source_a], dest, prune_patterns=["aa*"])
+        assert os.path.islink(link)
+        dploy.clean([source_a], dest, max_depth=1, prune_patterns=["node_modules"])
+        assert not os.path.lexists(link)
+
+
+def test_clean_source_roots_match_the_parents_of_link_targets(tmp_path):
+    roots = [pathlib.Path(tmp_path, "source_a"), pathlib.Path("/")]
+    source_roots = stowcmd.SourceRoots(roots[:1])
+    link_directory = str(tmp_path / "dest")
+    link_texts = [
+        os.path.join("..", "source_a", "aaa"),
+        str(tmp_path / "source_a" / "aaa"),
+        str(tmp_path / "source_a" / "aaa") + "/",
+        str(tmp_path / "source_a" / "." / "aaa"),
+        str(tmp_path) + "//source_a/aaa",
+        str(tmp_path / "source_a"),
+        str(tmp_path / "source_ab" / "aaa"),
+        str(tmp_path / "source_a" / ".." / "source_b"),
+        "aaa",
+    ]
+    for link_text in link_texts:
+        link_target = pathlib.Path(os.path.join(link_directory, link_text))
+        expected = roots[0] in link_target.parents
+        assert source_roots.contains(link_directory, link_text) == expected, link_text
+    assert stowcmd.SourceRoots(roots[1:]).contains(link_directory, "aaa")
+
+
+def test_clean_with_jobs(tmp_path, source_a, dest):
+    links = [os.path.join(dest, "link_{}".format(index)) for index in range(100)]
+    for index, link in enumerate(links):
+        name = "aaa" if index % 2 else "non_existant_{}".format(index)
+        os.symlink(os.path.join(source_a, name), link)
+    with utils.ChangeDirectory(tmp_path):
+        dploy.clean([source_a], dest, jobs=4)
+    assert [os.path.lexists(link) for link in links] == [index % 2 == 1 for index in range(100)]
@@ -79,3 +79,27 @@ def test_cli_with_version_option(capsys):
         dploy.cli.run(args)
         out, _ = capsys.readouterr()
         assert re.match(r"dploy \d+.\d+\.\d+(-\w+)?\n", out) is not None
+
+
+def test_cli_with_jobs_option_with_stow_with_basic_scenario(source_a, source_b, dest):
+    args = ["--silent", "--jobs", "4", "stow", source_a, source_b, dest]
+    dploy.cli.run(args)
+    assert os.path.isdir(os.path.join(dest, "aaa"))
+    assert os.readlink(os.path.join(dest, "aaa", "ccc")) == os.path.join("..", "..", "source_a", "aaa", "ccc")
+
+
+def test_cli_with_invalid_jobs_option(source_a, dest, capsys):
+    args = ["--jobs", "0", "stow", source_a, dest]
+    with pytest.raises(SystemExit):
+        dploy.cli.run(args)
+    _, err = capsys.readouterr()
+    assert "invalid positive int value" in err
+
+
+def test_cli_with_clean_max_depth_and_prune_options(source_a, dest, capsys):
+    dploy.cli.run(["clean", "--max-depth", "0", "--prune", "node_modules", source_a, dest])
+    args = ["clean", "--max-depth", "-1", source_a, dest]
+    with pytest.raises(SystemExit):
+        dploy.cli.run(args)
+    _, err = capsys.readouterr()
+    assert "invalid non-negative int value" in err
@@ -0,0 +1,93 @@
+"""
+Tests for the directory descriptors used to execute actions
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import os
+import pathlib
+
+import pytest
+
+from dploy import actions, dirfd
+
+pytestmark = pytest.mark.skipif(not dirfd.is_supported(), reason="dir_fd is not supported on this platform")
+
+
+def test_directory_descriptors_are_reused(tmp_path):
+    directories = dirfd.DirectoryDescriptors()
+    for name in ("aaa", "bbb", "ccc"):
+        directories.call(os.mkdir, tmp_path / name)
+    assert len(directories) == 1
+    directories.call(os.symlink, tmp_path / "aaa" / "link", os.path.join("..", "bbb"))
+    assert os.readlink(tmp_path / "aaa" / "link") == os.path.join("..", "bbb")
+    assert len(directories) == 2
+    directories.close()
+    assert len(directories) == 0
+
+
+def test_directory_descriptors_with_removed_directory(tmp_path):
+    directories = dirfd.DirectoryDescriptors()
+    directories.call(os.mkdir, tmp_path / "aaa")
+    directories.call(os.mkdir, tmp_path / "aaa" / "bbb")
+    directories.call(os.mkdir, tmp_path / "aaa" / "bbb" / "ccc")
+    directories.call(os.rmdir, tmp_path / "aaa" / "bbb" / "ccc")
+    directories.forget(tmp_path / "aaa", recursive=True)
+    assert len(directories) == 1
+    directories.call(os.rmdir, tmp_path / "aaa" / "bbb")
+    directories.call(os.rmdir, tmp_path / "aaa")
+    os.makedirs(tmp_path / "aaa" / "bbb")
+    directories.call(os.mkdir, tmp_path / "aaa" / "bbb" / "ddd")
+    assert (tmp_path / "aaa" / "bbb" / "ddd").is_dir()
+
+
+def test_directory_descriptors_with_max_open(tmp_path):
+    directories = dirfd.DirectoryDescriptors(max_open=2)
+    for name in ("aaa", "bbb", "ccc"):
+        os.mkdir(tmp_path / name)
+        directories.call(os.mkdir, tmp_path / name / "ddd")
+    assert len(directories) == 2
+    directories.close()
+
+
+def test_directory_descriptors_error_names_full_path(tmp_path):
+    directories = dirfd.DirectoryDescriptors()
+    path = pathlib.Path(tmp_path, "aaa")
+    with pytest.raises(FileNotFoundError) as exception_info:
+        directories.call(os.rmdir, path)
+    assert exception_info.value.filename == str(path)
+    with pytest.raises(FileNotFoundError) as exception_info:
+        directories.call(os.mkdir, path / "bbb")
+    assert exception_info.value.filename == str(path / "bbb")
+
+
+def test_actions_unfold_with_directory_descriptors(tmp_path):
+    source = tmp_path / "source" / "aaa"
+    os.makedirs(source)
+    dest = tmp_path / "dest"
+    os.makedirs(dest)
+    os.symlink(source, dest / "aaa")
+    directories = dirfd.DirectoryDescriptors()
+    actions.UnLink("stow", dest / "aaa").execute(directories)
+    actions.MakeDirectory("stow", dest / "aaa").execute(directories)
+    actions.SymbolicLink("stow", source / "bbb", dest / "aaa" / "bbb").execute(directories)
+    actions.UnLink("unstow", dest / "aaa" / "bbb").execute(directories)
+    actions.RemoveDirectory("unstow", dest / "aaa").execute(directories)
+    directories.close()
+    assert os.listdir(dest) == []
+
+
+def test_directory_descriptors_with_unreadable_directory(tmp_path, monkeypatch):
+    def open_directory(directory):
+        raise PermissionError(13, "Permission denied", directory)
+
+    monkeypatch.setattr(dirfd, "_open_directory", open_directory)
+    directories = dirfd.DirectoryDescriptors()
+    directories.call(os.mkdir, tmp_path / "aaa")
+    directories.call(os.symlink, tmp_path / "bbb", "aaa")
+    assert os.readlink(tmp_path / "bbb") == "aaa"
+    directories.call(os.unlink, tmp_path / "bbb")
+    directories.call(os.rmdir, tmp_path / "aaa")
+    assert os.listdir(tmp_path) == []
+    directories.close()
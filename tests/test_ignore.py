@@ -8,6 +8,8 @@
 import os
 
 import dploy
+from dploy import ignore
+from tests import utils
 
 SUBCMD = "stow"
 
@@ -38,3 +40,66 @@ def test_ignore_file_by_ignoring_everything__(source_a, source_c, file_dploystow
         file.write("\n".join(ignore_patterns))
     dploy.stow([source_a, source_c], dest)
     assert not os.path.exists(os.path.join(dest, "aaa"))
+
+
+def test_ignore_file_with_blank_lines(source_a, source_c, file_dploystowignore, dest):
+    with open(file_dploystowignore, "w", encoding="utf8") as file:
+        file.write("\n\n*/aaa\n\n")
+    dploy.stow([source_a, source_c], dest)
+    assert not os.path.exists(os.path.join(dest, "aaa"))
+
+
+def test_ignore_by_ignoring_a_directory_containing_a_path(source_a, dest):
+    dploy.stow([source_a], dest, ignore_patterns=["aaa/ccc"])
+    assert not os.path.exists(os.path.join(dest, "aaa"))
+
+
+def test_ignore_by_ignoring_only_directories(source_a, source_only_files, dest):
+    dploy.stow([source_a], dest, ignore_patterns=["aaa/"])
+    assert not os.path.exists(os.path.join(dest, "aaa"))
+    dploy.stow([source_only_files], dest, ignore_patterns=["aaa/"])
+    assert os.path.islink(os.path.join(dest, "aaa"))
+
+
+def test_ignore_by_ignoring_with_recursive_wildcard(source_a, dest):
+    dploy.stow([source_a], dest, ignore_patterns=["**/bbb"])
+    assert not os.path.exists(os.path.join(dest, "aaa"))
+
+
+def test_ignore_file_inside_source(source_a, source_b, dest):
+    with open(os.path.join(source_a, "aaa", ".dploystowignore"), "w", encoding="utf8") as file:
+        file.write("bbb\n")
+    dploy.stow([source_a, source_b], dest)
+    assert os.path.islink(os.path.join(dest, "aaa", "aaa"))
+    assert not os.path.exists(os.path.join(dest, "aaa", "bbb"))
+    assert not os.path.exists(os.path.join(dest, "aaa", ".dploystowignore"))
+    assert os.path.islink(os.path.join(dest, "aaa", "ddd"))
+
+
+def test_ignore_file_cascades_into_subdirectories(tmp_path, dest):
+    source_x = str(tmp_path / "source_x")
+    source_y = str(tmp_path / "source_y")
+    utils.create_tree(
+        [
+            {source_x: [".dploystowignore", {"aaa": [{"ccc": ["aaa", "bbb"]}]}]},
+            {source_y: [{"aaa": [{"ccc": ["ddd"]}]}]},
+        ]
+    )
+    with open(os.path.join(source_x, ".dploystowignore"), "w", encoding="utf8") as file:
+        file.write("bbb\n")
+    dploy.stow([source_x, source_y], dest)
+    assert os.path.islink(os.path.join(dest, "aaa", "ccc", "aaa"))
+    assert not os.path.exists(os.path.join(dest, "aaa", "ccc", "bbb"))
+    assert os.path.islink(os.path.join(dest, "aaa", "ccc", "ddd"))
+
+
+def test_ignore_file_is_read_again_after_modification(file_dploystowignore):
+    with open(file_dploystowignore, "w", encoding="utf8") as file:
+        file.write("aaa\n")
+    assert ignore.read_ignore_file(file_dploystowignore) == ("aaa",)
+    assert ignore.read_ignore_file(file_dploystowignore) is ignore.read_ignore_file(file_dploystowignore)
+
+    with open(file_dploystowignore, "w", encoding="utf8") as file:
+        file.write("aaa\nbbb\n")
+    os.utime(file_dploystowignore, ns=(0, 0))
+    assert ignore.read_ignore_file(file_dploystowignore) == ("aaa", "bbb")
@@ -0,0 +1,153 @@
+"""
+Tests for the journal of executions and the resume sub command
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import os
+
+import pytest
+
+import dploy
+import dploy.cli
+from dploy import actions, error, journal, manifest
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt_after(monkeypatch, action_type, count):
+    execute = action_type.execute
+    calls = []
+
+    def interrupting_execute(self, directories=None):
+        if len(calls) == count:
+            raise Interrupted()
+        calls.append(self)
+        execute(self, directories)
+
+    monkeypatch.setattr(action_type, "execute", interrupting_execute)
+
+
+def interrupted_stow(monkeypatch, sources, dest, **kwargs):
+    with monkeypatch.context() as patch:
+        interrupt_after(patch, actions.SymbolicLink, 3)
+        with pytest.raises(Interrupted):
+            dploy.stow(sources, dest, use_journal=True, **kwargs)
+    assert journal.has_journal(dest)
+    assert sorted(os.listdir(os.path.join(dest, "aaa"))) == ["aaa", "bbb"]
+
+
+def test_journal_is_removed_after_execution(source_a, dest):
+    dploy.stow([source_a], dest, use_journal=True)
+    assert os.listdir(dest) == ["aaa"]
+
+
+def test_resume_with_interrupted_stow(source_a, source_b, dest, monkeypatch, capsys):
+    interrupted_stow(monkeypatch, [source_a, source_b], dest)
+    capsys.readouterr()
+
+    dploy.resume(dest, is_silent=False)
+    assert not journal.has_journal(dest)
+    assert sorted(os.listdir(os.path.join(dest, "aaa"))) == ["aaa", "bbb", "ccc", "ddd", "eee", "fff"]
+    out, _ = capsys.readouterr()
+    assert out.count("dploy stow: link") == 4
+
+
+def test_resume_with_interrupted_stow_and_jobs(source_a, source_b, dest, monkeypatch):
+    interrupted_stow(monkeypatch, [source_a, source_b], dest)
+    dploy.resume(dest, jobs=4)
+    assert sorted(os.listdir(os.path.join(dest, "aaa"))) == ["aaa", "bbb", "ccc", "ddd", "eee", "fff"]
+
+
+def test_resume_with_killed_process(source_a, source_b, dest, monkeypatch):
+    interrupted_stow(monkeypatch, [source_a, source_b], dest)
+    # the next link was made but the process was killed while journaling it
+    os.symlink(os.path.join("..", "..", "source_a", "aaa", "ccc"), os.path.join(dest, "aaa", "ccc"))
+    with open(os.path.join(dest, journal.JOURNAL_FILE), "a", encoding="utf8") as journal_file:
+        journal_file.write("+")
+
+    dploy.resume(dest)
+    assert sorted(os.listdir(os.path.join(dest, "aaa"))) == ["aaa", "bbb", "ccc", "ddd", "eee", "fff"]
+    assert not journal.has_journal(dest)
+
+
+def test_resume_with_manifest(source_a, source_b, dest, monkeypatch):
+    interrupted_stow(monkeypatch, [source_a, source_b], dest, use_manifest=True)
+    dploy.resume(dest)
+    links = [entry.link.name for entry in manifest.Manifest.load(dest).get_entries()]
+    assert links == ["aaa", "bbb", "ccc", "ddd", "eee", "fff"]
+
+
+def test_rollback_with_interrupted_stow(source_a, source_b, dest, monkeypatch):
+    interrupted_stow(monkeypatch, [source_a, source_b], dest)
+    dploy.resume(dest, rollback=True)
+    assert os.listdir(dest) == []
+
+
+def test_rollback_with_interrupted_unstow(source_a, source_b, dest, monkeypatch):
+    dploy.stow([source_a, source_b], dest)
+    texts = {name: os.readlink(os.path.join(dest, "aaa", name)) for name in os.listdir(os.path.join(dest, "aaa"))}
+    with monkeypatch.context() as patch:
+        interrupt_after(patch, actions.UnLink, 4)
+        with pytest.raises(Interrupted):
+            dploy.unstow([source_a, source_b], dest, use_journal=True)
+    assert len(os.listdir(os.path.join(dest, "aaa"))) == 2
+
+    dploy.resume(dest, rollback=True)
+    assert {name: os.readlink(os.path.join(dest, "aaa", name)) for name in os.listdir(os.path.join(dest, "aaa"))} == (
+        texts
+    )
+
+
+def test_rollback_with_interrupted_unstow_of_absolute_links(source_a, source_b, dest, monkeypatch):
+    dploy.stow([source_a, source_b], dest)
+    directory = os.path.join(dest, "aaa")
+    for name in os.listdir(directory):
+        link = os.path.join(directory, name)
+        target = os.path.abspath(os.path.join(directory, os.readlink(link)))
+        os.unlink(link)
+        os.symlink(target, link)
+    texts = {name: os.readlink(os.path.join(directory, name)) for name in os.listdir(directory)}
+    with monkeypatch.context() as patch:
+        interrupt_after(patch, actions.UnLink, 4)
+        with pytest.raises(Interrupted):
+            dploy.unstow([source_a, source_b], dest, use_journal=True)
+
+    dploy.resume(dest, rollback=True)
+    assert {name: os.readlink(os.path.join(directory, name)) for name in os.listdir(directory)} == texts
+
+
+def test_journal_is_synced_in_batches(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(journal.os, "fsync", synced.append)
+    test_journal = journal.Journal(tmp_path, "stow", [])
+    plan = [actions.MakeDirectory("stow", tmp_path / str(index)) for index in range(journal.SYNC_INTERVAL + 1)]
+    test_journal.begin(plan)
+    assert len(synced) == 1
+    for index, action in enumerate(plan):
+        test_journal.record(action, index)
+    assert len(synced) == 2
+    test_journal.close(is_complete=False)
+    assert len(synced) == 3
+
+
+def test_stow_with_unfinished_journal(source_a, source_b, dest, monkeypatch):
+    interrupted_stow(monkeypatch, [source_a, source_b], dest)
+    with pytest.raises(error.UnfinishedJournal):
+        dploy.unstow([source_a], dest, use_journal=True)
+
+
+def test_resume_without_journal(dest):
+    with pytest.raises(error.NoJournal):
+        dploy.resume(dest)
+
+
+def test_cli_resume(source_a, source_b, dest, monkeypatch):
+    interrupted_stow(monkeypatch, [source_a, source_b], dest)
+    dploy.cli.run(["resume", dest])
+    assert len(os.listdir(os.path.join(dest, "aaa"))) == 6
+    with pytest.raises(SystemExit):
+        dploy.cli.run(["resume", "--rollback", dest])
@@ -0,0 +1,163 @@
+"""
+Tests for the manifest of the links created in a destination
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import os
+import shutil
+
+import pytest
+
+import dploy
+import dploy.cli
+from dploy import ignore, manifest, statcache, stowcmd
+from tests import utils
+
+
+def get_links(dest):
+    return {entry.link.relative_to(dest).as_posix(): entry for entry in manifest.Manifest.load(dest).get_entries()}
+
+
+def test_manifest_with_stow_and_unstow(source_a, dest):
+    dploy.stow([source_a], dest, use_manifest=True)
+    links = get_links(dest)
+    assert list(links) == ["aaa"]
+    assert links["aaa"].target == os.path.join("..", "source_a", "aaa")
+    assert links["aaa"].package == os.path.abspath(source_a)
+    link_stat = os.lstat(os.path.join(dest, "aaa"))
+    assert links["aaa"].inode == (link_stat.st_dev, link_stat.st_ino)
+
+    dploy.unstow([source_a], dest, use_manifest=True)
+    assert os.listdir(dest) == []
+
+
+def test_manifest_with_unfolding_and_folding(source_a, source_b, dest):
+    dploy.stow([source_a], dest, use_manifest=True)
+    dploy.stow([source_b], dest, jobs=4)
+    links = get_links(dest)
+    assert sorted(links) == ["aaa/aaa", "aaa/bbb", "aaa/ccc", "aaa/ddd", "aaa/eee", "aaa/fff"]
+    assert links["aaa/ccc"].package == os.path.abspath(source_a)
+    assert links["aaa/ddd"].package == os.path.abspath(source_b)
+
+    dploy.unstow([source_b], dest, use_manifest=True)
+    assert os.path.islink(os.path.join(dest, "aaa"))
+    assert list(get_links(dest)) == ["aaa"]
+
+
+def test_manifest_unstow_without_walking_the_source(source_a, dest):
+    dploy.stow([source_a], dest, use_manifest=True)
+    shutil.rmtree(os.path.join(source_a, "aaa"))
+    dploy.unstow([source_a], dest, use_manifest=True)
+    assert not os.path.lexists(os.path.join(dest, "aaa"))
+
+
+def test_manifest_unstow_with_a_replaced_link(source_a, dest):
+    dploy.stow([source_a], dest, use_manifest=True)
+    os.unlink(os.path.join(dest, "aaa"))
+    os.mkdir(os.path.join(dest, "aaa"))
+    dploy.unstow([source_a], dest, use_manifest=True)
+    assert os.path.isdir(os.path.join(dest, "aaa"))
+    assert not os.path.exists(os.path.join(dest, manifest.MANIFEST_FILE))
+
+
+def test_manifest_unstow_with_a_removed_link(source_a, source_b, dest):
+    dploy.stow([source_a, source_b], dest, use_manifest=True)
+    os.unlink(os.path.join(dest, "aaa", "aaa"))
+    dploy.unstow([source_a, source_b], dest, use_manifest=True)
+    assert not os.path.exists(os.path.join(dest, "aaa"))
+    assert not os.path.exists(os.path.join(dest, manifest.MANIFEST_FILE))
+
+
+def test_manifest_clean_with_broken_link(source_a, source_b, dest):
+    dploy.stow([source_a, source_b], dest, use_manifest=True)
+    os.unlink(os.path.join(source_a, "aaa", "aaa"))
+    dploy.clean([source_a, source_b], dest, use_manifest=True)
+    assert not os.path.lexists(os.path.join(dest, "aaa", "aaa"))
+    assert os.path.islink(os.path.join(dest, "aaa", "bbb"))
+    assert "aaa/aaa" not in get_links(dest)
+
+
+def test_manifest_status(source_a, source_b, dest, capsys):
+    dploy.stow([source_a, source_b], dest, use_manifest=True)
+    os.unlink(os.path.join(source_a, "aaa", "aaa"))
+    states = {entry.link.name: state for entry, state in dploy.status(dest, [source_a], verify=True)}
+    assert states == {"aaa": manifest.BROKEN, "bbb": manifest.LINKED, "ccc": manifest.LINKED}
+
+    dploy.cli.run(["status", dest])
+    output, _ = capsys.readouterr()
+    assert len(output.splitlines()) == 6
+    assert output.startswith("dploy status: linked {}".format(os.path.join(dest, "aaa", "aaa")))
+
+
+def stow_incrementally(source, dest):
+    cache = statcache.StatCache()
+    stowcmd.Stow([source], dest, stat_cache=cache, incremental=True)
+    return cache.syscalls
+
+
+def test_manifest_incremental_stow(source_a, source_b, dest):
+    dploy.stow([source_a, source_b], dest, use_manifest=True)
+    syscalls = stow_incrementally(source_a, dest)
+    assert syscalls <= 6  # the package root, its directories and the manifest
+
+    utils.create_file(os.path.join(source_a, "aaa", "ggg"))
+    utils.create_file(os.path.join(source_a, "aaa", "ccc", "ccc"))
+    os.unlink(os.path.join(source_a, "aaa", "bbb"))
+    stow_incrementally(source_a, dest)
+    assert os.readlink(os.path.join(dest, "aaa", "ggg")) == os.path.join("..", "..", "source_a", "aaa", "ggg")
+    assert os.path.islink(os.path.join(dest, "aaa", "ccc"))
+    assert not os.path.lexists(os.path.join(dest, "aaa", "bbb"))
+    assert "aaa/bbb" not in get_links(dest)
+
+    assert stow_incrementally(source_a, dest) <= 6
+
+
+def test_manifest_incremental_stow_with_changed_ignore_patterns(source_a, dest):
+    utils.create_file(os.path.join(source_a, "zzz"))
+    stowcmd.Stow([source_a], dest, ignore_patterns=["aaa"], incremental=True)
+    assert not os.path.lexists(os.path.join(dest, "aaa"))
+    stowcmd.Stow([source_a], dest, incremental=True)
+    assert os.path.islink(os.path.join(dest, "aaa"))
+
+
+def test_manifest_incremental_stow_with_changed_ignore_file(source_a, dest):
+    utils.create_file(os.path.join(source_a, "zzz"))
+    ignore_file = os.path.join(source_a, ignore.IGNORE_FILE)
+    with open(ignore_file, "w", encoding="utf8") as output_file:
+        output_file.write("aaa\n")
+    stowcmd.Stow([source_a], dest, incremental=True)
+    assert not os.path.lexists(os.path.join(dest, "aaa"))
+
+    mtime_ns = os.stat(source_a).st_mtime_ns
+    with open(ignore_file, "w", encoding="utf8") as output_file:
+        output_file.write("bbb\n")
+    assert os.stat(source_a).st_mtime_ns == mtime_ns
+    stowcmd.Stow([source_a], dest, incremental=True)
+    assert os.path.islink(os.path.join(dest, "aaa"))
+
+
+def test_manifest_incremental_stow_with_added_ignore_file(source_a, dest):
+    os.mkdir(os.path.join(source_a, "ddd"))
+    utils.create_file(os.path.join(source_a, "ddd", "fff"))
+    os.mkdir(os.path.join(dest, "ddd"))
+    stowcmd.Stow([source_a], dest, incremental=True)
+    utils.create_file(os.path.join(source_a, "ddd", ignore.IGNORE_FILE))
+    utils.create_file(os.path.join(source_a, "eee"))
+    stowcmd.Stow([source_a], dest, incremental=True)
+    assert os.path.islink(os.path.join(dest, "eee"))
+    assert "ddd" in manifest.Manifest.load(dest).get_ignore_patterns(source_a)
+
+
+def test_manifest_incremental_stow_without_listings(source_a, dest):
+    dploy.stow([source_a], dest, incremental=True)
+    assert os.path.islink(os.path.join(dest, "aaa"))
+    assert os.path.abspath(source_a) in manifest.Manifest.load(dest).listings
+
+
+def test_cli_unstow_without_verify(source_a, dest):
+    dploy.cli.run(["--manifest", "stow", source_a, dest])
+    with pytest.raises(SystemExit):
+        dploy.cli.run(["--manifest", "unstow", "--verify", source_a, dest])
+    assert os.path.islink(os.path.join(dest, "aaa"))
@@ -0,0 +1,128 @@
+"""
+Tests for the output of the actions
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import io
+import json
+import os
+import pathlib
+
+import pytest
+
+import dploy
+import dploy.cli
+from dploy import actions, error, output
+
+
+def test_output_writes_in_batches(tmp_path):
+    stream = io.StringIO()
+    action_output = output.Output(stream, batch_size=2)
+    for name in ("aaa", "bbb", "ccc"):
+        action_output.add(actions.MakeDirectory("stow", tmp_path / name))
+        assert stream.getvalue().count("\n") == (2 if name != "aaa" else 0)
+    action_output.close()
+    assert stream.getvalue().splitlines() == [
+        "dploy stow: make directory {}".format(tmp_path / name) for name in ("aaa", "bbb", "ccc")
+    ]
+
+
+def test_summary_output(tmp_path):
+    stream = io.StringIO()
+    action_output = output.SummaryOutput(stream)
+    for index in range(1200):
+        name = str(index)
+        action_output.add(actions.SymbolicLink("stow", tmp_path / "source" / name, tmp_path / "dest" / name))
+    action_output.add(actions.AlreadyLinked("stow", tmp_path / "source" / "aaa", tmp_path / "dest" / "aaa"))
+    action_output.add(actions.MakeDirectory("stow", tmp_path / "dest" / "aaa"))
+    assert stream.getvalue() == ""
+    action_output.close()
+    assert stream.getvalue().splitlines() == [
+        "dploy stow: linked 1,200 entries under {}".format(tmp_path / "dest"),
+        "dploy stow: already linked 1 entry under {}".format(tmp_path / "dest"),
+        "dploy stow: made 1 directory under {}".format(tmp_path / "dest"),
+    ]
+    action_output.close()
+    assert len(stream.getvalue().splitlines()) == 3
+
+
+def test_unlink_message_does_not_read_the_link(tmp_path):
+    unlink = actions.UnLink("unstow", tmp_path / "missing", "../source/missing")
+    assert repr(unlink) == "dploy unstow: unlink {} => ../source/missing".format(tmp_path / "missing")
+    assert repr(actions.UnLink("unstow", tmp_path / "missing")) == "dploy unstow: unlink {}".format(
+        tmp_path / "missing"
+    )
+
+
+def test_dry_run_with_unfolding(source_a, source_b, dest, capsys):
+    dploy.stow([source_a, source_b], dest, is_silent=False, is_dry_run=True)
+    out, _ = capsys.readouterr()
+    link_text = os.path.join("..", "source_a", "aaa")
+    assert "dploy stow: unlink {} => {}".format(os.path.join(dest, "aaa"), link_text) in out.splitlines()
+    assert os.listdir(dest) == []
+
+
+def test_unstow_message_with_absolute_link(source_a, dest, capsys):
+    link_text = os.path.abspath(os.path.join(source_a, "aaa"))
+    os.symlink(link_text, os.path.join(dest, "aaa"))
+    dploy.unstow([source_a], dest, is_silent=False)
+    out, _ = capsys.readouterr()
+    assert out.splitlines() == ["dploy unstow: unlink {} => {}".format(os.path.join(dest, "aaa"), link_text)]
+
+
+def test_cli_with_summary(source_a, source_b, dest, capsys):
+    dploy.cli.run(["--summary", "stow", source_a, source_b, dest])
+    out, _ = capsys.readouterr()
+    assert out.splitlines() == [
+        "dploy stow: linked 1 entry under {}".format(dest),
+        "dploy stow: unlinked 1 entry under {}".format(dest),
+        "dploy stow: made 1 directory under {}".format(dest),
+        "dploy stow: linked 6 entries under {}".format(pathlib.Path(dest) / "aaa"),
+    ]
+
+
+def read_events(out):
+    return [json.loads(line) for line in out.splitlines()]
+
+
+def test_cli_with_jsonl_output(source_a, source_b, dest, capsys):
+    dploy.cli.run(["--output=jsonl", "stow", source_a, source_b, dest])
+    out, err = capsys.readouterr()
+    assert err == ""
+    events = read_events(out)
+    phases = [(event["event"], event["phase"]) for event in events if event["event"] != "action"]
+    phase_names = ("validate", "collect", "check", "execute")
+    assert phases == [(event, phase) for phase in phase_names for event in ("phase_start", "phase_end")]
+    action_events = [event for event in events if event["event"] == "action"]
+    assert len(action_events) == 9
+    assert action_events[0] == {
+        "event": "action",
+        "subcmd": "stow",
+        "action": "link",
+        "source": os.path.join(source_a, "aaa"),
+        "dest": os.path.join(dest, "aaa"),
+    }
+    assert action_events[1]["source"] == os.path.join("..", "source_a", "aaa")
+
+
+def test_cli_with_jsonl_output_and_errors(source_a, dest, capsys):
+    with open(os.path.join(dest, "aaa"), "w", encoding="utf8"):
+        pass
+    with pytest.raises(SystemExit):
+        dploy.cli.run(["--output=jsonl", "stow", source_a, dest])
+    out, err = capsys.readouterr()
+    assert err == ""
+    errors = [event for event in read_events(out) if event["event"] == "error"]
+    conflict = error.ConflictsWithExistingFile("stow", os.path.join(source_a, "aaa"), os.path.join(dest, "aaa"))
+    assert errors == [{"event": "error", "error": "ConflictsWithExistingFile", "message": str(conflict)}]
+
+
+def test_jsonl_output_streams(tmp_path):
+    stream = io.StringIO()
+    action_output = output.JsonlOutput(stream, batch_size=2)
+    with action_output.phase("execute", "stow"):
+        action_output.add(actions.MakeDirectory("stow", tmp_path / "aaa"))
+        assert stream.getvalue().count("\n") == 2
+    assert len(stream.getvalue().splitlines()) == 3
@@ -0,0 +1,109 @@
+"""
+Tests for the plan and apply sub commands
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import json
+import os
+
+import pytest
+
+import dploy
+import dploy.cli
+from dploy import error, manifest, plancmd
+
+
+def test_plan_and_apply_with_stow(source_a, dest, tmp_path, capsys):
+    plan_file = tmp_path / "plan.json"
+    dploy.plan("stow", [source_a], dest, plan_file)
+    assert os.listdir(dest) == []
+
+    dploy.apply(plan_file, is_silent=False)
+    assert os.readlink(os.path.join(dest, "aaa")) == os.path.join("..", "source_a", "aaa")
+    out, _ = capsys.readouterr()
+    expected = "dploy stow: link {dest} => {source}\n".format(
+        dest=os.path.join(dest, "aaa"), source=os.path.join("..", "source_a", "aaa")
+    )
+    assert out == expected
+
+
+def test_plan_and_apply_with_unfolding(source_a, source_b, dest, tmp_path):
+    plan_file = tmp_path / "plan.json"
+    dploy.stow([source_a], dest)
+    plan = dploy.plan("stow", [source_b], dest, plan_file)
+    assert [type(action) for action in plan.actions][:2] == [
+        plancmd.actions.UnLink,
+        plancmd.actions.MakeDirectory,
+    ]
+
+    dploy.apply(plan_file)
+    assert os.path.isdir(os.path.join(dest, "aaa"))
+    assert sorted(os.listdir(os.path.join(dest, "aaa"))) == ["aaa", "bbb", "ccc", "ddd", "eee", "fff"]
+
+
+def test_plan_and_apply_with_unstow_and_manifest(source_a, dest, tmp_path):
+    plan_file = tmp_path / "plan.json"
+    dploy.stow([source_a], dest, use_manifest=True)
+    dploy.plan("unstow", [source_a], dest, plan_file, use_manifest=True)
+    dploy.apply(plan_file)
+    assert os.listdir(dest) == []
+
+
+def test_apply_with_changed_dest(source_a, dest, tmp_path):
+    plan_file = tmp_path / "plan.json"
+    dploy.plan("stow", [source_a], dest, plan_file)
+    os.mkdir(os.path.join(dest, "aaa"))
+    with pytest.raises(error.PlanIsOutOfDate, match="aaa"):
+        dploy.apply(plan_file)
+    assert os.listdir(os.path.join(dest, "aaa")) == []
+
+
+def test_apply_with_relinked_dest(source_a, source_c, dest, tmp_path):
+    plan_file = tmp_path / "plan.json"
+    dploy.stow([source_a], dest)
+    dploy.plan("unstow", [source_a], dest, plan_file)
+    os.unlink(os.path.join(dest, "aaa"))
+    os.symlink(os.path.join("..", "source_c", "aaa"), os.path.join(dest, "aaa"))
+    with pytest.raises(error.PlanIsOutOfDate):
+        dploy.apply(plan_file)
+    assert os.path.islink(os.path.join(dest, "aaa"))
+
+
+def test_apply_with_invalid_plan(tmp_path):
+    plan_file = tmp_path / "plan.json"
+    plan_file.write_text(json.dumps({"version": plancmd.VERSION, "actions": [["explode"]]}))
+    with pytest.raises(error.InvalidPlan):
+        dploy.apply(plan_file)
+    with pytest.raises(error.InvalidPlan):
+        dploy.apply(tmp_path / "non_existant.json")
+
+
+def test_plan_with_errors(source_a, dest, tmp_path):
+    plan_file = tmp_path / "plan.json"
+    open(os.path.join(dest, "aaa"), "w", encoding="utf8").close()
+    with pytest.raises(error.ConflictsWithExistingFile):
+        dploy.plan("stow", [source_a], dest, plan_file)
+    assert not plan_file.exists()
+
+
+def test_cli_plan_and_apply(source_a, dest, tmp_path):
+    plan_file = str(tmp_path / "plan.json")
+    dploy.cli.run(["--manifest", "plan", "stow", source_a, dest, "-o", plan_file])
+    assert os.listdir(dest) == []
+    dploy.cli.run(["apply", plan_file])
+    assert os.path.islink(os.path.join(dest, "aaa"))
+    assert manifest.Manifest.load(dest).get(os.path.join(dest, "aaa")) is not None
+
+    with pytest.raises(SystemExit):
+        dploy.cli.run(["apply", plan_file])
+
+
+def test_cli_plan_with_output_format(source_a, dest, tmp_path, capsys):
+    plan_file = str(tmp_path / "plan.json")
+    dploy.cli.run(["--output=jsonl", "plan", "stow", source_a, dest, "--plan-file", plan_file])
+    assert os.path.isfile(plan_file)
+    with pytest.raises(SystemExit):
+        dploy.cli.run(["plan", "stow", source_a, dest, "--output", plan_file])
+    capsys.readouterr()
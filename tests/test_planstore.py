@@ -0,0 +1,112 @@
+"""
+Tests for the compact store of the actions of a plan
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import pathlib
+import tracemalloc
+
+import pytest
+
+from dploy import actions, planstore
+
+SUBCMD = "stow"
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        pathlib.Path("/home/user/.config/nvim/init.lua"),
+        pathlib.Path("dest", "aaa"),
+        pathlib.Path("..", "..", "source", "aaa"),
+        pathlib.Path("/"),
+        pathlib.Path("."),
+    ],
+)
+def test_path_table_round_trip(path):
+    paths = planstore.PathTable()
+    node = paths.intern(path)
+    assert paths.get_path(node) == path
+    assert paths.intern(path) == node
+    assert paths.find(path) == node
+
+
+def test_path_table_shares_directories():
+    paths = planstore.PathTable()
+    paths.intern(pathlib.Path("dest", "aaa", "file_1"))
+    paths.intern(pathlib.Path("dest", "aaa", "file_2"))
+    paths.intern(pathlib.Path("source", "aaa", "file_1"))
+    assert len(paths) == 7
+    assert paths.find(pathlib.Path("dest", "aaa")) is not None
+    assert paths.find(pathlib.Path("dest", "bbb")) is None
+    assert paths.find(pathlib.Path("dest", "aaa", "file_1", "file_2")) is None
+
+
+def test_actions_are_equal_to_the_ones_added():
+    plan = actions.Actions(is_silent=True, is_dry_run=True)
+    added = [
+        actions.MakeDirectory(SUBCMD, pathlib.Path("dest", "aaa")),
+        actions.SymbolicLink(SUBCMD, pathlib.Path("source", "aaa", "bbb"), pathlib.Path("dest", "aaa", "bbb")),
+        actions.AlreadyLinked(SUBCMD, pathlib.Path("source", "ccc"), pathlib.Path("dest", "ccc")),
+        actions.UnLink("unstow", pathlib.Path("dest", "ddd"), pathlib.Path("..", "source", "ddd")),
+        actions.UnLink("unstow", pathlib.Path("dest", "eee")),
+        actions.RemoveDirectory("unstow", pathlib.Path("dest", "fff")),
+        actions.SymbolicLink("link", pathlib.Path("source", "ggg"), pathlib.Path("dest", "hhh")),
+    ]
+    for action in added:
+        plan.add(action)
+
+    assert plan.actions == added
+    assert [repr(action) for action in plan] == [repr(action) for action in added]
+
+    plan.remove(actions.UnLink("unstow", pathlib.Path("dest", "ddd")))
+    assert plan.actions == added[:3] + added[4:]
+    assert plan[3] == added[4]
+    assert plan[-1] == added[-1]
+    assert plan.get_counts() == {
+        "make_directory": 1,
+        "link": 2,
+        "already_linked": 1,
+        "unlink": 1,
+        "remove_directory": 1,
+    }
+    plan.remove(actions.SymbolicLink("link", pathlib.Path("source", "ggg"), pathlib.Path("dest", "hhh")))
+    assert plan.actions == added[:3] + added[4:6]
+    with pytest.raises(KeyError):
+        plan.remove(actions.UnLink(SUBCMD, pathlib.Path("dest", "eee")))
+
+
+def _get_allocated_size(make):
+    tracemalloc.start()
+    try:
+        kept = make()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return size
+
+
+def _get_links():
+    source = pathlib.Path("/home/user/dotfiles/packages/config")
+    dest = pathlib.Path("/home/user/.config")
+    for directory in range(20):
+        for index in range(100):
+            name = "file_{}".format(index)
+            directory_name = "directory_{}".format(directory)
+            yield actions.SymbolicLink(SUBCMD, source / directory_name / name, dest / directory_name / name)
+
+
+def test_actions_take_less_memory_than_action_objects():
+    def make_plan():
+        plan = actions.Actions(is_silent=True, is_dry_run=True)
+        for link in _get_links():
+            plan.add(link)
+        return plan
+
+    objects_size = _get_allocated_size(lambda: list(_get_links()))
+    plan_size = _get_allocated_size(make_plan)
+    # a plan holding the objects would take more still, for its indexes
+    assert plan_size * 5 < objects_size
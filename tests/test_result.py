@@ -0,0 +1,71 @@
+"""
+Tests for the results returned by the sub commands of the Python API
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import os
+
+import pytest
+
+import dploy
+from dploy import actions, error, timings
+
+
+def test_result_of_stow(source_a, source_b, dest, capsys):
+    result = dploy.stow([source_a, source_b], dest)
+    assert capsys.readouterr() == ("", "")
+    assert result.is_successful
+    assert result.subcmd == "stow"
+    assert not result.is_dry_run
+    assert result.counts == {"link": 7, "unlink": 1, "make_directory": 1}
+    assert len(result.actions) == 9
+    assert isinstance(result.actions[0], actions.SymbolicLink)
+    assert list(result.timings.phases) == list(timings.PHASES)
+    assert result.timings.phases["execute"].actions == 9
+    assert result.syscalls is None
+
+
+def test_result_of_dry_run(source_a, dest):
+    result = dploy.stow([source_a], dest, is_dry_run=True)
+    assert result.is_dry_run
+    assert result.counts == {"link": 1}
+    assert os.listdir(dest) == []
+
+
+def test_result_of_unstow_with_syscalls(source_a, dest):
+    dploy.stow([source_a], dest)
+    result = dploy.unstow([source_a], dest, count_syscalls=True)
+    assert result.counts == {"unlink": 1}
+    assert result.syscalls.get_totals()["unlink"].calls == 1
+    assert source_a in result.syscalls.get_totals_by_source()
+
+
+def test_result_of_clean(source_a, dest):
+    assert dploy.clean([source_a], dest).counts == {}
+
+
+def test_result_of_link(source_a, dest):
+    result = dploy.link(os.path.join(source_a, "aaa"), os.path.join(dest, "aaa"))
+    assert result.subcmd == "link"
+    assert result.counts == {"link": 1}
+
+
+def test_result_of_failure(source_a, source_b, dest):
+    with open(os.path.join(dest, "aaa"), "w", encoding="utf8"):
+        pass
+    with pytest.raises(error.ConflictsWithExistingFile) as exception_info:
+        dploy.stow([source_a, source_b], dest)
+    result = exception_info.value.result
+    assert not result.is_successful
+    assert len(result.errors) == 2
+    assert result.actions == []
+
+
+def test_results_nest_in_recorded_timings(source_a, dest):
+    recorded = timings.Timings()
+    with timings.record(recorded):
+        result = dploy.stow([source_a], dest)
+    assert recorded.phases["collect"].wall == result.timings.phases["collect"].wall
+    assert recorded.parent is None and result.timings.parent is None
@@ -0,0 +1,135 @@
+"""
+Tests for the stat cache
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import os
+import pathlib
+
+import pytest
+
+from dploy import statcache, stowcmd
+from tests import utils
+
+
+def test_stat_cache_with_repeated_lookups(source_a):
+    cache = statcache.StatCache()
+    path = os.path.join(source_a, "aaa")
+    assert not cache.is_symlink(path)
+    assert cache.is_dir(path)
+    assert cache.exists(path)
+    assert cache.syscalls == 1
+    assert cache.saved_syscalls == 2
+
+
+def test_stat_cache_with_negative_lookups(dest):
+    cache = statcache.StatCache()
+    path = os.path.join(dest, "non_existant")
+    assert not cache.exists(path)
+    assert not cache.lexists(path)
+    assert not cache.is_dir(path)
+    with pytest.raises(FileNotFoundError):
+        cache.stat(path)
+    assert cache.syscalls == 1
+    assert cache.saved_syscalls == 3
+
+
+def test_stat_cache_with_broken_link(dest):
+    cache = statcache.StatCache()
+    path = os.path.join(dest, "broken")
+    os.symlink("non_existant_source", path)
+    assert cache.is_symlink(path)
+    assert cache.lexists(path)
+    assert not cache.exists(path)
+
+
+def test_stat_cache_with_scanned_directory(source_a, dest):
+    cache = statcache.StatCache()
+    directory = pathlib.Path(source_a, "aaa")
+    os.symlink(os.path.join(source_a, "aaa", "aaa"), os.path.join(source_a, "aaa", "link"))
+    entries = cache.scan(directory)
+    assert [entry.name for entry in entries] == ["aaa", "bbb", "ccc", "link"]
+    assert cache.is_dir(directory / "ccc")
+    assert not cache.is_symlink(directory / "aaa")
+    assert cache.is_symlink(directory / "link")
+    assert not cache.exists(directory / "non_existant")
+    assert not cache.lexists(directory / "non_existant")
+    assert cache.syscalls == 1
+    assert cache.exists(directory / "link")
+    assert cache.syscalls == 2
+    assert cache.scan(directory) == entries
+    assert cache.syscalls == 2
+    assert not cache.exists(pathlib.Path(dest, "non_existant"))
+
+
+def test_stat_cache_resolve_with_symlinks(source_a, dest):
+    cache = statcache.StatCache()
+    os.symlink(os.path.join("..", "source_a", "aaa"), os.path.join(dest, "aaa"))
+    paths = [
+        pathlib.Path(dest, "aaa"),
+        pathlib.Path(dest, "aaa", "ccc", "aaa"),
+        pathlib.Path(dest, "aaa", "..", "aaa", "bbb"),
+        pathlib.Path(dest, "aaa", "non_existant"),
+        pathlib.Path(dest, "non_existant", "..", "aaa"),
+    ]
+    for path in paths:
+        assert cache.resolve(path) == path.resolve()
+    syscalls = cache.syscalls
+    expected = pathlib.Path(source_a).resolve() / "aaa" / "ccc" / "bbb"
+    assert cache.resolve(pathlib.Path(dest, "aaa", "ccc", "bbb")) == expected
+    assert cache.syscalls == syscalls + 1
+
+
+def test_stat_cache_with_invalidate(dest):
+    cache = statcache.StatCache()
+    path = os.path.join(dest, "aaa")
+    assert not cache.exists(path)
+    os.mkdir(path)
+    assert not cache.exists(path)
+    cache.invalidate(path)
+    assert cache.exists(path)
+
+
+def test_stat_cache_with_max_entries(source_a):
+    cache = statcache.StatCache(max_entries=2)
+    paths = [os.path.join(source_a, "aaa", name) for name in ("aaa", "bbb", "ccc")]
+    for path in paths:
+        cache.lstat(path)
+    cache.lstat(paths[0])
+    assert cache.syscalls == 4
+    assert cache.saved_syscalls == 0
+
+
+def test_stat_cache_shared_by_stow(source_a, dest):
+    cache = statcache.StatCache()
+    stowcmd.Stow([source_a], dest, stat_cache=cache)
+    assert os.readlink(os.path.join(dest, "aaa")) == os.path.join("..", "source_a", "aaa")
+    assert cache.saved_syscalls > 0
+
+
+def create_wide_source_and_dest(tmp_path, width):
+    source = tmp_path / "source_wide"
+    dest = tmp_path / "dest_wide"
+    names = ["dir_{}".format(index) for index in range(width)]
+    utils.create_tree([{str(source): [{"aaa": [{name: ["aaa", "bbb"]} for name in names]}]}])
+    utils.create_tree([{str(dest): [{"aaa": [{name: []} for name in names]}]}])
+    return str(source), str(dest)
+
+
+def stow_with_slow_file_system(source, dest, jobs):
+    file_system = utils.SlowFileSystem(delay=0.01)
+    cache = statcache.StatCache(backend=file_system)
+    stow = stowcmd.Stow([source], dest, is_dry_run=True, stat_cache=cache, jobs=jobs)
+    return file_system.peak_calls_in_flight, [repr(action) for action in stow.actions.actions]
+
+
+def test_stat_cache_with_prefetching_on_slow_file_system(tmp_path):
+    source, dest = create_wide_source_and_dest(tmp_path, 16)
+    sequential_peak, sequential_plan = stow_with_slow_file_system(source, dest, jobs=1)
+    parallel_peak, parallel_plan = stow_with_slow_file_system(source, dest, jobs=8)
+    assert len(sequential_plan) == 32
+    assert parallel_plan == sequential_plan
+    assert sequential_peak == 1
+    assert parallel_peak > 1
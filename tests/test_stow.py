@@ -193,6 +193,12 @@ def test_stow_unfolding_with_multiple_sources(source_a, source_b, dest):
     verify_unfolded_source_a_and_source_b(dest)
 
 
+def test_stow_unfolding_with_two_invocations_and_jobs(source_a, source_b, dest):
+    dploy.stow([source_a], dest, jobs=4)
+    dploy.stow([source_b], dest, jobs=4)
+    verify_unfolded_source_a_and_source_b(dest)
+
+
 @pytest.mark.skip(reason="Not working yet.")
 def test_stow_unfolding_with_first_sources_execute_permission_removed(source_a, source_b, dest):
     dploy.stow([source_a], dest)
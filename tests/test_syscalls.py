@@ -0,0 +1,73 @@
+"""
+Tests for the counts of the system calls made by the sub commands
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import os
+
+import dploy
+import dploy.cli
+from dploy import syscalls
+from tests import utils
+
+
+def get_calls(call_counts):
+    return {call: call_count.calls for call, call_count in call_counts.items()}
+
+
+def test_syscalls_of_stow(source_a, source_b, dest):
+    counter = syscalls.Counter()
+    with syscalls.record(counter):
+        dploy.stow([source_a, source_b], dest)
+
+    by_phase = counter.get_totals_by_phase()
+    assert set(by_phase) == {"validate", "collect", "check", "execute"}
+    # aaa is linked, then unfolded to link the six entries of both sources
+    assert get_calls(by_phase["execute"]) == {"symlink": 7, "lstat": 1, "unlink": 1, "mkdir": 1}
+
+    by_source = counter.get_totals_by_source()
+    assert by_source[source_a]["listdir"].calls > 0
+    assert by_source[source_b]["listdir"].calls > 0
+    assert all(call_count.seconds >= 0 for call_count in counter.get_totals().values())
+    assert counter.get_totals()["symlink"].calls == 7
+
+
+def test_syscalls_of_unstow(source_a, dest):
+    dploy.stow([source_a], dest)
+    counter = syscalls.Counter()
+    with syscalls.record(counter):
+        dploy.unstow([source_a], dest)
+    totals = get_calls(counter.get_totals())
+    assert totals["unlink"] == 1
+    assert "symlink" not in totals
+
+
+def test_syscalls_are_not_counted_by_default(source_a, dest):
+    counter = syscalls.Counter()
+    with syscalls.record(counter):
+        pass
+    dploy.stow([source_a], dest)
+    assert not counter.counts
+    assert syscalls.count("stat") is syscalls.count("lstat")
+
+
+def test_cli_with_stats(source_a, dest, capsys):
+    dploy.cli.run(["--stats", "stow", source_a, dest])
+    _, err = capsys.readouterr()
+    lines = [line.split() for line in err.splitlines()]
+    assert lines[0] == ["phase", "source", "call", "calls", "time", "(s)"]
+    assert ["collect", source_a, "listdir"] in [line[:3] for line in lines]
+    assert ["total", "-", "symlink", "1"] in [line[:4] for line in lines]
+
+
+def test_syscalls_of_clean_read_each_link_once(tmp_path, source_a, dest):
+    stray_link = os.path.join(dest, "stray", "bbb")
+    os.makedirs(os.path.dirname(stray_link))
+    os.symlink(os.path.join(source_a, "non_existant"), stray_link)
+    counter = syscalls.Counter()
+    with syscalls.record(counter), utils.ChangeDirectory(tmp_path):
+        dploy.clean([source_a], dest)
+    assert not os.path.lexists(stray_link)
+    assert get_calls(counter.get_totals())["readlink"] == 1
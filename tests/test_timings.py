@@ -0,0 +1,81 @@
+"""
+Tests for the timings of the phases of the sub commands
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import os
+import pstats
+import tracemalloc
+
+import dploy
+import dploy.cli
+from dploy import timings
+
+
+def test_timings_of_stow(source_a, source_b, dest):
+    recorded = timings.Timings()
+    with timings.record(recorded):
+        dploy.stow([source_a, source_b], dest)
+    assert list(recorded.phases) == list(timings.PHASES)
+    collect = recorded.phases["collect"]
+    assert collect.directories >= 2
+    assert collect.entries > 0
+    assert collect.syscalls > 0
+    assert collect.actions > 0
+    assert recorded.phases["check"].actions == recorded.phases["execute"].actions
+    assert all(phase.wall >= 0 and phase.cpu >= 0 for phase in recorded.phases.values())
+
+
+def test_timings_of_several_sub_commands(source_a, source_b, dest):
+    recorded = timings.Timings()
+    counts = []
+    with timings.record(recorded):
+        for source in (source_a, source_b):
+            recorded_stow = timings.Timings()
+            with timings.record(recorded_stow):
+                dploy.stow([source], dest)
+            counts.append(recorded_stow.phases["execute"].actions)
+    assert all(count > 0 for count in counts)
+    assert recorded.phases["execute"].actions == sum(counts)
+
+
+def test_timings_are_not_recorded_by_default(source_a, dest):
+    recorded = timings.Timings()
+    with timings.record(recorded):
+        pass
+    dploy.stow([source_a], dest)
+    assert not recorded.phases
+
+
+def test_cli_with_timings(source_a, dest, capsys):
+    dploy.cli.run(["--timings", "stow", source_a, dest])
+    out, err = capsys.readouterr()
+    assert out.startswith("dploy stow: link")
+    assert [line.split()[0] for line in err.splitlines()] == ["phase"] + list(timings.PHASES)
+
+
+def test_cli_with_profile(source_a, dest, tmp_path):
+    profile_file = str(tmp_path / "stow.pstats")
+    dploy.cli.run(["--silent", "--profile", profile_file, "stow", source_a, dest])
+    assert os.path.islink(os.path.join(dest, "aaa"))
+    stats = pstats.Stats(profile_file)
+    assert any(function_name == "__init__" and "main.py" in file for file, _, function_name in stats.stats)
+
+
+def test_timings_of_memory_by_phase():
+    recorded = timings.Timings()
+    tracemalloc.start()
+    try:
+        kept = [bytearray(1024 * 1024)]
+        with timings.record(recorded):
+            with timings.phase("collect"):
+                kept.append(bytearray(256 * 1024))
+            with timings.phase("check"):
+                kept.clear()
+    finally:
+        tracemalloc.stop()
+    assert recorded.phases["collect"].peak_memory >= 256 * 1024
+    assert recorded.phases["check"].peak_memory < 1024
+    assert recorded.phases["check"].peak_traced_memory >= 1024 * 1024
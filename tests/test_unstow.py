@@ -160,6 +160,14 @@ def test_unstow_folding_basic(source_a, source_b, dest):
     assert os.path.islink(os.path.join(dest, "aaa"))
 
 
+def test_unstow_folding_with_jobs(source_a, source_b, dest):
+    dploy.stow([source_a, source_b], dest, jobs=4)
+    dploy.unstow([source_b], dest, jobs=4)
+    assert os.path.islink(os.path.join(dest, "aaa"))
+    dploy.unstow([source_a], dest, jobs=4)
+    assert not os.path.exists(os.path.join(dest, "aaa"))
+
+
 def test_unstow_folding_with_multiple_sources(source_a, source_b, source_d, dest):
     dploy.stow([source_a, source_b, source_d], dest)
     dploy.unstow([source_b, source_d], dest)
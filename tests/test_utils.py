@@ -14,6 +14,16 @@
 from dploy import utils
 
 
+def test_scan_directory_with_basic_scenario(source_a):
+    directory = pathlib.Path(source_a, "aaa")
+    entries = utils.scan_directory(directory)
+    assert [entry.path for entry in entries] == utils.get_directory_contents(directory)
+    assert [entry.name for entry in entries] == ["aaa", "bbb", "ccc"]
+    assert [entry.is_dir() for entry in entries] == [False, False, True]
+    assert not any(entry.is_symlink() for entry in entries)
+    assert entries[0].inode == os.stat(os.path.join(source_a, "aaa", "aaa")).st_ino
+
+
 def test_readlink_with_broken_absolute_target(dest):
     target = os.path.join("/", "source_only_files", "bbb")
     dest_path = os.path.join(dest, "bbb")
@@ -51,3 +61,42 @@ def test_readlink_with_absolute_target(dest, source_a):
     assert utils.readlink(dest_path, absolute_target=True) == pathlib.Path(target)
     assert utils.readlink(dest_path, absolute_target=True).exists()
     assert utils.readlink(dest_path).exists()
+
+
+def test_is_same_file_with_symlink(source_a, dest):
+    link = pathlib.Path(dest, "aaa")
+    os.symlink(os.path.join(source_a, "aaa"), link)
+    assert utils.is_same_file(link, pathlib.Path(source_a, "aaa"))
+    assert not utils.is_same_file(link, pathlib.Path(source_a))
+    assert utils.get_file_identity(link) == utils.get_file_identity(pathlib.Path(source_a, "aaa"))
+
+
+def test_is_same_file_with_non_existant_file(dest):
+    non_existant = pathlib.Path(dest, "non_existant")
+    assert utils.get_file_identity(non_existant) is None
+    assert utils.is_same_file(non_existant, pathlib.Path(dest, "..", "dest", "non_existant"))
+    assert not utils.is_same_file(non_existant, pathlib.Path(dest))
+
+
+def test_is_same_files_with_different_lengths(source_a):
+    files = utils.get_directory_contents(pathlib.Path(source_a, "aaa"))
+    assert utils.is_same_files(files, list(files))
+    assert not utils.is_same_files(files, files[:-1])
+
+
+@pytest.mark.parametrize(
+    "source, dest",
+    [
+        ("/home/user/dotfiles/vim/vimrc", "/home/user/.vimrc"),
+        ("/home/user/dotfiles/vim/vimrc", "/home/user/dotfiles/vim/link"),
+        ("/home/user/dotfiles/vim", "/home/user/.config/nvim/vim"),
+        ("/dotfiles/aaa", "/aaa"),
+        ("dotfiles/aaa", "dest/aaa"),
+        ("../dotfiles/aaa", "dest/deeper/aaa"),
+    ],
+)
+def test_get_relative_link_target(source, dest):
+    expected = utils.get_relative_path(pathlib.Path(source), pathlib.Path(dest).parent)
+    assert utils.get_relative_link_target(pathlib.Path(source), pathlib.Path(dest)) == expected
+    # the second time it comes from the memoized parent directories
+    assert utils.get_relative_link_target(source, dest) == expected
@@ -0,0 +1,126 @@
+"""
+Tests for the watch sub command
+"""
+# pylint: disable=missing-docstring
+# disable lint errors for function names longer that 30 characters
+# pylint: disable=invalid-name
+
+import os
+import pathlib
+import threading
+import time
+
+import pytest
+
+import dploy
+import dploy.cli
+from dploy import watchcmd
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def start_watch(sources, dest, use_polling):
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=dploy.watch,
+        args=(sources, dest),
+        kwargs={"interval": 0.05, "debounce": 0.05, "use_polling": use_polling, "stop_event": stop_event},
+    )
+    thread.start()
+    return stop_event, thread
+
+
+def test_polling_watcher_with_changes(source_a):
+    directory = pathlib.Path(source_a, "aaa")
+    watcher = watchcmd.PollingWatcher([pathlib.Path(source_a)])
+    assert not watcher.poll()
+
+    time.sleep(0.01)
+    (directory / "ddd").mkdir()
+    assert watcher.poll() == {directory, directory / "ddd"}
+    assert not watcher.poll()
+
+    time.sleep(0.01)
+    (directory / "ddd" / "aaa").touch()
+    assert watcher.poll() == {directory / "ddd"}
+
+    time.sleep(0.01)
+    os.unlink(directory / "ddd" / "aaa")
+    os.rmdir(directory / "ddd")
+    assert watcher.poll() == {directory, directory / "ddd"}
+
+
+def test_polling_watcher_with_directory_removed_while_polling(source_a, monkeypatch):
+    directory = pathlib.Path(source_a, "aaa")
+    watcher = watchcmd.PollingWatcher([pathlib.Path(source_a)])
+    time.sleep(0.01)
+    (directory / "ddd").touch()
+
+    def scandir(path):
+        raise FileNotFoundError(2, "No such file or directory", path)
+
+    monkeypatch.setattr(watchcmd.os, "scandir", scandir)
+    assert watcher.poll() == {directory}
+
+
+def test_watch_updates_only_the_changed_sources(source_a, source_b, dest):
+    watch = watchcmd.Watch([source_a, source_b], dest)
+    changes = {pathlib.Path(source_b, "aaa"), pathlib.Path(source_b, "aaa", "ddd")}
+    assert watch.get_changed_sources(changes) == [pathlib.Path(source_b)]
+    assert watch.get_changed_sources({pathlib.Path(source_a)}) == [pathlib.Path(source_a)]
+    assert watch.get_changed_sources(set()) == []
+
+
+def test_create_watcher_with_polling(source_a):
+    watcher = watchcmd.create_watcher([pathlib.Path(source_a)], use_polling=True)
+    assert isinstance(watcher, watchcmd.PollingWatcher)
+    watcher.close()
+
+
+@pytest.mark.parametrize("use_polling", [True, False])
+def test_watch_with_added_and_removed_files(source_a, source_b, dest, use_polling):
+    stop_event, thread = start_watch([source_a, source_b], dest, use_polling)
+    try:
+        assert wait_for(lambda: os.path.islink(os.path.join(dest, "aaa", "ddd")))
+        assert os.path.isdir(os.path.join(dest, "aaa"))
+
+        pathlib.Path(source_a, "aaa", "new").touch()
+        assert wait_for(lambda: os.path.islink(os.path.join(dest, "aaa", "new")))
+        assert os.readlink(os.path.join(dest, "aaa", "new")) == os.path.join("..", "..", "source_a", "aaa", "new")
+
+        os.unlink(os.path.join(source_b, "aaa", "ddd"))
+        assert wait_for(lambda: not os.path.lexists(os.path.join(dest, "aaa", "ddd")))
+        assert os.path.islink(os.path.join(dest, "aaa", "eee"))
+    finally:
+        stop_event.set()
+        thread.join()
+
+
+def test_watch_keeps_watching_after_a_conflict(source_a, source_b, dest):
+    stop_event, thread = start_watch([source_a, source_b], dest, use_polling=True)
+    try:
+        assert wait_for(lambda: os.path.islink(os.path.join(dest, "aaa", "ddd")))
+        pathlib.Path(dest, "aaa", "conflict").touch()
+        pathlib.Path(source_a, "aaa", "conflict").touch()
+        time.sleep(0.3)
+        assert not os.path.islink(os.path.join(dest, "aaa", "conflict"))
+
+        os.unlink(os.path.join(dest, "aaa", "conflict"))
+        assert wait_for(lambda: os.path.islink(os.path.join(dest, "aaa", "conflict")))
+        assert thread.is_alive()
+    finally:
+        stop_event.set()
+        thread.join()
+
+
+def test_cli_watch_with_dry_run(source_a, dest):
+    with pytest.raises(SystemExit):
+        dploy.cli.run(["--dry-run", "watch", source_a, dest])
+    assert not os.path.lexists(os.path.join(dest, "aaa"))
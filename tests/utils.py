@@ -4,9 +4,13 @@
 
 import os
 import shutil
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
 from dploy.oschmod import set_mode
+from dploy.statcache import FileSystem as StatCacheFileSystem
 from dploy.utils import (
     Operation,
     Permission,
@@ -124,3 +128,40 @@ def add_user_permissions(path: StowPath) -> None:
     update_permissions(path, Operation.ADD, *[Permission.u_r, Permission.u_w])
     if os.path.isdir(path):
         update_permissions(path, Operation.ADD, *[Permission.u_x])
+
+
+class SlowFileSystem(StatCacheFileSystem):
+    """
+    A file system backend that adds latency to every call like a network file
+    system would, and counts how many calls are in flight at once
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls_in_flight = 0
+        self.peak_calls_in_flight = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _call(self):
+        with self._lock:
+            self.calls_in_flight += 1
+            self.peak_calls_in_flight = max(self.peak_calls_in_flight, self.calls_in_flight)
+        try:
+            time.sleep(self.delay)
+            yield
+        finally:
+            with self._lock:
+                self.calls_in_flight -= 1
+
+    def lstat(self, path):
+        with self._call():
+            return super().lstat(path)
+
+    def stat(self, path):
+        with self._call():
+            return super().stat(path)
+
+    def scan_directory(self, directory):
+        with self._call():
+            return super().scan_directory(directory)